@@ -5,12 +5,11 @@ import plotly.graph_objects as go
 import os
 import glob
 import folium
-from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 import json
+import html
 import time
-import subprocess
-import sys
+import importlib.util
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
@@ -25,58 +24,103 @@ st.set_page_config(
 st.title("📊 Eleições 2022 - Minas Gerais")
 st.markdown("### Municípios Selecionados - Votação Agregada por Local de Votação")
 
-# Arquivo de dados local (agregado por endereço e candidato)
-DATA_FILE = "eleicoes_2022_mg_filtrados_*_agregado.csv"
+# Arquivo de dados local (agregado por endereço e candidato; .csv, .csv.gz ou .csv.zst)
+DATA_FILE = "eleicoes_2022_mg_filtrados_*_agregado.csv*"
+# Dataset Parquet particionado (gerado com --formato parquet/ambos, requer pyarrow)
+DATA_FILE_PARQUET = "eleicoes_2022_mg_filtrados_*_agregado.parquet"
+PARQUET_DISPONIVEL = importlib.util.find_spec('pyarrow') is not None
+# Rollup por nível (gerado pelo script de filtragem na mesma passada); com --partidos,
+# também por partido e coligação (nivel = 'partido_municipio', 'coligacao_local'...)
+DATA_FILE_ROLLUP = "eleicoes_2022_mg_filtrados_*_rollup_{nivel}.csv"
+# Aptos, comparecimento e abstenções por local (detalhe por seção do TSE)
+DATA_FILE_COMPARECIMENTO = "eleicoes_2022_mg_filtrados_*_comparecimento.csv"
 '''DATA_FILE = "eleicoes_2022_mg_filtrados_agregado.csv"'''
 
+# Ingestão em segundo plano (tarefa_ingestao): o app serve o último conjunto de dados
+# completo e acompanha o andamento da tarefa pelo arquivo de status. Por padrão, a mesma
+# ingestão da linha de comando sem opções (só o arquivo votacao_secao, saída em CSV)
+PARAMETROS_INGESTAO = {}
+# Opções da ingestão marcadas no painel antes de "Atualizar dados do TSE": parâmetro -> rótulo
+OPCOES_INGESTAO = {
+    'comparecimento': "Comparecimento por local (baixa também o detalhe por seção)",
+    'partidos': "Partidos e coligações (baixa também o cadastro de candidatos)",
+    'matriz_secoes': "Votos por seção (matriz por município)",
+}
+INTERVALO_STATUS = 3  # segundos entre leituras do status da ingestão
+
+def mais_recente(padrao):
+    """Arquivo mais recente com o padrão, ou None"""
+    arquivos = glob.glob(padrao)
+    return max(arquivos, key=os.path.getmtime) if arquivos else None
+
+def arquivos_atuais(status):
+    """
+    Arquivos do último conjunto de dados completo: os da última ingestão concluída ou,
+    se o app ainda não rodou nenhuma, os mais recentes gerados pela linha de comando
+    """
+    if status.get('ultimo_sucesso'):
+        return status['ultimo_sucesso']['arquivos']
+    arquivos = {}
+    parquet = mais_recente(DATA_FILE_PARQUET) if PARQUET_DISPONIVEL else None
+    if parquet:
+        arquivos['agregado_parquet'] = parquet
+    elif mais_recente(DATA_FILE):
+        arquivos['agregado_csv'] = mais_recente(DATA_FILE)
+    else:
+        return None
+    for chave, padrao in (('rollup_local', DATA_FILE_ROLLUP.format(nivel='local')),
+                          ('rollup_partido_municipio', DATA_FILE_ROLLUP.format(nivel='partido_municipio')),
+                          ('comparecimento', DATA_FILE_COMPARECIMENTO)):
+        if mais_recente(padrao):
+            arquivos[chave] = mais_recente(padrao)
+    return arquivos
+
+@st.fragment(run_every=INTERVALO_STATUS)
+def painel_ingestao(versao_exibida):
+    """Andamento da ingestão em segundo plano; troca para os dados novos quando ela termina"""
+    from tarefa_ingestao import iniciar, ler_status
+
+    status = ler_status()
+    if (status.get('ultimo_sucesso') or {}).get('fim') != versao_exibida:
+        st.rerun()  # Ingestão concluída: recarrega a página inteira com os novos arquivos
+
+    st.header("📥 Dados do TSE")
+    estado = status.get('estado')
+    if estado == 'executando':
+        st.info(f"🔄 Atualizando os dados (desde {status['inicio'][11:]})")
+        if status.get('mensagem'):
+            st.caption(status['mensagem'])
+        if status.get('etapa') == 'processamento' and status.get('linhas'):
+            st.caption(f"{status['linhas']:,} linhas lidas | {status.get('linhas_filtradas', 0):,} filtradas | "
+                       f"{status.get('linhas_por_segundo', 0):,.0f} linhas/s")
+    elif estado == 'erro':
+        st.error(f"❌ A última atualização falhou: {status.get('erro')}")
+    elif estado == 'interrompido':
+        st.warning("⚠️ A última atualização foi interrompida")
+    if versao_exibida:
+        st.caption(f"Dados de {versao_exibida.replace('T', ' ')}")
+
+    parametros = dict(PARAMETROS_INGESTAO)
+    for parametro, rotulo in OPCOES_INGESTAO.items():
+        if st.checkbox(rotulo, key=f'ingestao_{parametro}'):
+            parametros[parametro] = True
+    if PARQUET_DISPONIVEL and st.checkbox("Gravar também em Parquet", key='ingestao_parquet'):
+        parametros['formato'] = 'ambos'
+
+    if st.button("🔄 Atualizar dados do TSE", disabled=estado == 'executando', key='atualizar_dados'):
+        iniciar(parametros)
+        st.rerun(scope='fragment')
+
 @st.cache_data
-def load_data():
-    """Carrega os dados filtrados do arquivo CSV local"""
+def load_data(arquivos):
+    """Carrega os dados agregados de um conjunto de arquivos gerado pela filtragem"""
     try:
-        st.info("📥 Executando script de filtragem automaticamente...")
-
-        # Executar o script de filtragem
-        script_path = os.path.join(os.path.dirname(__file__), 'filtrar_municipios_stream.py')
-
-        if os.path.exists(script_path):
-            with st.spinner("🔄 Baixando e processando dados do TSE... Isso pode levar alguns minutos."):
-                try:
-                    # Executar o script
-                    result = subprocess.run(
-                        [sys.executable, script_path],
-                        capture_output=True,
-                        text=True,
-                        timeout=600  # Timeout de 10 minutos
-                    )
-
-                    if result.returncode == 0:
-                        st.success("✅ Dados processados com sucesso!")
-
-                        # Tentar carregar o arquivo gerado
-                        arquivos = glob.glob(DATA_FILE)
-                        if arquivos:
-                            arquivo_mais_recente = max(arquivos, key=os.path.getmtime)
-                            with st.spinner(f"📂 Carregando dados de {os.path.basename(arquivo_mais_recente)}..."):
-                                df = pd.read_csv(arquivo_mais_recente, encoding='utf-8-sig', sep=';')
-                                return df
-                        else:
-                            st.error(f"❌ Arquivo não encontrado após processamento: {DATA_FILE}")
-                            return None
-                    else:
-                        st.error(f"❌ Erro ao executar filtrar_municipios_stream.py:\n{result.stderr}")
-                        return None
-
-                except subprocess.TimeoutExpired:
-                    st.error("❌ Timeout: O processo demorou mais de 10 minutos.")
-                    return None
-                except Exception as e:
-                    st.error(f"❌ Erro ao executar script: {str(e)}")
-                    return None
-        else:
-            st.error(f"❌ Script não encontrado: {script_path}")
-            st.info("Execute manualmente: `python filtrar_municipios_stream.py`")
-            return None
-
+        # Só as colunas usadas pelo painel, com nomes em categorias e números em inteiros compactos
+        # (Parquet, se houver; senão o CSV, com as colunas constantes vindas do arquivo de metadados)
+        from carga_dashboard import carregar_agregado
+        arquivo = arquivos.get('agregado_parquet') or arquivos['agregado_csv']
+        with st.spinner(f"📂 Carregando dados de {os.path.basename(arquivo)}..."):
+            return carregar_agregado(arquivos)
     except Exception as e:
         st.error(f"❌ Erro ao carregar dados: {str(e)}")
         return None
@@ -96,8 +140,66 @@ def load_geocoded_data():
         df_geo = pd.read_csv(arquivo_geo, encoding='utf-8-sig')
 
         return df_geo
-    except Exception as e:
+    except Exception:
+        return None
+
+@st.cache_data
+def load_csv_saida(caminho):
+    """Carrega um CSV gerado pela filtragem (rollup de um nível ou comparecimento por local)"""
+    if caminho is None:
+        return None
+    try:
+        return pd.read_csv(caminho, encoding='utf-8-sig', sep=';')
+    except Exception:
+        return None
+
+def load_rollup(nivel):
+    """Carrega o rollup de um nível (secao, local, zona, municipio, partido_municipio...) dos dados atuais"""
+    return load_csv_saida(arquivos_dados.get(f'rollup_{nivel}'))
+
+def load_comparecimento():
+    """Carrega o comparecimento por local dos dados atuais (aptos, comparecimento e abstenções)"""
+    return load_csv_saida(arquivos_dados.get('comparecimento'))
+
+@st.cache_resource
+def load_matriz_secoes(municipio, execucao):
+    """Abre (np.memmap) a matriz de votos por seção de um município, gravada pela filtragem
+
+    execucao: pasta das partições da ingestão dos dados exibidos (cada ingestão grava em uma
+    pasta nova, e a matriz é reaberta quando ela muda)
+    """
+    if execucao is None:
         return None
+    try:
+        from manifesto_tse import pasta_secoes
+        from matriz_secoes import LeitorMatrizSecoes
+        pasta = pasta_secoes(municipio, execucao)
+        if not os.path.isdir(pasta):
+            return None
+        return LeitorMatrizSecoes(pasta)
+    except Exception:
+        return None
+
+@st.cache_resource
+def load_resultados(arquivos, com_bairro, _df, _df_rollup_local):
+    """Resultados por cargo, turno e município (e bairro), calculados uma vez por conjunto de dados
+
+    arquivos, com_bairro: identificam os dados (_df e _df_rollup_local não entram na chave do cache)
+    """
+    from resultados_dashboard import CuboResultados
+    with st.spinner("📊 Calculando resultados por município..."):
+        return CuboResultados(_df, _df_rollup_local)
+
+def secoes_por_local(df_rollup_local, cargo, turno, municipio):
+    """Número de seções de cada local de votação (uma linha por zona/local)"""
+    if df_rollup_local is None:
+        return None
+    df_locais = df_rollup_local[
+        (df_rollup_local['DS_CARGO'] == cargo) &
+        (df_rollup_local['NR_TURNO'] == turno) &
+        (df_rollup_local['NM_MUNICIPIO'] == municipio)
+    ]
+    return df_locais.drop_duplicates(['NR_ZONA', 'NR_LOCAL_VOTACAO'])[['NR_ZONA', 'NR_LOCAL_VOTACAO', 'QT_SECOES']]
 
 def geocodificar_endereco(endereco, municipio, geolocator):
     """Geocodifica um endereço usando Nominatim"""
@@ -119,15 +221,53 @@ def geocodificar_endereco(endereco, municipio, geolocator):
         st.warning(f"Erro ao geocodificar {endereco}: {str(e)}")
         return None, None
 
+# Dados atuais: os da última ingestão concluída, sem esperar por uma nova
+from tarefa_ingestao import iniciar as iniciar_ingestao, ler_status
+from resultados_dashboard import vencedores_por_local
+from mapa_locais import MODOS_MAPA, camada_cluster, camada_geojson, camada_marcadores, colorir
+
+status_ingestao = ler_status()
+arquivos_dados = arquivos_atuais(status_ingestao)
+if arquivos_dados is None and not status_ingestao:
+    # Primeira execução (a tarefa nunca rodou e não há dados em disco): a ingestão começa em
+    # segundo plano. Depois de uma falha, só o botão "Atualizar dados do TSE" tenta de novo
+    iniciar_ingestao(PARAMETROS_INGESTAO)
+    status_ingestao = ler_status()
+versao_dados = (status_ingestao.get('ultimo_sucesso') or {}).get('fim')
+execucao_dados = (status_ingestao.get('ultimo_sucesso') or {}).get('dir_execucao')
+if execucao_dados is None and arquivos_dados is not None:
+    # Dados gerados pela linha de comando: partições da última execução registrada no manifesto
+    from manifesto_tse import pasta_execucao
+    execucao_dados = pasta_execucao()
+
+with st.sidebar:
+    painel_ingestao(versao_dados)
+
+if arquivos_dados is None:
+    if status_ingestao.get('estado') == 'executando':
+        st.info("📥 Baixando e processando os dados do TSE pela primeira vez. "
+                "A página é atualizada sozinha quando os dados ficarem prontos (andamento na barra lateral).")
+    else:
+        st.warning("⚠️ Nenhum dado disponível: a primeira ingestão não terminou. "
+                   "Use \"Atualizar dados do TSE\" na barra lateral para tentar de novo.")
+    st.stop()
+
 # Carregar dados
-df = load_data()
+df = load_data(arquivos_dados)
+
+# Rollup por local (contagem correta de seções por turno e cargo)
+df_rollup_local = load_rollup('local')
 
 # Carregar dados geocodificados com bairros
 df_geo = load_geocoded_data()
 if df_geo is not None and 'BAIRRO' in df_geo.columns:
     # Fazer merge para adicionar coluna de bairro aos dados principais
+    # (chaves com os tipos de df, para NM_MUNICIPIO continuar categoria depois do merge)
+    df_bairros = df_geo[['NR_LOCAL_VOTACAO', 'NM_MUNICIPIO', 'BAIRRO']].dropna(subset=['NR_LOCAL_VOTACAO'])
+    df_bairros = df_bairros.astype({'NR_LOCAL_VOTACAO': df['NR_LOCAL_VOTACAO'].dtype,
+                                    'NM_MUNICIPIO': df['NM_MUNICIPIO'].dtype, 'BAIRRO': 'category'})
     df = df.merge(
-        df_geo[['NR_LOCAL_VOTACAO', 'NM_MUNICIPIO', 'BAIRRO']],
+        df_bairros,
         on=['NR_LOCAL_VOTACAO', 'NM_MUNICIPIO'],
         how='left'
     )
@@ -160,7 +300,7 @@ if df is not None:
     df_filtrado = df[
         (df['DS_CARGO'] == cargo_selecionado) &
         (df['NR_TURNO'] == turno_selecionado)
-    ].copy()
+    ]
 
     st.sidebar.info(f"**{len(df_filtrado):,}** registros após filtros")
 
@@ -184,19 +324,19 @@ if df is not None:
     with tab1:
         st.header("Resultados por Município")
 
+        # Resultados pré-calculados para todas as combinações: cada interação é uma consulta
+        resultados = load_resultados(arquivos_dados, 'BAIRRO' in df.columns, df, df_rollup_local)
+
         # Selecionar município
-        municipios = sorted(df_filtrado['NM_MUNICIPIO'].unique())
+        municipios = resultados.municipios_com_votos(cargo_selecionado, turno_selecionado)
         municipio_selecionado = st.selectbox("Selecione um município:", municipios)
 
         if municipio_selecionado:
-            df_municipio = df_filtrado[df_filtrado['NM_MUNICIPIO'] == municipio_selecionado].copy()
-
             # Filtro por bairro (se disponível nos dados geocodificados)
-            if 'BAIRRO' in df_municipio.columns:
-                # Remover valores nulos e preencher com "Não especificado"
-                df_municipio['BAIRRO'] = df_municipio['BAIRRO'].fillna('Não especificado')
-
-                bairros_disponiveis = sorted(df_municipio['BAIRRO'].unique())
+            bairros_disponiveis = resultados.bairros_do_municipio(cargo_selecionado, turno_selecionado,
+                                                                  municipio_selecionado)
+            bairros_selecionados = []
+            if resultados.com_bairro:
                 bairros_selecionados = st.multiselect(
                     "🏘️ Filtrar por Bairro (opcional):",
                     options=bairros_disponiveis,
@@ -205,13 +345,12 @@ if df is not None:
 
                 # Aplicar filtro de bairro se selecionado
                 if bairros_selecionados:
-                    df_municipio = df_municipio[df_municipio['BAIRRO'].isin(bairros_selecionados)]
                     st.info(f"📍 Exibindo resultados de {len(bairros_selecionados)} bairro(s) selecionado(s)")
 
-            votos_municipio = df_municipio.groupby('NM_VOTAVEL')['QT_VOTOS'].sum().sort_values(ascending=False)
-
-            # Remover nulos e brancos para visualização
-            votos_municipio_validos = votos_municipio[~votos_municipio.index.isin(['#NULO#', '#BRANCO#'])]
+            resultado = resultados.resultado(cargo_selecionado, turno_selecionado, municipio_selecionado,
+                                             bairros_selecionados)
+            # Sem brancos, nulos e anulados (NR_VOTAVEL 95 a 98) para visualização
+            votos_municipio_validos = resultado['validos']
 
             col1, col2 = st.columns([2, 1])
 
@@ -233,14 +372,81 @@ if df is not None:
                     if i <= 10:
                         st.write(f"**{i}º** {cand}: {votos:,.0f} votos")
 
-                total_municipio = votos_municipio.sum()
                 st.markdown("---")
-                st.write(f"**Total de votos:** {total_municipio:,.0f}")
-                st.write(f"**Zonas:** {df_municipio['NR_ZONA'].nunique()}")
-                st.write(f"**Seções:** {df_municipio['NR_SECAO'].nunique()}")
-                if 'BAIRRO' in df_municipio.columns:
-                    bairros_count = df_municipio['BAIRRO'].nunique()
-                    st.write(f"**Bairros:** {bairros_count}")
+                st.write(f"**Total de votos:** {resultado['total']:,.0f}")
+                st.write(f"**Zonas:** {len(resultado['zonas'])}")
+                st.write(f"**Seções:** {resultado['secoes']}")
+                if resultados.com_bairro:
+                    st.write(f"**Bairros:** {len(bairros_selecionados or bairros_disponiveis)}")
+
+                df_comparecimento = load_comparecimento()
+                if df_comparecimento is not None:
+                    df_comparecimento = df_comparecimento[
+                        (df_comparecimento['DS_CARGO'] == cargo_selecionado) &
+                        (df_comparecimento['NR_TURNO'] == turno_selecionado) &
+                        (df_comparecimento['NM_MUNICIPIO'] == municipio_selecionado) &
+                        (df_comparecimento['NR_LOCAL_VOTACAO'].isin(resultado['locais']))
+                    ]
+                    aptos = int(df_comparecimento['QT_APTOS'].sum())
+                    if aptos:
+                        comparecimento = int(df_comparecimento['QT_COMPARECIMENTO'].sum())
+                        abstencoes = int(df_comparecimento['QT_ABSTENCOES'].sum())
+                        st.markdown("---")
+                        st.write(f"**Eleitores aptos:** {aptos:,}")
+                        st.write(f"**Comparecimento:** {comparecimento:,} ({comparecimento / aptos * 100:.1f}%)")
+                        st.write(f"**Abstenções:** {abstencoes:,} ({abstencoes / aptos * 100:.1f}%)")
+
+            # Votos por partido/coligação: rollup pré-calculado na filtragem (município inteiro)
+            df_partidos = load_rollup('partido_municipio')
+            if df_partidos is not None:
+                with st.expander("🎗️ Votos por Partido e Coligação", expanded=False):
+                    agrupamento = st.radio("Agrupar por:", ['Partido', 'Coligação'], horizontal=True,
+                                           key='agrupamento_partido')
+                    coluna = 'SG_PARTIDO' if agrupamento == 'Partido' else 'NM_COLIGACAO'
+                    df_partidos_municipio = df_partidos[
+                        (df_partidos['DS_CARGO'] == cargo_selecionado) &
+                        (df_partidos['NR_TURNO'] == turno_selecionado) &
+                        (df_partidos['NM_MUNICIPIO'] == municipio_selecionado)
+                    ]
+                    votos_partido = df_partidos_municipio.groupby(coluna)['QT_VOTOS'].sum().sort_values(ascending=False)
+                    fig = px.bar(
+                        x=votos_partido.index,
+                        y=votos_partido.values,
+                        title=f"Votos por {agrupamento.lower()} em {municipio_selecionado}",
+                        labels={'x': agrupamento, 'y': 'Votos'},
+                        color=votos_partido.values,
+                        color_continuous_scale='Viridis'
+                    )
+                    fig.update_layout(height=450, xaxis_tickangle=-45)
+                    st.plotly_chart(fig, use_container_width=True)
+
+            # Detalhe de uma seção: fatia da matriz por seção (sem reler os dados do TSE)
+            matriz = load_matriz_secoes(municipio_selecionado, execucao_dados)
+            if matriz is not None and matriz.secoes:
+                with st.expander("🔎 Votos por Seção", expanded=False):
+                    zonas = sorted({s['NR_ZONA'] for s in matriz.secoes}, key=int)
+                    col_zona, col_secao = st.columns(2)
+                    with col_zona:
+                        zona_secao = st.selectbox("Zona:", zonas, key='zona_secao')
+                    with col_secao:
+                        secao_selecionada = st.selectbox(
+                            "Seção:",
+                            [s['NR_SECAO'] for s in matriz.secoes if s['NR_ZONA'] == zona_secao],
+                            key='secao_secao'
+                        )
+                    df_secao = pd.DataFrame(matriz.secao(zona_secao, secao_selecionada))
+                    if not df_secao.empty:
+                        df_secao = df_secao[
+                            (df_secao['DS_CARGO'] == cargo_selecionado) &
+                            (df_secao['NR_TURNO'] == str(turno_selecionado))
+                        ]
+                    if df_secao.empty:
+                        st.info("Nenhum voto para o cargo/turno selecionado nesta seção")
+                    else:
+                        df_secao = df_secao.sort_values('QT_VOTOS', ascending=False)
+                        st.write(f"**Total de votos na seção:** {df_secao['QT_VOTOS'].sum():,}")
+                        st.dataframe(df_secao[['NR_VOTAVEL', 'NM_VOTAVEL', 'QT_VOTOS']],
+                                     use_container_width=True, hide_index=True)
 
     with tab2:
         st.header("🗺️ Mapa Interativo - Locais de Votação")
@@ -252,21 +458,31 @@ if df is not None:
         # Filtrar dados do município
         df_municipio_mapa = df_filtrado[df_filtrado['NM_MUNICIPIO'] == municipio_mapa]
 
-        # Extrair informações únicas dos locais
+        # Extrair informações únicas dos locais (o número do local se repete em zonas diferentes)
         # Incluir BAIRRO se disponível
-        group_cols = ['NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO']
+        group_cols = ['NR_ZONA', 'NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO']
         if 'BAIRRO' in df_municipio_mapa.columns:
             group_cols.append('BAIRRO')
 
-        locais_info = df_municipio_mapa.groupby(group_cols).agg({
+        locais_info = df_municipio_mapa.groupby(group_cols, observed=True).agg({
             'NR_SECAO': 'nunique',
             'QT_VOTOS': 'sum'
         }).reset_index()
 
         if 'BAIRRO' in group_cols:
-            locais_info.columns = ['NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO', 'BAIRRO', 'QTD_SECOES', 'TOTAL_VOTOS']
+            locais_info.columns = ['NR_ZONA', 'NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO', 'BAIRRO', 'QTD_SECOES', 'TOTAL_VOTOS']
         else:
-            locais_info.columns = ['NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO', 'QTD_SECOES', 'TOTAL_VOTOS']
+            locais_info.columns = ['NR_ZONA', 'NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO', 'QTD_SECOES', 'TOTAL_VOTOS']
+
+        # Seções de cada local a partir do rollup (o arquivo agregado guarda só uma seção por chave)
+        df_secoes_mapa = secoes_por_local(df_rollup_local, cargo_selecionado, turno_selecionado, municipio_mapa)
+        if df_secoes_mapa is not None:
+            secoes_local = df_secoes_mapa.set_index(['NR_ZONA', 'NR_LOCAL_VOTACAO'])['QT_SECOES']
+            chave_local = pd.MultiIndex.from_arrays([locais_info['NR_ZONA'].astype(int),
+                                                     locais_info['NR_LOCAL_VOTACAO'].astype(int)])
+            qtd_secoes = secoes_local.reindex(chave_local).to_numpy()
+            locais_info['QTD_SECOES'] = pd.Series(qtd_secoes, index=locais_info.index).fillna(
+                locais_info['QTD_SECOES']).astype(int)
 
         # Tentar carregar cache de geocodificação
         cache_geo = None
@@ -290,6 +506,7 @@ if df is not None:
             if endereco_completo in geocode_cache_dict:
                 lat, lon = geocode_cache_dict[endereco_completo]
                 local_data = {
+                    'nr_zona': row['NR_ZONA'],
                     'nr_local': row['NR_LOCAL_VOTACAO'],
                     'nome': row['NM_LOCAL_VOTACAO'],
                     'endereco': row['DS_LOCAL_VOTACAO_ENDERECO'],
@@ -334,6 +551,7 @@ if df is not None:
                         endereco_completo = f"{row['DS_LOCAL_VOTACAO_ENDERECO']}, {municipio_mapa}, MG, Brasil"
 
                         local_data = {
+                            'nr_zona': row['NR_ZONA'],
                             'nr_local': row['NR_LOCAL_VOTACAO'],
                             'nome': row['NM_LOCAL_VOTACAO'],
                             'endereco': row['DS_LOCAL_VOTACAO_ENDERECO'],
@@ -387,64 +605,43 @@ if df is not None:
                     tiles='OpenStreetMap'
                 )
 
-                # Criar cluster de marcadores
-                marker_cluster = MarkerCluster(name="Locais de Votação").add_to(m)
-
-                # Adicionar marcadores para cada local
-                for idx, local in df_locais.iterrows():
-                    # Calcular vencedor no local
-                    df_local = df_municipio_mapa[df_municipio_mapa['NR_LOCAL_VOTACAO'] == local['nr_local']]
-                    votos_local = df_local.groupby('NM_VOTAVEL')['QT_VOTOS'].sum()
-                    votos_validos = votos_local[~votos_local.index.isin(['#NULO#', '#BRANCO#'])]
-
-                    vencedor = "N/A"
-                    votos_vencedor = 0
-                    percentual = 0
-
-                    if len(votos_validos) > 0:
-                        vencedor = votos_validos.idxmax()
-                        votos_vencedor = votos_validos.max()
-                        percentual = (votos_vencedor / local['votos'] * 100) if local['votos'] > 0 else 0
-
-                    # Popup com informações
-                    bairro_info = ""
-                    if 'bairro' in local and pd.notna(local.get('bairro')):
-                        bairro_info = f'<p style="margin: 5px 0;"><b>Bairro:</b> {local["bairro"]}</p>'
-
-                    popup_html = f"""
-                    <div style="font-family: Arial; width: 300px;">
-                        <h4 style="color: #2c3e50; margin-bottom: 10px;">{local['nome']}</h4>
-                        <hr style="margin: 5px 0;">
-                        <p style="margin: 5px 0;"><b>Endereco:</b><br>{local['endereco']}</p>
-                        {bairro_info}
-                        <p style="margin: 5px 0;"><b>Secoes:</b> {local['secoes']}</p>
-                        <p style="margin: 5px 0;"><b>Total de Votos:</b> {local['votos']:,.0f}</p>
-                        <hr style="margin: 5px 0;">
-                        <p style="margin: 5px 0;"><b>1º Colocado ({cargo_selecionado}):</b><br>{vencedor}</p>
-                        <p style="margin: 5px 0;"><b>Votos:</b> {votos_vencedor:,.0f} ({percentual:.1f}%)</p>
-                    </div>
-                    """
-
-                    # Cor do marcador baseada na quantidade de seções
-                    if local['secoes'] >= 10:
-                        cor = 'red'
-                    elif local['secoes'] >= 5:
-                        cor = 'orange'
-                    else:
-                        cor = 'blue'
-
-                    folium.Marker(
-                        location=[local['lat'], local['lon']],
-                        popup=folium.Popup(popup_html, max_width=320),
-                        tooltip=f"{local['nome']} ({local['secoes']} seções)",
-                        icon=folium.Icon(color=cor, icon='info-sign')
-                    ).add_to(marker_cluster)
+                # Primeiro e segundo colocados de todos os locais, em uma passada
+                vencedores = vencedores_por_local(df_municipio_mapa)
+                df_locais = df_locais.join(vencedores, on=['nr_zona', 'nr_local'])
+                if 'PARTIDO_VENCEDOR' in df_locais.columns:
+                    # Partido do colocado (colunas acrescentadas pela filtragem com --partidos)
+                    for prefixo in ('VENCEDOR', 'SEGUNDO'):
+                        com_partido = df_locais[prefixo].notna() & df_locais[f'PARTIDO_{prefixo}'].notna()
+                        df_locais.loc[com_partido, prefixo] = (df_locais.loc[com_partido, prefixo] + ' (' +
+                                                               df_locais.loc[com_partido, f'PARTIDO_{prefixo}'] + ')')
+                df_locais = df_locais.rename(columns={
+                    'VENCEDOR': 'vencedor', 'VOTOS_VENCEDOR': 'votos_vencedor', 'PERCENTUAL': 'percentual',
+                    'SEGUNDO': 'segundo', 'VOTOS_SEGUNDO': 'votos_segundo', 'MARGEM': 'margem',
+                })
+
+                # Todos os locais como dados (GeoJSON ou cluster montado no navegador), ou um marcador por local
+                col_modo, col_cor = st.columns(2)
+                with col_modo:
+                    modo_mapa = st.radio("Desenho do mapa:", MODOS_MAPA, horizontal=True, key='modo_mapa')
+                with col_cor:
+                    cor_por = st.radio("Cor dos locais:", ['Seções', 'Vencedor'], horizontal=True, key='cor_mapa')
+                cores, legenda = colorir(df_locais, 'vencedor' if cor_por == 'Vencedor' else 'secoes')
+
+                if modo_mapa == 'GeoJSON':
+                    camada_geojson(df_locais, cores, cargo_selecionado).add_to(m)
+                elif modo_mapa == 'Cluster rápido':
+                    camada_cluster(df_locais, cores, cargo_selecionado).add_to(m)
+                else:
+                    camada_marcadores(df_locais, cores, cargo_selecionado).add_to(m)
 
                 # Adicionar legenda
-                st.info(f"💡 **Dica:** Clique nos marcadores para ver detalhes. Cores: 🔵 Azul (1-4 seções) | 🟠 Laranja (5-9 seções) | 🔴 Vermelho (10+ seções)")
+                st.markdown("💡 **Dica:** Clique nos locais para ver detalhes. Cores: " +
+                            " | ".join(f"<span style='color:{cor}'>●</span> {html.escape(rotulo)}"
+                                       for rotulo, cor in legenda),
+                            unsafe_allow_html=True)
 
-                # Exibir mapa
-                st_folium(m, width=1200, height=600)
+                # Exibir mapa (sem devolver cliques e zoom ao Streamlit: mover o mapa não refaz a página)
+                st_folium(m, width=1200, height=600, returned_objects=[])
 
                 # Estatísticas do mapa
                 st.subheader(f"📊 Estatísticas - {municipio_mapa}")
@@ -488,10 +685,9 @@ if df is not None:
 st.markdown("---")
 
 # Mostrar nome do arquivo sendo usado
-arquivos = glob.glob(DATA_FILE)
-if arquivos:
-    arquivo_atual = os.path.basename(max(arquivos, key=os.path.getmtime))
-    st.markdown(f"**Arquivo de dados:** `{arquivo_atual}`")
+arquivo_atual = arquivos_dados.get('agregado_parquet') or arquivos_dados.get('agregado_csv')
+if arquivo_atual:
+    st.markdown(f"**Arquivo de dados:** `{os.path.basename(arquivo_atual)}`")
 
 st.markdown("""
 **Fonte original:** Tribunal Superior Eleitoral (TSE)
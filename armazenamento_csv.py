@@ -0,0 +1,157 @@
+"""
+Gravacao e leitura do CSV agregado compactado, com as colunas constantes a parte
+
+Colunas como DT_GERACAO, ANO_ELEICAO, NM_TIPO_ELEICAO, SG_UF e NM_UE tem o mesmo
+valor em todas as linhas do arquivo agregado e ocupam boa parte de cada linha.
+Com compressao (gzip, ou zstd com o pacote zstandard), essas colunas sao gravadas
+uma unica vez em um arquivo de metadados ao lado do CSV
+(*_agregado.meta.json) e as demais linhas passam por um compressor em streaming.
+ler_csv devolve o DataFrame com todas as colunas, na ordem original.
+
+Sem compressao ('nenhuma'), o CSV e gravado completo, como antes, para abrir
+direto em planilhas.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+
+# Compressao -> extensao acrescentada ao nome do CSV
+COMPRESSOES = {'nenhuma': '', 'gzip': '.gz', 'zstd': '.zst'}
+NIVEL_GZIP = 6
+NIVEL_ZSTD = 10
+
+
+def caminho_saida(caminho_csv, compressao):
+    """Nome do arquivo gravado para o CSV com a compressao escolhida (x.csv -> x.csv.gz)"""
+    return caminho_csv + COMPRESSOES[compressao]
+
+
+def caminho_metadados(caminho):
+    """Arquivo de metadados de um CSV agregado (x.csv.gz -> x.meta.json)"""
+    for extensao in COMPRESSOES.values():
+        if extensao and caminho.endswith(extensao):
+            caminho = caminho[:-len(extensao)]
+    if caminho.endswith('.csv'):
+        caminho = caminho[:-len('.csv')]
+    return caminho + '.meta.json'
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("A compressao zstd requer o pacote zstandard (pip install zstandard)")
+    return zstandard
+
+
+def _abrir_escrita(caminho, compressao):
+    if compressao == 'gzip':
+        return gzip.open(caminho, 'wt', compresslevel=NIVEL_GZIP, encoding='utf-8-sig', newline='')
+    if compressao == 'zstd':
+        bruto = open(caminho, 'wb')
+        escritor = _zstandard().ZstdCompressor(level=NIVEL_ZSTD).stream_writer(bruto, closefd=True)
+        return io.TextIOWrapper(escritor, encoding='utf-8-sig', newline='')
+    return open(caminho, 'w', newline='', encoding='utf-8-sig')
+
+
+def gravar_csv(linhas, fieldnames, caminho, compressao='nenhuma', constantes=None):
+    """
+    Grava as linhas agregadas, com compressao em streaming
+
+    Args:
+        linhas: Iteravel de dicts com os campos em texto
+        fieldnames (list): Ordem das colunas
+        caminho (str): Arquivo de destino (ver caminho_saida)
+        compressao (str): 'nenhuma', 'gzip' ou 'zstd' (ver COMPRESSOES)
+        constantes (dict): Coluna -> valor das colunas iguais em todas as linhas; com
+            compressao, ficam so no arquivo de metadados (ignorado sem compressao)
+
+    Returns:
+        int: Numero de linhas gravadas
+    """
+    constantes = dict(constantes or {}) if compressao != 'nenhuma' else {}
+    colunas = [c for c in fieldnames if c not in constantes]
+
+    n = 0
+    with _abrir_escrita(caminho, compressao) as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=colunas, delimiter=';', extrasaction='ignore')
+        writer.writeheader()
+        for row in linhas:
+            writer.writerow(row)
+            n += 1
+
+    if compressao != 'nenhuma':
+        metadados = {'colunas': list(fieldnames), 'constantes': constantes, 'compressao': compressao, 'linhas': n}
+        with open(caminho_metadados(caminho), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, ensure_ascii=False, indent=2)
+    return n
+
+
+def ler_metadados(caminho):
+    """Metadados do CSV agregado (colunas, constantes, compressao), ou None se nao houver"""
+    caminho_meta = caminho_metadados(caminho)
+    if not os.path.exists(caminho_meta):
+        return None
+    with open(caminho_meta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ler_colunas(caminho):
+    """Colunas do CSV agregado, na ordem original (incluindo as constantes dos metadados)"""
+    metadados = ler_metadados(caminho)
+    if metadados:
+        return list(metadados['colunas'])
+    import pandas as pd
+
+    compressao = 'zstd' if caminho.endswith(COMPRESSOES['zstd']) else 'infer'
+    if compressao == 'zstd':
+        _zstandard()
+    return list(pd.read_csv(caminho, sep=';', encoding='utf-8-sig', compression=compressao, nrows=0).columns)
+
+
+def ler_csv(caminho, usecols=None, **opcoes):
+    """
+    Le o CSV agregado (compactado ou nao) com todas as colunas
+
+    As colunas constantes do arquivo de metadados sao recolocadas com o mesmo tipo
+    que o pd.read_csv daria a elas no CSV completo.
+
+    Args:
+        caminho (str): CSV agregado (.csv, .csv.gz ou .csv.zst)
+        usecols (list): Colunas a carregar (None = todas)
+        **opcoes: Repassadas para pd.read_csv (dtype, por exemplo)
+
+    Returns:
+        pandas.DataFrame
+    """
+    import pandas as pd
+
+    compressao = 'infer'
+    if caminho.endswith(COMPRESSOES['zstd']):
+        _zstandard()
+        compressao = 'zstd'
+    metadados = ler_metadados(caminho)
+    constantes = metadados['constantes'] if metadados else {}
+    colunas = metadados['colunas'] if metadados else None
+    if usecols is not None:
+        constantes = {c: v for c, v in constantes.items() if c in usecols}
+        colunas = list(usecols)
+
+    df = pd.read_csv(caminho, sep=';', encoding='utf-8-sig', compression=compressao,
+                     usecols=None if usecols is None else [c for c in usecols if c not in constantes], **opcoes)
+    if not constantes:
+        return df
+
+    # Uma linha com as constantes, lida pelo mesmo parser (mesma inferencia de tipos)
+    texto = io.StringIO()
+    writer = csv.writer(texto, delimiter=';')
+    writer.writerow(constantes.keys())
+    writer.writerow(constantes.values())
+    texto.seek(0)
+    valores = pd.read_csv(texto, sep=';', **{k: v for k, v in opcoes.items() if k == 'dtype'})
+
+    for coluna in constantes:
+        df[coluna] = pd.Series(valores[coluna].iloc[0], index=df.index, dtype=valores[coluna].dtype)
+    return df[[c for c in colunas if c in df.columns]]
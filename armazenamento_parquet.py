@@ -0,0 +1,109 @@
+"""
+Gravacao e leitura do dataset agregado em Parquet particionado
+
+O dataset e particionado por NM_MUNICIPIO / DS_CARGO / NR_TURNO (pastas no
+estilo hive) e as colunas de texto usam codificacao por dicionario, entao as
+colunas constantes (DT_GERACAO, DS_ELEICAO, NM_UE...) quase nao ocupam espaco.
+Quem le o dataset pode carregar apenas as particoes e colunas que precisa.
+
+A gravacao converte as linhas em lotes de LINHAS_POR_LOTE (RecordBatch) e os
+entrega ao writer do dataset conforme sao montados: a memoria fica limitada a um
+lote, e nao a uma copia de todas as linhas em listas Python.
+
+Requer o pacote pyarrow.
+"""
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+PARTICOES = ['NM_MUNICIPIO', 'DS_CARGO', 'NR_TURNO']
+LINHAS_POR_LOTE = 65536
+
+# Colunas numericas (mesmos tipos que o pd.read_csv infere do CSV agregado)
+COLUNAS_INTEIRAS = {
+    'ANO_ELEICAO', 'CD_TIPO_ELEICAO', 'NR_TURNO', 'CD_ELEICAO', 'CD_MUNICIPIO',
+    'NR_ZONA', 'NR_SECAO', 'CD_CARGO', 'NR_VOTAVEL', 'QT_VOTOS',
+    'NR_LOCAL_VOTACAO', 'SQ_CANDIDATO',
+}
+
+
+def _tipo_coluna(coluna):
+    return pa.int64() if coluna in COLUNAS_INTEIRAS else pa.string()
+
+
+def _esquema_particoes():
+    return ds.partitioning(
+        pa.schema([(c, _tipo_coluna(c)) for c in PARTICOES]), flavor='hive'
+    )
+
+
+def _lotes(linhas, esquema, contagem):
+    """Gera RecordBatches de ate LINHAS_POR_LOTE linhas, somando as linhas em contagem"""
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, LINHAS_POR_LOTE))
+        if not lote:
+            return
+        arrays = []
+        for campo in esquema:
+            valores = [row[campo.name] for row in lote]
+            if campo.name in COLUNAS_INTEIRAS:
+                valores = [int(v) if v != '' else None for v in valores]
+            arrays.append(pa.array(valores, type=campo.type))
+        contagem['linhas'] += len(lote)
+        yield pa.RecordBatch.from_arrays(arrays, schema=esquema)
+
+
+def gravar_parquet(linhas, fieldnames, destino):
+    """
+    Grava as linhas agregadas como dataset Parquet particionado, em lotes
+
+    Args:
+        linhas: Iteravel de dicts com os campos em texto (como no CSV), consumido uma vez
+        fieldnames (list): Ordem das colunas
+        destino (str): Pasta do dataset
+
+    Returns:
+        int: Numero de linhas gravadas
+    """
+    esquema = pa.schema([(c, _tipo_coluna(c)) for c in fieldnames])
+    contagem = {'linhas': 0}
+    formato = ds.ParquetFileFormat()
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(esquema, _lotes(linhas, esquema, contagem)),
+        destino,
+        format=formato,
+        file_options=formato.make_write_options(use_dictionary=True, compression='zstd'),
+        partitioning=_esquema_particoes(),
+        existing_data_behavior='delete_matching',
+    )
+    return contagem['linhas']
+
+
+def ler_parquet(caminho, colunas=None, municipios=None, cargos=None, turnos=None):
+    """
+    Le o dataset agregado carregando apenas as particoes e colunas pedidas
+
+    Args:
+        caminho (str): Pasta do dataset
+        colunas (list): Colunas a carregar (None = todas)
+        municipios, cargos, turnos: Valores de NM_MUNICIPIO / DS_CARGO / NR_TURNO a manter
+
+    Returns:
+        pandas.DataFrame
+    """
+    dataset = ds.dataset(caminho, format='parquet', partitioning=_esquema_particoes())
+
+    filtro = None
+    for campo, valores in (('NM_MUNICIPIO', municipios), ('DS_CARGO', cargos), ('NR_TURNO', turnos)):
+        if valores:
+            condicao = ds.field(campo).isin(list(valores))
+            filtro = condicao if filtro is None else filtro & condicao
+
+    return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+
+
+def colunas_dataset(caminho):
+    """Colunas do dataset agregado (as gravadas nos arquivos e as de particao)"""
+    return ds.dataset(caminho, format='parquet', partitioning=_esquema_particoes()).schema.names
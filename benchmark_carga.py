@@ -0,0 +1,68 @@
+"""
+Benchmark da carga do arquivo agregado no dashboard
+
+Compara a leitura completa (todas as colunas, tipos inferidos pelo pandas) com a
+carga tipada do dashboard (carga_dashboard.carregar_agregado: so as colunas
+usadas, nomes em categorias, numeros em inteiros compactos). Mede o tempo de
+carga e a memoria do DataFrame, coluna a coluna.
+
+Uso:
+    python benchmark_carga.py votacao_secao_2022_MG_agregado.csv.gz
+    python benchmark_carga.py votacao_secao_2022_MG_agregado.csv.gz --repeticoes 5
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from armazenamento_csv import ler_csv
+from carga_dashboard import carregar_agregado, memoria_mb, resumo_tipos
+
+
+def medir(carregar, repeticoes):
+    """Menor tempo de carga entre as repeticoes e o DataFrame da ultima"""
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        df = carregar()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos), df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da carga do arquivo agregado no dashboard")
+    parser.add_argument('arquivo', help="CSV agregado (.csv, .csv.gz ou .csv.zst) ou pasta do dataset Parquet")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.arquivo):
+        from armazenamento_parquet import ler_parquet
+        arquivos = {'agregado_parquet': args.arquivo}
+        completo = lambda: ler_parquet(args.arquivo)
+    else:
+        arquivos = {'agregado_csv': args.arquivo}
+        completo = lambda: ler_csv(args.arquivo)
+
+    print("="*80)
+    print(f"BENCHMARK CARGA DO DASHBOARD - {os.path.basename(args.arquivo.rstrip(os.sep))}")
+    print("="*80)
+
+    print("\n>> Leitura completa")
+    t_antes, antes = medir(completo, args.repeticoes)
+    print(">> Carga tipada")
+    t_depois, depois = medir(lambda: carregar_agregado(arquivos), args.repeticoes)
+
+    colunas = pd.concat([resumo_tipos(antes), resumo_tipos(depois)], axis=1, keys=['completa', 'tipada'])
+    print(f"\n{len(antes):,} linhas\n")
+    print(colunas.fillna('-').to_string())
+
+    mb_antes, mb_depois = memoria_mb(antes), memoria_mb(depois)
+    print(f"\n{'':>10}{'Colunas':>10}{'Memoria (MB)':>15}{'Tempo (s)':>12}")
+    print(f"{'completa':>10}{antes.shape[1]:>10}{mb_antes:>15.1f}{t_antes:>12.2f}")
+    print(f"{'tipada':>10}{depois.shape[1]:>10}{mb_depois:>15.1f}{t_depois:>12.2f}")
+    print(f"\n[OK] Memoria {mb_antes / mb_depois:.1f}x menor, carga {t_antes / t_depois:.1f}x mais rapida")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Benchmark offline da camada de download (download_tse.py)
+
+Sobe um servidor HTTP local que imita o CDN do TSE (Range, ETag,
+Last-Modified, 304) com limite de banda por conexao e queda de conexao
+simulada, e mede:
+- vazao com 1 e N conexoes
+- retomada apos queda de conexao
+- requisicao condicional com o cache ja atualizado
+"""
+import argparse
+import email.utils
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import download_tse
+from download_tse import baixar_arquivo
+
+
+class ServidorTSELocal:
+    """Servidor HTTP local com suporte a Range e requisicoes condicionais"""
+
+    def __init__(self, dados, banda_por_conexao=None, quedas=0, cair_apos=None):
+        self.dados = dados
+        self.etag = '"' + hashlib.md5(dados).hexdigest() + '"'
+        self.last_modified = email.utils.formatdate(time.time() - 3600, usegmt=True)
+        self.banda_por_conexao = banda_por_conexao  # bytes/s
+        self.quedas = quedas  # quantas respostas serao interrompidas
+        self.cair_apos = cair_apos  # bytes enviados antes de derrubar a conexao
+        self.bytes_enviados = 0
+        self.requisicoes = 0
+        self._trava = threading.Lock()
+
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._responder(corpo=False)
+
+            def do_GET(self):
+                self._responder(corpo=True)
+
+            def _responder(self, corpo):
+                with servidor._trava:
+                    servidor.requisicoes += 1
+
+                if self.headers.get('If-None-Match') == servidor.etag or \
+                        self.headers.get('If-Modified-Since') == servidor.last_modified:
+                    self.send_response(304)
+                    self.send_header('ETag', servidor.etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                inicio, fim, status = 0, len(servidor.dados) - 1, 200
+                faixa = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if_range = self.headers.get('If-Range')
+                if faixa and (if_range is None or if_range in (servidor.etag, servidor.last_modified)):
+                    inicio = int(faixa.group(1))
+                    if faixa.group(2):
+                        fim = min(int(faixa.group(2)), fim)
+                    status = 206
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/zip')
+                self.send_header('Content-Length', str(fim - inicio + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', servidor.etag)
+                self.send_header('Last-Modified', servidor.last_modified)
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {inicio}-{fim}/{len(servidor.dados)}')
+                self.end_headers()
+                if corpo and servidor._enviar(self.wfile, inicio, fim):
+                    # Fechar o socket para o cliente perceber a queda
+                    self.close_connection = True
+
+        self._http = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._http.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._http.server_port}/votacao_secao_teste.zip'
+
+    def _enviar(self, wfile, inicio, fim):
+        with self._trava:
+            derrubar = self.quedas > 0
+            if derrubar:
+                self.quedas -= 1
+
+        bloco = 64 * 1024
+        enviados = 0
+        t0 = time.perf_counter()
+        pos = inicio
+        try:
+            while pos <= fim:
+                pedaco = self.dados[pos:min(pos + bloco, fim + 1)]
+                if derrubar and enviados + len(pedaco) > self.cair_apos:
+                    wfile.write(pedaco[:self.cair_apos - enviados])
+                    wfile.flush()
+                    self._contar(self.cair_apos - enviados)
+                    break  # Conexao encerrada no meio da resposta
+                wfile.write(pedaco)
+                self._contar(len(pedaco))
+                enviados += len(pedaco)
+                pos += len(pedaco)
+                if self.banda_por_conexao:
+                    atraso = enviados / self.banda_por_conexao - (time.perf_counter() - t0)
+                    if atraso > 0:
+                        time.sleep(atraso)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        return derrubar
+
+    def _contar(self, n):
+        with self._trava:
+            self.bytes_enviados += n
+
+    def __enter__(self):
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+def _medir(servidor, destino, conexoes):
+    enviados_antes = servidor.bytes_enviados
+    t0 = time.perf_counter()
+    resultado = baixar_arquivo(servidor.url, destino, conexoes=conexoes)
+    duracao = time.perf_counter() - t0
+    return resultado, duracao, servidor.bytes_enviados - enviados_antes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do download retomavel/paralelo")
+    parser.add_argument('--tamanho-mb', type=int, default=32, help="Tamanho do arquivo servido")
+    parser.add_argument('--banda-mb', type=float, default=8.0,
+                        help="Limite de banda por conexao no servidor (MB/s)")
+    parser.add_argument('--conexoes', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    dados = os.urandom(args.tamanho_mb * 1024 * 1024)
+    banda = args.banda_mb * 1024 * 1024
+    download_tse.ESPERA_TENTATIVA = 0.1
+    pasta = tempfile.mkdtemp(prefix='bench_download_')
+    resultados = []
+
+    print("="*80)
+    print(f"BENCHMARK DE DOWNLOAD - {args.tamanho_mb} MB, {args.banda_mb} MB/s por conexao")
+    print("="*80)
+
+    try:
+        with ServidorTSELocal(dados, banda_por_conexao=banda) as servidor:
+            for n in args.conexoes:
+                destino = os.path.join(pasta, f'vazao_{n}.zip')
+                _, duracao, enviados = _medir(servidor, destino, n)
+                with open(destino, 'rb') as f:
+                    integro = f.read() == dados
+                resultados.append((f'{n} conexao(oes)', duracao, enviados, integro))
+
+            # Cache atualizado: HEAD condicional responde 304 sem transferir o arquivo
+            destino = os.path.join(pasta, f'vazao_{args.conexoes[0]}.zip')
+            resultado, duracao, enviados = _medir(servidor, destino, 1)
+            resultados.append(('condicional (304)', duracao, enviados, not resultado['baixado']))
+
+        # Queda de conexao na metade do arquivo: o download deve retomar com Range
+        with ServidorTSELocal(dados, banda_por_conexao=banda, quedas=1,
+                              cair_apos=len(dados) // 2) as servidor:
+            destino = os.path.join(pasta, 'retomada.zip')
+            _, duracao, enviados = _medir(servidor, destino, 1)
+            with open(destino, 'rb') as f:
+                integro = f.read() == dados
+            resultados.append(('retomada apos queda', duracao, enviados, integro))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    print(f"\n{'Cenario':<24}{'Tempo (s)':>12}{'Transferido (MB)':>20}{'MB/s':>10}{'OK':>6}")
+    for nome, duracao, enviados, ok in resultados:
+        vazao = enviados / 1024 / 1024 / duracao if duracao > 0 else 0
+        print(f"{nome:<24}{duracao:>12.2f}{enviados / 1024 / 1024:>20.1f}{vazao:>10.1f}{'sim' if ok else 'NAO':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Benchmark da ingestao (filtrar_municipios_stream.py) por estagio, sem acessar o TSE
+
+Usa um ZIP sintetico (gerar_dados_tse.py) ou um ZIP local e mede, para cada
+estagio, o tempo, linhas/s, MB/s e o pico de memoria (RSS). Cada estagio roda
+em um processo novo, para que o pico de memoria seja so dele:
+- inflate: descompactar o CSV
+- indice: montar o indice CD_MUNICIPIO -> NM_MUNICIPIO (municipios_tse)
+- parse: DictReader em todas as linhas
+- filtro: pre-filtro em bytes + DictReader, so selecionando as linhas
+- agregacao: filtro + agregacao + rollup (processar_csv)
+- gravacao: gravar o CSV agregado (na ordem de --ordem) e os rollups (o tempo da
+  agregacao nao entra)
+
+O resultado e salvo em JSON, com a versao do codigo, e pode ser comparado com
+o de uma execucao anterior para achar regressoes.
+
+Uso:
+    python benchmark_ingestao.py --linhas 2000000 --municipios 300
+    python benchmark_ingestao.py --zip votacao_secao_2022_MG.zip --comparar benchmark_anterior.json
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import filtrar_municipios_stream as fms
+from armazenamento_csv import COMPRESSOES, caminho_saida
+from gerar_dados_tse import gerar_zip
+from manifesto_tse import versao_codigo
+from municipios_tse import ResolvedorMunicipios, indice_do_csv
+from rollup_tse import NIVEIS_PADRAO
+
+ESTAGIOS = ('inflate', 'indice', 'parse', 'filtro', 'agregacao', 'gravacao')
+TAMANHO_LEITURA = 16 * 1024 * 1024
+
+
+@contextlib.contextmanager
+def _abrir_csv(arquivo_zip):
+    with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+        csv_file = [f for f in zf.namelist() if f.endswith('.csv')][0]
+        with zf.open(csv_file) as csvf:
+            yield csvf
+
+
+def _inflate(arquivo_zip, opcoes):
+    linhas = 0
+    with _abrir_csv(arquivo_zip) as csvf:
+        for bloco in iter(lambda: csvf.read(TAMANHO_LEITURA), b''):
+            linhas += bloco.count(b'\n')
+    return {'linhas': linhas - 1}
+
+
+def _indice(arquivo_zip, opcoes):
+    with _abrir_csv(arquivo_zip) as csvf:
+        return {'municipios': len(indice_do_csv(csvf))}
+
+
+def _parse(arquivo_zip, opcoes):
+    linhas = 0
+    with _abrir_csv(arquivo_zip) as csvf:
+        for _ in csv.DictReader(io.TextIOWrapper(csvf, encoding='latin-1', newline=''), delimiter=';'):
+            linhas += 1
+    return {'linhas': linhas}
+
+
+def _filtro(arquivo_zip, opcoes):
+    codigos = opcoes['codigos']
+    with _abrir_csv(arquivo_zip) as csvf:
+        if opcoes['prefiltro']:
+            pre_filtro = fms.PreFiltroBytes(csvf.readline().decode('latin-1'), codigos)
+            linhas = pre_filtro.iterar(csvf)
+        else:
+            pre_filtro = None
+            linhas = io.TextIOWrapper(csvf, encoding='latin-1', newline='')
+        total = filtradas = 0
+        for row in csv.DictReader(linhas, delimiter=';'):
+            total += 1
+            if row['CD_MUNICIPIO'] in codigos:
+                filtradas += 1
+    if pre_filtro is not None:
+        total = pre_filtro.total_linhas
+    return {'linhas': total, 'linhas_filtradas': filtradas}
+
+
+def _agregar(arquivo_zip, opcoes):
+    with _abrir_csv(arquivo_zip) as csvf:
+        return fms.processar_csv(csvf, opcoes['engine'], prefiltro=opcoes['prefiltro'], workers=opcoes['workers'],
+                                 niveis_rollup=opcoes['niveis'], codigos=opcoes['codigos'])
+
+
+def _agregacao(arquivo_zip, opcoes):
+    agregador, total_linhas, linhas_filtradas, _ = _agregar(arquivo_zip, opcoes)
+    return {'linhas': total_linhas, 'linhas_filtradas': linhas_filtradas, 'chaves': len(agregador)}
+
+
+def _gravacao(arquivo_zip, opcoes):
+    agregador, _, _, _ = _agregar(arquivo_zip, opcoes)
+    with tempfile.TemporaryDirectory() as pasta:
+        t0 = time.perf_counter()
+        linhas = agregador.gravar(os.path.join(pasta, caminho_saida('agregado.csv', opcoes['compressao'])),
+                                  opcoes['ordem'], opcoes['compressao'])
+        if agregador.rollup:
+            agregador.rollup.gravar(os.path.join(pasta, 'rollup'))
+        segundos = time.perf_counter() - t0
+        tamanho = sum(os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta))
+    return {'linhas': linhas, 'segundos': segundos, 'bytes': tamanho}
+
+
+FUNCOES = {
+    'inflate': _inflate,
+    'indice': _indice,
+    'parse': _parse,
+    'filtro': _filtro,
+    'agregacao': _agregacao,
+    'gravacao': _gravacao,
+}
+
+
+def _executar_estagio(estagio, arquivo_zip, opcoes):
+    """Executa um estagio no processo atual (chamado em um processo novo)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        resultado = FUNCOES[estagio](arquivo_zip, opcoes)
+        resultado.setdefault('segundos', time.perf_counter() - t0)
+    resultado['pico_memoria_mb'] = fms.pico_memoria_mb()
+    return resultado
+
+
+def medir_estagio(estagio, arquivo_zip, opcoes, bytes_csv, repeticoes=1):
+    """Mede um estagio (melhor tempo entre as repeticoes) e calcula as vazoes"""
+    melhor = None
+    for _ in range(repeticoes):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            resultado = executor.submit(_executar_estagio, estagio, arquivo_zip, opcoes).result()
+        if melhor is None or resultado['segundos'] < melhor['segundos']:
+            melhor = resultado
+
+    segundos = max(melhor['segundos'], 1e-9)
+    # Gravacao: vazao em relacao ao que foi gravado; demais: ao CSV descompactado
+    base = melhor.pop('bytes', bytes_csv)
+    melhor['mb'] = round(base / 1024 / 1024, 3)
+    melhor['mb_por_segundo'] = round(base / 1024 / 1024 / segundos, 2)
+    if 'linhas' in melhor:
+        melhor['linhas_por_segundo'] = round(melhor['linhas'] / segundos)
+    melhor['segundos'] = round(melhor['segundos'], 3)
+    return melhor
+
+
+def _commit_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def comparar(atual, anterior, tolerancia):
+    """Imprime a variacao de vazao por estagio e retorna os estagios com regressao"""
+    regressoes = []
+    print(f"\n{'Estagio':<12}{'Antes (MB/s)':>14}{'Agora (MB/s)':>14}{'Variacao':>10}")
+    for estagio, medida in atual['estagios'].items():
+        antes = anterior.get('estagios', {}).get(estagio)
+        if not antes:
+            continue
+        variacao = medida['mb_por_segundo'] / max(antes['mb_por_segundo'], 1e-9) - 1
+        marca = ''
+        if variacao < -tolerancia:
+            regressoes.append(estagio)
+            marca = '  <- regressao'
+        print(f"{estagio:<12}{antes['mb_por_segundo']:>14.1f}{medida['mb_por_segundo']:>14.1f}{variacao:>+10.1%}{marca}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da ingestao por estagio (dados sinteticos ou ZIP local)")
+    parser.add_argument('--zip', dest='arquivo_zip', help="ZIP votacao_secao local (padrao: gerar um sintetico)")
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--municipios', type=int, default=100)
+    parser.add_argument('--candidatos', type=int, default=500)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--dir-dados', default='dados_benchmark', help="Onde guardar os ZIPs sinteticos gerados")
+    parser.add_argument('--estagios', nargs='+', choices=ESTAGIOS, default=list(ESTAGIOS))
+    parser.add_argument('--engine', choices=fms.ENGINES, default='csv')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--sem-prefiltro', action='store_true')
+    parser.add_argument('--niveis', default=','.join(NIVEIS_PADRAO))
+    parser.add_argument('--ordem', choices=fms.ORDENS_SAIDA, default='natural',
+                        help="Ordem do arquivo agregado no estagio de gravacao")
+    parser.add_argument('--compressao', choices=COMPRESSOES, default='gzip',
+                        help="Compressao do arquivo agregado no estagio de gravacao")
+    parser.add_argument('--todos-municipios', action='store_true',
+                        help="Manter todos os municipios (execucao estadual) em vez de MUNICIPIOS_FILTRAR")
+    parser.add_argument('--repeticoes', type=int, default=1, help="Repeticoes por estagio (vale o melhor tempo)")
+    parser.add_argument('--saida', help="JSON de saida (padrao: benchmark_ingestao_<data>.json)")
+    parser.add_argument('--comparar', help="JSON de uma execucao anterior")
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help="Queda de MB/s considerada regressao (padrao: %(default)s)")
+    args = parser.parse_args(argv)
+
+    arquivo_zip = args.arquivo_zip
+    parametros_dados = None
+    if not arquivo_zip:
+        parametros_dados = {'linhas': args.linhas, 'municipios': args.municipios,
+                            'candidatos': args.candidatos, 'semente': args.semente}
+        os.makedirs(args.dir_dados, exist_ok=True)
+        arquivo_zip = os.path.join(args.dir_dados, 'sintetico_{linhas}_{municipios}_{candidatos}_{semente}.zip'
+                                   .format(**parametros_dados))
+        if not os.path.exists(arquivo_zip):
+            print(f"Gerando {arquivo_zip}...")
+            gerar_zip(arquivo_zip + '.tmp', args.linhas, args.municipios, args.candidatos, semente=args.semente)
+            os.replace(arquivo_zip + '.tmp', arquivo_zip)
+
+    with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+        bytes_csv = zf.getinfo([f for f in zf.namelist() if f.endswith('.csv')][0]).file_size
+    with _abrir_csv(arquivo_zip) as csvf:
+        indice = indice_do_csv(csvf)
+    if args.todos_municipios:
+        codigos = indice
+    else:
+        codigos, _ = ResolvedorMunicipios(indice).resolver(fms.MUNICIPIOS_FILTRAR)
+    opcoes = {
+        'engine': args.engine,
+        'workers': args.workers,
+        'prefiltro': not args.sem_prefiltro,
+        'niveis': tuple(n.strip() for n in args.niveis.split(',') if n.strip()),
+        'ordem': args.ordem,
+        'compressao': args.compressao,
+        'codigos': codigos,
+    }
+
+    print("="*80)
+    print(f"BENCHMARK DA INGESTAO - {os.path.basename(arquivo_zip)} "
+          f"({bytes_csv / 1024 / 1024:.1f} MB descompactados, {len(codigos)} municipios selecionados)")
+    print("="*80)
+    print(f"\n{'Estagio':<12}{'Tempo (s)':>11}{'Linhas/s':>14}{'MB/s':>10}{'Pico RSS (MB)':>15}")
+
+    estagios = {}
+    for estagio in args.estagios:
+        medida = medir_estagio(estagio, arquivo_zip, opcoes, bytes_csv, args.repeticoes)
+        estagios[estagio] = medida
+        pico = medida['pico_memoria_mb']
+        linhas_s = f"{medida['linhas_por_segundo']:,}" if 'linhas_por_segundo' in medida else '-'
+        print(f"{estagio:<12}{medida['segundos']:>11.2f}{linhas_s:>14}"
+              f"{medida['mb_por_segundo']:>10.1f}{pico if pico is not None else float('nan'):>15.0f}")
+
+    resultado = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_git(),
+        'versao_codigo': versao_codigo(),
+        'python': sys.version.split()[0],
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'arquivo': os.path.basename(arquivo_zip),
+        'dados_sinteticos': parametros_dados,
+        'mb_csv': round(bytes_csv / 1024 / 1024, 3),
+        'opcoes': dict({k: v for k, v in opcoes.items() if k != 'codigos'}, municipios=len(codigos)),
+        'estagios': estagios,
+    }
+    saida = args.saida or f"benchmark_ingestao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n[OK] Resultado: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print(f"\n[X] Regressao em: {', '.join(regressoes)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark de escalabilidade do modo multiprocesso (--workers)
+
+Processa o mesmo ZIP local com 1, 2, 4 e 8 processos e mede tempo,
+linhas/s e MB/s descompactados, para dimensionar as maquinas de lote.
+
+Uso:
+    python benchmark_workers.py votacao_secao_2022_MG.zip --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+import zipfile
+
+import filtrar_municipios_stream as fms
+from municipios_tse import ResolvedorMunicipios, indice_do_csv
+
+
+def medir(arquivo_zip, workers, prefiltro):
+    with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+        csv_file = [f for f in zf.namelist() if f.endswith('.csv')][0]
+        tamanho = zf.getinfo(csv_file).file_size
+        with zf.open(csv_file) as csvf:
+            codigos, _ = ResolvedorMunicipios(indice_do_csv(csvf)).resolver(fms.MUNICIPIOS_FILTRAR)
+        with zf.open(csv_file) as csvf:
+            t0 = time.perf_counter()
+            agregador, total_linhas, linhas_filtradas, _ = fms.processar_csv(
+                csvf, 'csv', prefiltro=prefiltro, workers=workers, codigos=codigos
+            )
+            duracao = time.perf_counter() - t0
+    return {
+        'workers': workers,
+        'segundos': duracao,
+        'linhas': total_linhas,
+        'filtradas': linhas_filtradas,
+        'chaves': len(agregador),
+        'mb': tamanho / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escalabilidade do --workers")
+    parser.add_argument('arquivo_zip', help="ZIP votacao_secao local")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--sem-prefiltro', action='store_true')
+    args = parser.parse_args()
+
+    print("="*80)
+    print(f"BENCHMARK --workers - {os.path.basename(args.arquivo_zip)} ({os.cpu_count()} CPUs)")
+    print("="*80)
+
+    resultados = []
+    for workers in args.workers:
+        print(f"\n>> {workers} worker(s)")
+        resultados.append(medir(args.arquivo_zip, workers, not args.sem_prefiltro))
+
+    base = resultados[0]['segundos']
+    print(f"\n{'Workers':>8}{'Tempo (s)':>12}{'Linhas/s':>14}{'MB/s':>10}{'Speedup':>10}")
+    for r in resultados:
+        print(f"{r['workers']:>8}{r['segundos']:>12.2f}{r['linhas'] / r['segundos']:>14,.0f}"
+              f"{r['mb'] / r['segundos']:>10.1f}{base / r['segundos']:>10.2f}x")
+
+    if len({(r['linhas'], r['filtradas'], r['chaves']) for r in resultados}) != 1:
+        print("\n[ERRO] Resultados diferentes entre as execucoes!")
+
+
+if __name__ == "__main__":
+    main()
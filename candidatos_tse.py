@@ -0,0 +1,100 @@
+"""
+Partido e coligacao de cada votavel, a partir do cadastro de candidatos do TSE (consulta_cand)
+
+O votacao_secao so identifica o votavel por NR_VOTAVEL, NM_VOTAVEL e SQ_CANDIDATO.
+O cadastro de candidatos (um CSV por UF e um para os cargos nacionais) fica em um
+indice em memoria chaveado por SQ_CANDIDATO, com alguns milhares de entradas, e
+cada linha agregada e cada rollup recebem o partido e a coligacao do votavel.
+
+Votos que nao sao de um candidato do cadastro usam o numero do partido, que e o
+prefixo de dois digitos de NR_VOTAVEL (votos de legenda ja tem so os dois digitos).
+Brancos e nulos (95, 96...) e numeros fora do cadastro nao tem partido: o proprio
+NM_VOTAVEL e usado como sigla e como coligacao, para nao se misturarem.
+"""
+import csv
+import io
+
+# Colunas acrescentadas as linhas agregadas e chave do rollup por partido
+CAMPOS_PARTIDO = ('NR_PARTIDO', 'SG_PARTIDO', 'NM_COLIGACAO')
+
+# Rollups por grupo de votaveis: nome -> colunas do grupo (as ultimas de CAMPOS_PARTIDO)
+AGRUPAMENTOS = {
+    'partido': CAMPOS_PARTIDO,
+    'coligacao': ('NM_COLIGACAO',),
+}
+
+# Arquivo do TSE: um ZIP por ano, com um CSV por UF e o dos cargos nacionais (_BR.csv)
+URL_MODELO_CANDIDATOS = "https://cdn.tse.jus.br/estatistica/sead/odsele/consulta_cand/consulta_cand_{ano}.zip"
+
+# Brancos, nulos e anulados: numeros que nunca sao de partido
+VOTOS_SEM_PARTIDO = ('95', '96', '97', '98')
+
+# Valores do TSE para campo vazio ou sem coligacao (o partido concorre sozinho)
+SEM_VALOR = ('', '#NULO#', '#NE#', 'PARTIDO ISOLADO')
+
+
+def _valor(texto):
+    return '' if texto in SEM_VALOR else texto
+
+
+class IndiceCandidatos:
+    """Cadastro de candidatos: SQ_CANDIDATO -> (NR_PARTIDO, SG_PARTIDO, NM_COLIGACAO)"""
+
+    def __init__(self):
+        self.candidatos = {}
+        self.partidos = {}  # NR_PARTIDO -> SG_PARTIDO
+        self.coligacoes = {}  # (CD_CARGO, NR_PARTIDO) -> NM_COLIGACAO, para os votos de legenda
+
+    def adicionar(self, row):
+        nr_partido, sg_partido = row['NR_PARTIDO'], row['SG_PARTIDO']
+        # Sem coligacao: federacao (2022 em diante) ou o proprio partido
+        coligacao = _valor(row.get('NM_COLIGACAO', '')) or _valor(row.get('NM_FEDERACAO', '')) or sg_partido
+        self.candidatos[row['SQ_CANDIDATO']] = (nr_partido, sg_partido, coligacao)
+        self.partidos.setdefault(nr_partido, sg_partido)
+        self.coligacoes.setdefault((row['CD_CARGO'], nr_partido), coligacao)
+
+    def ler(self, csvf):
+        """
+        Acrescenta os candidatos de um CSV do consulta_cand
+
+        Args:
+            csvf: Arquivo binario com o CSV (latin-1, separado por ';')
+
+        Returns:
+            int: Numero de linhas lidas
+        """
+        reader = csv.DictReader(io.TextIOWrapper(csvf, encoding='latin-1', newline=''), delimiter=';')
+        n = 0
+        for row in reader:
+            self.adicionar(row)
+            n += 1
+        return n
+
+    def partido(self, cd_cargo, nr_votavel, sq_candidato='', nm_votavel=''):
+        """
+        Partido e coligacao de um votavel
+
+        Returns:
+            tuple: (NR_PARTIDO, SG_PARTIDO, NM_COLIGACAO)
+        """
+        encontrado = self.candidatos.get(sq_candidato)
+        if encontrado is not None:
+            return encontrado
+        nr_partido = nr_votavel[:2]
+        sg_partido = None if nr_votavel in VOTOS_SEM_PARTIDO else self.partidos.get(nr_partido)
+        if sg_partido is None:
+            return nr_partido, nm_votavel, nm_votavel
+        return nr_partido, sg_partido, self.coligacoes.get((cd_cargo, nr_partido), sg_partido)
+
+    def grupo(self, agrupamento, cd_cargo, nr_votavel, sq_candidato='', nm_votavel=''):
+        """Valores das colunas de um agrupamento (ver AGRUPAMENTOS) para um votavel"""
+        return self.partido(cd_cargo, nr_votavel, sq_candidato, nm_votavel)[-len(AGRUPAMENTOS[agrupamento]):]
+
+    def enriquecer(self, row):
+        """Linha agregada (dict) com as colunas de CAMPOS_PARTIDO"""
+        valores = self.partido(row['CD_CARGO'], row['NR_VOTAVEL'], row.get('SQ_CANDIDATO', ''), row['NM_VOTAVEL'])
+        row.update(zip(CAMPOS_PARTIDO, valores))
+        return row
+
+    def __len__(self):
+        return len(self.candidatos)
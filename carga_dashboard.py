@@ -0,0 +1,76 @@
+"""
+Carga tipada do arquivo agregado para o dashboard
+
+O arquivo agregado tem as 26 colunas do votacao_secao (mais as de partido, com
+--partidos), mas o dashboard usa poucas. ESQUEMA_DASHBOARD lista as colunas que ele
+usa e o tipo de cada uma:
+- nomes e enderecos repetidos em milhares de linhas viram categorias (cada texto
+  distinto fica uma vez na memoria e cada linha guarda um codigo inteiro)
+- codigos e votos viram inteiros compactos, do menor tamanho que cabe no valor
+
+As demais colunas (DT_GERACAO, DS_ELEICAO, SQ_CANDIDATO...) nao sao lidas. No CSV,
+o parser ja converte cada coluna para o tipo final (usecols e dtype do pd.read_csv).
+No Parquet, so as colunas pedidas sao lidas do disco.
+
+benchmark_carga.py compara esta carga com a leitura completa, sem tipos.
+"""
+import pandas as pd
+
+from armazenamento_csv import ler_colunas, ler_csv
+
+# Coluna -> tipo no DataFrame do dashboard (colunas ausentes do arquivo sao ignoradas)
+ESQUEMA_DASHBOARD = {
+    'NR_TURNO': 'int8',
+    'NM_MUNICIPIO': 'category',
+    'NR_ZONA': 'int16',
+    'NR_SECAO': 'int16',
+    'DS_CARGO': 'category',
+    'NR_VOTAVEL': 'int32',
+    'NM_VOTAVEL': 'category',
+    'QT_VOTOS': 'int32',
+    'NR_LOCAL_VOTACAO': 'int16',
+    'NM_LOCAL_VOTACAO': 'category',
+    'DS_LOCAL_VOTACAO_ENDERECO': 'category',
+    'SG_PARTIDO': 'category',
+    'NM_COLIGACAO': 'category',
+}
+
+
+def carregar_agregado(arquivos, esquema=None):
+    """
+    Le o arquivo agregado so com as colunas do esquema, ja nos tipos do esquema
+
+    Args:
+        arquivos (dict): Arquivos gerados pela filtragem ('agregado_parquet' ou
+            'agregado_csv', ver filtrar_municipios_stream.ingerir)
+        esquema (dict): Coluna -> tipo (padrao: ESQUEMA_DASHBOARD)
+
+    Returns:
+        pandas.DataFrame
+    """
+    esquema = ESQUEMA_DASHBOARD if esquema is None else esquema
+    if 'agregado_parquet' in arquivos:
+        try:
+            from armazenamento_parquet import colunas_dataset, ler_parquet
+        except ImportError:
+            raise ImportError("A leitura do dataset Parquet requer o pacote pyarrow (pip install pyarrow)")
+        caminho = arquivos['agregado_parquet']
+        presentes = set(colunas_dataset(caminho))
+        tipos = {c: t for c, t in esquema.items() if c in presentes}
+        return ler_parquet(caminho, colunas=list(tipos)).astype(tipos)
+
+    caminho = arquivos['agregado_csv']
+    presentes = set(ler_colunas(caminho))
+    tipos = {c: t for c, t in esquema.items() if c in presentes}
+    return ler_csv(caminho, usecols=list(tipos), dtype=tipos)
+
+
+def memoria_mb(df):
+    """Memoria ocupada pelo DataFrame em MB, contando o conteudo dos textos"""
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def resumo_tipos(df):
+    """Uma linha por coluna: tipo e memoria em MB (para comparar cargas)"""
+    uso = df.memory_usage(deep=True, index=False) / 1024 / 1024
+    return pd.DataFrame({'tipo': df.dtypes.astype(str), 'mb': uso.round(2)})
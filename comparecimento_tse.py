@@ -0,0 +1,89 @@
+"""
+Comparecimento e abstencao por local de votacao (arquivo detalhe_votacao_secao do TSE)
+
+O arquivo de detalhe traz, por secao, turno e cargo, o numero de eleitores aptos,
+o comparecimento, as abstencoes e os votos brancos/nulos, mas nao o endereco do
+local de votacao. A ligacao e feita por um indice secao -> local, montado na
+passada pelo votacao_secao (IndiceSecoes, a partir do rollup). Em seguida,
+o arquivo de detalhe e lido em streaming e cada linha e somada ao seu local:
+nenhum dos dois arquivos fica inteiro na memoria, so o indice (uma entrada por
+secao) e os totais por local.
+"""
+from collections import defaultdict
+
+# Contagens somadas por local (as que existirem no cabecalho do arquivo de detalhe)
+CAMPOS_DETALHE = ('QT_APTOS', 'QT_COMPARECIMENTO', 'QT_ABSTENCOES', 'QT_VOTOS_NOMINAIS', 'QT_VOTOS_LEGENDA',
+                  'QT_VOTOS_BRANCOS', 'QT_VOTOS_NULOS')
+
+# Arquivo do TSE: um ZIP por ano, com um CSV por UF (detalhe_votacao_secao_{ano}_{uf}.csv)
+URL_MODELO_DETALHE = "https://cdn.tse.jus.br/estatistica/sead/odsele/detalhe_votacao_secao/detalhe_votacao_secao_{ano}.zip"
+
+
+class IndiceSecoes:
+    """
+    Indice (CD_MUNICIPIO, NR_ZONA, NR_SECAO) -> local de votacao
+
+    Montado a partir das secoes e locais que o rollup (rollup_tse.RollupNiveis) ja
+    registra na passada pelo votacao_secao, sem custo extra por linha.
+    """
+
+    def __init__(self, rollup):
+        self.secoes = {(municipio, zona, secao): (municipio, zona, local)
+                       for _, _, municipio, zona, secao, local in rollup.secoes}
+        self.locais = rollup.locais  # (CD_MUNICIPIO, NR_ZONA, NR_LOCAL_VOTACAO) -> (nome, endereco)
+        self.municipios = rollup.municipios  # CD_MUNICIPIO -> NM_MUNICIPIO
+
+    def __len__(self):
+        return len(self.secoes)
+
+
+class Comparecimento:
+    """
+    Soma as contagens do arquivo de detalhe por turno, cargo e local de votacao
+
+    Args:
+        indice (IndiceSecoes): Secoes -> locais, da passada pelo votacao_secao
+        fieldnames (list): Cabecalho do arquivo de detalhe (define as colunas em CAMPOS_DETALHE)
+    """
+
+    def __init__(self, indice, fieldnames):
+        self.indice = indice
+        self.campos = [c for c in CAMPOS_DETALHE if c in fieldnames]
+        self.totais = defaultdict(lambda: [0] * (len(self.campos) + 1))  # [secoes, contagens...]
+        self.cargos = {}
+        self.municipios = dict(indice.municipios)  # grafia do votacao_secao, se a secao estiver nele
+        self.sem_local = 0  # linhas de secoes ausentes do votacao_secao
+
+    def adicionar(self, row):
+        cd_municipio = row['CD_MUNICIPIO']
+        local = self.indice.secoes.get((cd_municipio, row['NR_ZONA'], row['NR_SECAO']))
+        if local is None:
+            # Secao sem nenhum voto no votacao_secao: usa o local da propria linha, se houver
+            self.sem_local += 1
+            local = (cd_municipio, row['NR_ZONA'], row.get('NR_LOCAL_VOTACAO', ''))
+        totais = self.totais[(row['NR_TURNO'], row['CD_CARGO']) + local]
+        totais[0] += 1
+        for i, campo in enumerate(self.campos, 1):
+            totais[i] += int(row[campo] or 0)
+        self.cargos.setdefault(row['CD_CARGO'], row['DS_CARGO'])
+        self.municipios.setdefault(cd_municipio, row['NM_MUNICIPIO'])
+
+    def cabecalho(self):
+        """Colunas do CSV (as mesmas chaves do rollup por local, mais as contagens)"""
+        return ['NR_TURNO', 'CD_CARGO', 'DS_CARGO', 'CD_MUNICIPIO', 'NM_MUNICIPIO', 'NR_ZONA',
+                'NR_LOCAL_VOTACAO', 'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO', 'QT_SECOES'] + self.campos
+
+    def linhas(self):
+        """Gera as linhas ordenadas pela chave (ver chave_ordenacao), com o nome do municipio na posicao 4"""
+        for (turno, cargo, municipio, zona, local), totais in sorted(self.totais.items()):
+            nm_local, endereco = self.indice.locais.get((municipio, zona, local), ('', ''))
+            yield [turno, cargo, self.cargos[cargo], municipio, self.municipios[municipio], zona, local,
+                   nm_local, endereco] + totais
+
+    def __len__(self):
+        return len(self.totais)
+
+
+def chave_ordenacao(linha):
+    """Chave de ordenacao de uma linha do CSV (a mesma usada por Comparecimento.linhas)"""
+    return linha[0], linha[1], linha[3], linha[5], linha[6]
@@ -0,0 +1,240 @@
+"""
+Download dos arquivos ZIP do TSE com cache local
+
+- Requisicoes condicionais (ETag / Last-Modified): arquivo inalterado nao e baixado de novo
+- Retomada com HTTP Range apos queda de conexao
+- Divisao opcional do arquivo em N faixas de bytes baixadas em paralelo
+
+O andamento (cache atualizado, MB baixados, novas tentativas) vai para o callback
+progresso de baixar_arquivo, como os eventos de filtrar_municipios_stream.ingerir:
+o modulo nao imprime nada.
+"""
+import json
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+TAMANHO_CHUNK = 1024 * 1024
+TENTATIVAS = 5
+ESPERA_TENTATIVA = 2  # segundos (dobra a cada nova tentativa)
+TIMEOUT = 180
+
+
+def _caminho_meta(destino):
+    return destino + '.meta.json'
+
+
+def _ler_meta(destino):
+    try:
+        with open(_caminho_meta(destino), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _salvar_meta(destino, meta):
+    caminho = _caminho_meta(destino)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _mesma_versao(meta, info):
+    """Verifica se a copia parcial/local corresponde a versao atual do servidor"""
+    if meta.get('tamanho') != info['tamanho']:
+        return False
+    if info['etag'] or meta.get('etag'):
+        return meta.get('etag') == info['etag']
+    return meta.get('last_modified') == info['last_modified']
+
+
+def consultar_servidor(session, url, meta=None):
+    """
+    Consulta os metadados do arquivo remoto (HEAD condicional)
+
+    Returns:
+        dict: tamanho, etag, last_modified, aceita_range e inalterado
+    """
+    headers = {}
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = session.head(url, headers=headers, allow_redirects=True, timeout=TIMEOUT)
+    if response.status_code == 304:
+        return {'inalterado': True}
+    response.raise_for_status()
+
+    tamanho = response.headers.get('Content-Length')
+    return {
+        'inalterado': False,
+        'tamanho': int(tamanho) if tamanho is not None else None,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'aceita_range': response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+    }
+
+
+def _avisar(callback, mensagem, **campos):
+    if callback is not None:
+        callback({'etapa': 'download', 'mensagem': mensagem, **campos})
+
+
+def _validador_if_range(info):
+    """
+    Validador do If-Range: a ETag so se for forte (o HTTP nao aceita ETag fraca, W/"...",
+    em If-Range), senao o Last-Modified; None se nao houver nenhum dos dois
+    """
+    if info['etag'] and not info['etag'].startswith('W/'):
+        return info['etag']
+    return info['last_modified']
+
+
+def _baixar_faixa(session, url, caminho_parte, faixa, info, progresso, trava):
+    """
+    Baixa uma faixa [inicio, fim] para a posicao correspondente do arquivo parcial,
+    retomando de onde parou em caso de erro
+    """
+    espera = ESPERA_TENTATIVA
+    for tentativa in range(1, TENTATIVAS + 1):
+        posicao = faixa['inicio'] + faixa['baixado']
+        if posicao > faixa['fim']:
+            return
+
+        headers = {'Range': f"bytes={posicao}-{faixa['fim']}"}
+        validador = _validador_if_range(info)
+        if validador:
+            headers['If-Range'] = validador
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code != 206:
+                    response.raise_for_status()
+                    raise IOError("Servidor ignorou o Range (arquivo alterado durante o download?)")
+
+                with open(caminho_parte, 'r+b') as f:
+                    f.seek(posicao)
+                    for chunk in response.iter_content(chunk_size=TAMANHO_CHUNK):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        with trava:
+                            faixa['baixado'] += len(chunk)
+                            progresso['bytes'] += len(chunk)
+                            progresso['callback']()
+
+            if faixa['inicio'] + faixa['baixado'] > faixa['fim']:
+                return
+            raise IOError("Conexao encerrada antes do fim da faixa")
+
+        except (requests.RequestException, IOError) as e:
+            if tentativa == TENTATIVAS:
+                raise
+            _avisar(progresso['evento'], f"  [AVISO] Faixa {faixa['inicio']}-{faixa['fim']}: {e} "
+                                         f"(tentativa {tentativa}/{TENTATIVAS}, retomando em {espera}s)")
+            time.sleep(espera)
+            espera *= 2
+
+
+def _baixar_completo(session, url, caminho_parte):
+    """Download simples sem Range (servidor sem suporte ou tamanho desconhecido)"""
+    total = 0
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        with open(caminho_parte, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=TAMANHO_CHUNK):
+                f.write(chunk)
+                total += len(chunk)
+    return total
+
+
+def baixar_arquivo(url, destino, conexoes=1, session=None, progresso=None):
+    """
+    Baixa um arquivo para o cache local, reaproveitando o que ja existe
+
+    Args:
+        url (str): URL do arquivo
+        destino (str): Caminho do arquivo local
+        conexoes (int): Numero de faixas de bytes baixadas em paralelo
+        session: requests.Session opcional
+        progresso (callable): Recebe um dict por evento, com etapa ('download'), mensagem
+            e, a cada 10MB, bytes. Pode ser chamado pelas threads das faixas. Padrao: nenhum
+
+    Returns:
+        dict: caminho, baixado (False se o cache ja estava atualizado) e bytes transferidos
+    """
+    if session is None:
+        session = requests.Session()
+        adaptador = requests.adapters.HTTPAdapter(pool_maxsize=max(conexoes, 10))
+        session.mount('http://', adaptador)
+        session.mount('https://', adaptador)
+    caminho_parte = destino + '.part'
+    meta = _ler_meta(destino)
+
+    # Requisicao condicional: so baixa se o arquivo mudou no servidor
+    meta_local = meta if os.path.exists(destino) and meta.get('completo') else None
+    info = consultar_servidor(session, url, meta_local)
+    if info['inalterado'] or (meta_local and _mesma_versao(meta_local, info)):
+        _avisar(progresso, f"[OK] Arquivo em cache atualizado: {destino}")
+        return {'caminho': destino, 'baixado': False, 'bytes': 0}
+
+    if not info['aceita_range'] or info['tamanho'] is None:
+        _avisar(progresso, "  Servidor nao aceita Range: download sem retomada")
+        total = _baixar_completo(session, url, caminho_parte)
+        os.replace(caminho_parte, destino)
+        _salvar_meta(destino, {'url': url, 'tamanho': total, 'etag': info['etag'],
+                               'last_modified': info['last_modified'], 'completo': True})
+        return {'caminho': destino, 'baixado': True, 'bytes': total}
+
+    tamanho = info['tamanho']
+
+    # Retomar download parcial da mesma versao do arquivo
+    if meta.get('faixas') and not meta.get('completo') and _mesma_versao(meta, info) \
+            and os.path.exists(caminho_parte):
+        faixas = meta['faixas']
+        ja_baixado = sum(f['baixado'] for f in faixas)
+        _avisar(progresso, f"  Retomando download: {ja_baixado / 1024 / 1024:.1f} MB ja baixados")
+    else:
+        n = max(1, min(conexoes, tamanho // TAMANHO_CHUNK or 1))
+        passo = max(1, -(-tamanho // n))
+        faixas = [{'inicio': i, 'fim': min(i + passo, tamanho) - 1, 'baixado': 0}
+                  for i in range(0, tamanho, passo)]
+        with open(caminho_parte, 'wb') as f:
+            f.truncate(tamanho)
+
+    meta = {'url': url, 'tamanho': tamanho, 'etag': info['etag'],
+            'last_modified': info['last_modified'], 'completo': False, 'faixas': faixas}
+    _salvar_meta(destino, meta)
+
+    trava = threading.Lock()
+    marco = {'ultimo': 0}
+
+    def registrar():
+        # Persistir o progresso a cada 10MB para permitir retomar depois
+        if andamento['bytes'] - marco['ultimo'] >= 10 * 1024 * 1024:
+            marco['ultimo'] = andamento['bytes']
+            _salvar_meta(destino, meta)
+            _avisar(progresso, f"  Baixados: {andamento['bytes'] / 1024 / 1024:.1f} MB", bytes=andamento['bytes'])
+
+    andamento = {'bytes': 0, 'callback': registrar, 'evento': progresso}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(faixas))) as executor:
+            futuros = [executor.submit(_baixar_faixa, session, url, caminho_parte,
+                                       faixa, info, andamento, trava)
+                       for faixa in faixas]
+            for futuro in futuros:
+                futuro.result()
+    finally:
+        _salvar_meta(destino, meta)
+
+    os.replace(caminho_parte, destino)
+    meta['completo'] = True
+    del meta['faixas']
+    _salvar_meta(destino, meta)
+    return {'caminho': destino, 'baixado': True, 'bytes': andamento['bytes']}
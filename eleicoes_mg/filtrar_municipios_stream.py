@@ -67,7 +67,7 @@ try:
         for chunk in response.iter_content(chunk_size=8192):
             f.write(chunk)
             total_size += len(chunk)
-            if total_size % (10 * 1024 * 1024) == 0:  # A cada 10MB
+            if total_size // (10 * 1024 * 1024) > (total_size - len(chunk)) // (10 * 1024 * 1024):  # A cada 10MB
                 print(f"  Baixados: {total_size / 1024 / 1024:.1f} MB")
 
     print(f"[OK] Download concluido: {total_size / 1024 / 1024:.2f} MB")
@@ -1,11 +1,37 @@
+"""
+Filtro de dados eleitorais do TSE (votacao_secao) por municipio
+
+O ZIP do TSE e descompactado em streaming, a medida que os bytes chegam
+da rede, sem gravar arquivo temporario em disco.
+"""
 import requests
 import zipfile
 import csv
 import io
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+import argparse
+from array import array
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from armazenamento_csv import COMPRESSOES, caminho_metadados, caminho_saida, gravar_csv
+from candidatos_tse import URL_MODELO_CANDIDATOS, IndiceCandidatos
+from comparecimento_tse import URL_MODELO_DETALHE, Comparecimento, IndiceSecoes
+from download_tse import baixar_arquivo
+from manifesto_tse import DIR_PARTICOES, Manifesto, impressao_remota, limpar_execucoes, versao_codigo
+from matriz_secoes import MatrizSecoes
+from metricas_ingestao import ARQUIVO_METRICAS, LeitorMedido, MetricasIngestao, pico_memoria_mb, tamanho_em_disco
+from municipios_tse import ColetorMunicipios, ResolvedorMunicipios, indice_do_csv, ler_lista_municipios
+from rollup_tse import NIVEIS, NIVEIS_PADRAO, RollupNiveis
 
-# Lista de municípios para filtrar (normalizados - sem acentos)
+# Lista padrao de municípios para filtrar (sem acentos; a grafia e resolvida para o
+# CD_MUNICIPIO do TSE por municipios_tse, ver --municipios / --arquivo-municipios)
 MUNICIPIOS_FILTRAR = {
     'BELO HORIZONTE',
     'RIBEIRAO DAS NEVES',
@@ -37,153 +63,1495 @@ MUNICIPIOS_FILTRAR = {
     'FELISBURGO'
 }
 
-print("="*80)
-print("FILTRO DE DADOS ELEITORAIS - TSE 2022")
-print("="*80)
-print(f"\nMunicipios a filtrar: {len(MUNICIPIOS_FILTRAR)}")
-
 # URL dos dados
-DATA_URL = "https://cdn.tse.jus.br/estatistica/sead/odsele/votacao_secao/votacao_secao_2022_MG.zip"
-OUTPUT_FILE = f"eleicoes_2022_mg_filtrados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-print("\n" + "="*80)
-print("Baixando e processando arquivo (streaming)...")
-print("="*80)
-
-try:
-    # Download com streaming
-    print("[1/4] Iniciando download...")
-    response = requests.get(DATA_URL, stream=True, timeout=180)
-    response.raise_for_status()
-
-    # Salvar ZIP temporariamente
-    print("[2/4] Salvando arquivo temporario...")
-    zip_path = "temp_votacao.zip"
-    total_size = 0
-    with open(zip_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-            total_size += len(chunk)
-            if total_size % (10 * 1024 * 1024) == 0:  # A cada 10MB
-                print(f"  Baixados: {total_size / 1024 / 1024:.1f} MB")
-
-    print(f"[OK] Download concluido: {total_size / 1024 / 1024:.2f} MB")
-
-    # Processar ZIP
-    print("[3/4] Extraindo e filtrando dados...")
-    with zipfile.ZipFile(zip_path, 'r') as zf:
-        csv_file = [f for f in zf.namelist() if f.endswith('.csv')][0]
-        print(f"  Processando: {csv_file}")
-
-        with zf.open(csv_file) as csvf:
-            # Ler como texto
-            text_file = io.TextIOWrapper(csvf, encoding='latin-1')
-            reader = csv.DictReader(text_file, delimiter=';')
-
-            # Criar arquivo de saida
-            with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8-sig') as outf:
-                writer = None
-                total_linhas = 0
-                linhas_filtradas = 0
-                municipios_encontrados = set()
-
-                for row in reader:
-                    total_linhas += 1
-
-                    # Verificar se o municipio esta na lista
-                    if row['NM_MUNICIPIO'] in MUNICIPIOS_FILTRAR:
-                        # Criar writer na primeira linha filtrada
-                        if writer is None:
-                            writer = csv.DictWriter(outf, fieldnames=reader.fieldnames, delimiter=';')
-                            writer.writeheader()
-
-                        writer.writerow(row)
-                        linhas_filtradas += 1
-                        municipios_encontrados.add(row['NM_MUNICIPIO'])
-
-                    # Progresso a cada 100k linhas
-                    if total_linhas % 100000 == 0:
-                        print(f"  Processadas: {total_linhas:,} | Filtradas: {linhas_filtradas:,}")
-
-    print(f"[OK] Total processado: {total_linhas:,} linhas")
-    print(f"[OK] Total filtrado: {linhas_filtradas:,} linhas")
-    print(f"[OK] Municipios encontrados: {len(municipios_encontrados)}")
-
-    # Limpar arquivo temporario
-    print("[4/4] Limpando arquivos temporarios...")
-    import os
-    os.remove(zip_path)
-
-    # AGREGAÇÃO DOS DADOS POR ENDEREÇO E CANDIDATO
-    print("\n" + "="*80)
-    print("[5/5] Agregando dados por endereço e candidato...")
-    print("="*80)
+URL_MODELO = "https://cdn.tse.jus.br/estatistica/sead/odsele/votacao_secao/votacao_secao_{ano}_{uf}.zip"
+DATA_URL = URL_MODELO.format(ano=2022, uf='MG')
+# Detalhe por secao (aptos, comparecimento, abstencoes): um ZIP por ano, um CSV por UF
+DETALHE_URL = URL_MODELO_DETALHE.format(ano=2022)
+# Cadastro de candidatos (partido e coligacao): um ZIP por ano, um CSV por UF e o nacional
+CANDIDATOS_URL = URL_MODELO_CANDIDATOS.format(ano=2022)
+
+
+def arquivo_saida():
+    """Nome do CSV de saida com a data e hora atuais (os demais arquivos usam o mesmo prefixo)"""
+    return f"eleicoes_2022_mg_filtrados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+
+OUTPUT_FILE = arquivo_saida()
+
+# Download em streaming
+TAMANHO_CHUNK_REDE = 1024 * 1024
+CHUNKS_EM_BUFFER = 16  # Limita a memoria usada pela leitura antecipada da rede
+
+# Cabecalhos do formato ZIP
+ASSINATURA_ARQUIVO_LOCAL = b'PK\x03\x04'
+ASSINATURA_DESCRITOR = b'PK\x07\x08'
+CABECALHO_LOCAL = struct.Struct('<4sHHHHHIIIHH')
+FLAG_DESCRITOR_DADOS = 0x08
+METODO_ARMAZENADO = 0
+METODO_DEFLATE = 8
+
+
+class FluxoRede:
+    """
+    Le os chunks da resposta HTTP em uma thread separada
+
+    A cada 10MB recebidos, chama progresso com um evento de etapa 'download'
+    (padrao: imprimir_progresso).
+    """
+
+    def __init__(self, response, tamanho_chunk=TAMANHO_CHUNK_REDE, progresso=None):
+        self.progresso = progresso or imprimir_progresso
+        self.total_bytes = 0
+        self.segundos_rede = 0.0  # do primeiro ao ultimo chunk recebido
+        self.segundos_espera = 0.0  # tempo do leitor parado esperando a rede
+        self._buffer = b''
+        self._fila = queue.Queue(maxsize=CHUNKS_EM_BUFFER)
+        self._fim = False
+        self._thread = threading.Thread(
+            target=self._baixar, args=(response, tamanho_chunk), daemon=True
+        )
+        self._thread.start()
+
+    def _baixar(self, response, tamanho_chunk):
+        inicio = time.perf_counter()
+        try:
+            for chunk in response.iter_content(chunk_size=tamanho_chunk):
+                if chunk:
+                    self._fila.put(chunk)
+            self.segundos_rede = time.perf_counter() - inicio
+            self._fila.put(None)
+        except Exception as e:
+            self._fila.put(e)
+
+    def ler_chunk(self):
+        """Retorna o proximo bloco de bytes recebido (b'' no fim do fluxo)"""
+        if self._buffer:
+            chunk, self._buffer = self._buffer, b''
+            return chunk
+        if self._fim:
+            return b''
+
+        inicio = time.perf_counter()
+        item = self._fila.get()
+        self.segundos_espera += time.perf_counter() - inicio
+        if item is None:
+            self._fim = True
+            return b''
+        if isinstance(item, Exception):
+            self._fim = True
+            raise item
+
+        self.total_bytes += len(item)
+        if self.total_bytes // (10 * 1024 * 1024) > (self.total_bytes - len(item)) // (10 * 1024 * 1024):
+            self.progresso({
+                'etapa': 'download',
+                'bytes': self.total_bytes,
+                'mensagem': f"  Baixados: {self.total_bytes / 1024 / 1024:.1f} MB",
+            })
+        return item
+
+    def ler_exato(self, n):
+        """Le exatamente n bytes do fluxo"""
+        partes = []
+        faltam = n
+        while faltam > 0:
+            chunk = self.ler_chunk()
+            if not chunk:
+                raise EOFError("Fluxo ZIP terminou antes do esperado")
+            partes.append(chunk[:faltam])
+            if len(chunk) > faltam:
+                self.devolver(chunk[faltam:])
+            faltam -= min(len(chunk), faltam)
+        return b''.join(partes)
+
+    def devolver(self, dados):
+        """Devolve bytes lidos a mais para o inicio do fluxo"""
+        if dados:
+            self._buffer = dados + self._buffer
+
+
+class LeitorZipStream(io.RawIOBase):
+    """
+    Descompacta uma entrada de um ZIP a partir do cabecalho local,
+    sem precisar do diretorio central no fim do arquivo
+    """
+
+    def __init__(self, fluxo, cabecalho):
+        super().__init__()
+        self._fluxo = fluxo
+        self._flags = cabecalho['flags']
+        self._metodo = cabecalho['metodo']
+        self._crc_esperado = cabecalho['crc']
+        self._restante = cabecalho['tamanho_compactado']
+        self._crc = 0
+        self._pendente = memoryview(b'')
+        self._terminado = False
+
+        if self._metodo == METODO_DEFLATE:
+            self._inflador = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif self._metodo == METODO_ARMAZENADO and not self._flags & FLAG_DESCRITOR_DADOS:
+            self._inflador = None
+        else:
+            raise ValueError(f"Metodo de compressao nao suportado em streaming: {self._metodo}")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._pendente and not self._terminado:
+            self._pendente = memoryview(self._proximo_bloco())
+
+        n = min(len(b), len(self._pendente))
+        b[:n] = self._pendente[:n]
+        self._pendente = self._pendente[n:]
+        return n
+
+    def _proximo_bloco(self):
+        if self._inflador is None:
+            if self._restante == 0:
+                self._finalizar()
+                return b''
+            chunk = self._fluxo.ler_chunk()
+            if not chunk:
+                raise EOFError("Fluxo ZIP terminou antes do fim da entrada")
+            if len(chunk) > self._restante:
+                self._fluxo.devolver(chunk[self._restante:])
+                chunk = chunk[:self._restante]
+            self._restante -= len(chunk)
+            self._crc = zlib.crc32(chunk, self._crc)
+            return chunk
+
+        chunk = self._fluxo.ler_chunk()
+        if not chunk:
+            raise EOFError("Fluxo ZIP terminou antes do fim da entrada")
+        dados = self._inflador.decompress(chunk)
+        self._crc = zlib.crc32(dados, self._crc)
+        if self._inflador.eof:
+            self._fluxo.devolver(self._inflador.unused_data)
+            self._finalizar()
+        return dados
+
+    def _finalizar(self):
+        self._terminado = True
+        if self._flags & FLAG_DESCRITOR_DADOS:
+            # CRC e tamanhos vem depois dos dados compactados
+            crc = self._fluxo.ler_exato(4)
+            if crc == ASSINATURA_DESCRITOR:
+                crc = self._fluxo.ler_exato(4)
+            self._crc_esperado = struct.unpack('<I', crc)[0]
+
+            # Tamanhos com 4 bytes, ou 8 bytes em entradas ZIP64
+            self._fluxo.ler_exato(8)
+            try:
+                proxima = self._fluxo.ler_exato(4)
+            except EOFError:
+                proxima = b''
+            if proxima and not proxima.startswith(b'PK'):
+                self._fluxo.ler_exato(4)
+                proxima = b''
+            self._fluxo.devolver(proxima)
+        if self._crc != self._crc_esperado:
+            raise zlib.error("CRC invalido na entrada do ZIP")
+
+
+def ler_cabecalho_local(fluxo):
+    """
+    Le o proximo cabecalho local do ZIP
+
+    Returns:
+        dict: Campos do cabecalho, ou None se nao houver mais entradas
+    """
+    try:
+        bruto = fluxo.ler_exato(CABECALHO_LOCAL.size)
+    except EOFError:
+        return None
+    if not bruto.startswith(ASSINATURA_ARQUIVO_LOCAL):
+        # Diretorio central: nao ha mais entradas
+        return None
+
+    (_, _, flags, metodo, _, _, crc, tamanho_compactado, _,
+     tamanho_nome, tamanho_extra) = CABECALHO_LOCAL.unpack(bruto)
+    nome = fluxo.ler_exato(tamanho_nome).decode('cp437')
+    extra = fluxo.ler_exato(tamanho_extra)
+
+    if tamanho_compactado == 0xFFFFFFFF:
+        # ZIP64: tamanho real no campo extra 0x0001
+        pos = 0
+        while pos + 4 <= len(extra):
+            tipo, tamanho = struct.unpack('<HH', extra[pos:pos + 4])
+            if tipo == 0x0001:
+                _, tamanho_compactado = struct.unpack('<QQ', extra[pos + 4:pos + 20])
+                break
+            pos += 4 + tamanho
+
+    return {
+        'nome': nome,
+        'flags': flags,
+        'metodo': metodo,
+        'crc': crc,
+        'tamanho_compactado': tamanho_compactado,
+    }
+
+
+def abrir_csv_zip_stream(response, sufixo='.csv', progresso=None):
+    """
+    Localiza a entrada CSV no ZIP recebido pela rede e a retorna como
+    um arquivo binario descompactado sob demanda
+
+    Args:
+        response: Resposta do requests aberta com stream=True
+        sufixo (str): Final do nome da entrada (ex.: '_MG.csv' no ZIP nacional do detalhe)
+        progresso (callable): Callback dos eventos de download (ver FluxoRede)
+
+    Returns:
+        tuple: (nome da entrada CSV, arquivo binario, FluxoRede)
+    """
+    fluxo = FluxoRede(response, progresso=progresso)
+
+    while True:
+        cabecalho = ler_cabecalho_local(fluxo)
+        if cabecalho is None:
+            raise ValueError(f"Nenhum arquivo *{sufixo} encontrado no ZIP")
+
+        leitor = LeitorZipStream(fluxo, cabecalho)
+        if cabecalho['nome'].endswith(sufixo):
+            return cabecalho['nome'], io.BufferedReader(leitor, buffer_size=TAMANHO_CHUNK_REDE), fluxo
+
+        # Descartar as demais entradas (ex: leiame.pdf, CSVs de outras UFs)
+        while leitor.read(TAMANHO_CHUNK_REDE):
+            pass
+
+
+def entradas_csv_zip_stream(response, sufixos, progresso=None):
+    """
+    Gera cada entrada do ZIP recebido pela rede cujo nome termina com um dos sufixos,
+    na ordem do arquivo, como um arquivo binario descompactado sob demanda
+
+    O que nao for lido de uma entrada e descartado ao pedir a proxima. Os eventos de
+    download vao para progresso (ver FluxoRede).
+
+    Yields:
+        tuple: (nome da entrada, arquivo binario)
+    """
+    fluxo = FluxoRede(response, progresso=progresso)
+    while True:
+        cabecalho = ler_cabecalho_local(fluxo)
+        if cabecalho is None:
+            return
+        leitor = LeitorZipStream(fluxo, cabecalho)
+        if cabecalho['nome'].endswith(sufixos):
+            yield cabecalho['nome'], io.BufferedReader(leitor, buffer_size=TAMANHO_CHUNK_REDE)
+        while leitor.read(TAMANHO_CHUNK_REDE):
+            pass
+
+
+# Chave de agrupamento: endereço + candidato (em cada turno e cargo)
+CAMPOS_CHAVE = ('DS_LOCAL_VOTACAO_ENDERECO', 'NM_VOTAVEL', 'NR_VOTAVEL', 'NM_MUNICIPIO', 'NR_TURNO', 'CD_CARGO')
+
+# Leitura vetorizada (--engine pandas/pyarrow)
+LINHAS_POR_LOTE = 200000
+TAMANHO_BLOCO_LINHAS = 4 * 1024 * 1024
+TAMANHO_BLOCO_PARALELO = 16 * 1024 * 1024  # Bloco enviado a cada processo (--workers)
+TAMANHO_BLOCO_PYARROW = 16 * 1024 * 1024
+
+ENGINES = ('csv', 'pandas', 'pyarrow')
+
+# Ordem das linhas do arquivo agregado: natural (ordem em que as chaves aparecem no
+# arquivo do TSE, que ja vem agrupado por municipio/zona/secao; sem ordenacao) ou
+# chave (ordenado pelos valores de CAMPOS_CHAVE, como nas versoes anteriores)
+ORDENS_SAIDA = ('natural', 'chave')
+
+
+# Bits de cada id na chave empacotada do Agregador
+BITS_ID = 32
+MASCARA_ID = (1 << BITS_ID) - 1
+
+
+class TabelaDimensao:
+    """Guarda cada valor distinto uma unica vez e o referencia por um id inteiro"""
+
+    def __init__(self):
+        self.ids = {}
+        self.valores = []
+
+    def id(self, valor):
+        i = self.ids.get(valor)
+        if i is None:
+            i = self.ids[valor] = len(self.valores)
+            self.valores.append(valor)
+        return i
+
+    def __len__(self):
+        return len(self.valores)
+
+
+class Agregador:
+    """
+    Soma os votos por endereco e candidato, mantendo a primeira linha de cada chave,
+    e opcionalmente alimenta o rollup por secao/local/zona/municipio e a matriz de
+    votos por secao (matriz_secoes) na mesma passada
+
+    O estado e compacto: cada coluna tem uma tabela de dimensao (enderecos, candidatos,
+    locais... sao guardados uma vez), a chave e a tupla de ids empacotada em um inteiro,
+    e os votos e a primeira linha de cada chave ficam em arrays tipados.
+    """
+
+    def __init__(self, fieldnames, niveis_rollup=(), matriz_secoes=False):
+        self.fieldnames = list(fieldnames)
+        self.dimensoes = {c: TabelaDimensao() for c in self.fieldnames}
+        for c in CAMPOS_CHAVE:
+            self.dimensoes.setdefault(c, TabelaDimensao())
+        self._tabelas_chave = [self.dimensoes[c] for c in CAMPOS_CHAVE]
+        self.indices = {}  # chave empacotada -> posicao da chave nos arrays
+        self.votos = array('q')  # total de votos de cada chave
+        self.linhas = array('I')  # ids da primeira linha de cada chave (uma coluna por campo)
+        self.linhas_municipio = defaultdict(int)  # linhas filtradas de cada municipio
+        self.rollup = RollupNiveis(niveis_rollup) if niveis_rollup else None
+        self.secoes = MatrizSecoes() if matriz_secoes else None
+
+    def _acumular(self, valores_chave, votos, row):
+        """Soma os votos de uma chave, guardando os ids de row se a chave for nova"""
+        chave = 0
+        for tabela, valor in zip(self._tabelas_chave, valores_chave):
+            chave = (chave << BITS_ID) | tabela.id(valor)
+
+        i = self.indices.get(chave)
+        if i is None:
+            self.indices[chave] = len(self.votos)
+            self.votos.append(votos)
+            self.linhas.extend(self.dimensoes[c].id(row.get(c, '')) for c in self.fieldnames)
+        else:
+            self.votos[i] += votos
+
+    def _linha(self, i):
+        """Reconstroi a primeira linha guardada para a chave de posicao i"""
+        n = len(self.fieldnames)
+        ids = self.linhas[i * n:(i + 1) * n]
+        return {c: self.dimensoes[c].valores[j] for c, j in zip(self.fieldnames, ids)}
+
+    def _valores_chave(self, chave):
+        """Desempacota a chave de volta para a tupla de valores de CAMPOS_CHAVE"""
+        ids = []
+        for _ in CAMPOS_CHAVE:
+            ids.append(chave & MASCARA_ID)
+            chave >>= BITS_ID
+        return tuple(t.valores[j] for t, j in zip(self._tabelas_chave, reversed(ids)))
+
+    def adicionar(self, row):
+        # Chave de agrupamento: endereço + candidato
+        self._acumular([row.get(c, '') for c in CAMPOS_CHAVE], int(row.get('QT_VOTOS', 0)), row)
+        self.linhas_municipio[row.get('NM_MUNICIPIO', '')] += 1
+
+        if self.rollup:
+            self.rollup.adicionar(row)
+        if self.secoes is not None:
+            self.secoes.adicionar(row)
+
+    def adicionar_lote(self, df):
+        """Agrega um lote de linhas ja filtradas (DataFrame com colunas texto)"""
+        chaves = list(CAMPOS_CHAVE)
+        votos = df['QT_VOTOS'].astype('int64').groupby([df[c] for c in chaves], sort=False, dropna=False).sum()
+        totais = dict(votos.items())
+
+        # Primeira linha de cada chave do lote, para as chaves ainda nao vistas
+        primeiras = df.drop_duplicates(chaves)
+        for row in primeiras.to_dict('records'):
+            chave = tuple(row[c] for c in chaves)
+            self._acumular(chave, int(totais[chave]), row)
+        for municipio, n in df['NM_MUNICIPIO'].value_counts().items():
+            self.linhas_municipio[municipio] += int(n)
+
+        if self.rollup:
+            self.rollup.adicionar_lote(df)
+        if self.secoes is not None:
+            self.secoes.adicionar_lote(df)
+
+    def mesclar(self, outro):
+        """Soma um agregador parcial (de um bloco posterior do arquivo) a este"""
+        for chave, i in outro.indices.items():
+            self._acumular(outro._valores_chave(chave), outro.votos[i], outro._linha(i))
+        for municipio, n in outro.linhas_municipio.items():
+            self.linhas_municipio[municipio] += n
+        if self.rollup:
+            self.rollup.mesclar(outro.rollup)
+        if self.secoes is not None:
+            self.secoes.mesclar(outro.secoes)
+
+    def __len__(self):
+        return len(self.votos)
+
+    def _postos(self):
+        """
+        Posto de cada chave em cada campo de CAMPOS_CHAVE (posicao do valor na ordem
+        alfabetica da tabela de dimensao) e o numero de bits de cada campo
+
+        Returns:
+            list: (array com o posto de cada posicao, bits) por campo
+        """
+        n = len(self.fieldnames)
+        colunas = []
+        for c in CAMPOS_CHAVE:
+            if c not in self.fieldnames:
+                continue  # Campo ausente: valor '' em todas as chaves
+            valores = self.dimensoes[c].valores
+            posto = array('I', bytes(4 * len(valores)))
+            for p, j in enumerate(sorted(range(len(valores)), key=valores.__getitem__)):
+                posto[j] = p
+            ids = self.linhas[self.fieldnames.index(c)::n]
+            colunas.append((array('I', map(posto.__getitem__, ids)), max(len(valores) - 1, 1).bit_length()))
+        return colunas
+
+    def _ordenar(self, posicoes, postos):
+        """
+        Ordena posicoes pelos valores de CAMPOS_CHAVE
+
+        A chave de cada posicao vira um inteiro com os postos dos seus valores (mesma
+        ordem das tuplas de texto) e a posicao nos bits baixos: a ordenacao compara
+        inteiros, sem montar tuplas.
+        """
+        chaves = [0] * len(posicoes)
+        for posto, bits in postos:
+            chaves = [(k << bits) | p for k, p in zip(chaves, map(posto.__getitem__, posicoes))]
+        chaves = [(k << BITS_ID) | i for k, i in zip(chaves, posicoes)]
+        chaves.sort()
+        return [k & MASCARA_ID for k in chaves]
+
+    def _ordem_saida(self, ordem='natural'):
+        """Posicoes das chaves na ordem de saida (ver ORDENS_SAIDA)"""
+        if ordem == 'chave':
+            return self._ordenar(range(len(self.votos)), self._postos())
+        return range(len(self.votos))
+
+    def _linha_saida(self, i):
+        row_original = self._linha(i)
+        row_original['QT_VOTOS'] = str(self.votos[i])
+        return row_original
+
+    def linhas_saida(self, ordem='natural'):
+        """Gera as linhas agregadas (primeira linha de cada chave com o total de votos)"""
+        for i in self._ordem_saida(ordem):
+            yield self._linha_saida(i)
+
+    def linhas_por_municipio(self, ordem='natural'):
+        """Gera (municipio, linhas agregadas do municipio), cada grupo na ordem de saida
+
+        Com ordem 'chave', cada municipio e ordenado separadamente (a juncao ordenada
+        dos grupos fica a cargo de quem le as particoes, ver Manifesto.linhas_agregadas)
+        """
+        n = len(self.fieldnames)
+        coluna = self.fieldnames.index('NM_MUNICIPIO')
+        grupos = defaultdict(list)
+        for i in range(len(self.votos)):
+            grupos[self.linhas[i * n + coluna]].append(i)
+        nomes = self.dimensoes['NM_MUNICIPIO'].valores
+        postos = self._postos() if ordem == 'chave' else None
+        for id_municipio, posicoes in grupos.items():
+            if ordem == 'chave':
+                posicoes = self._ordenar(posicoes, postos)
+            yield nomes[id_municipio], (self._linha_saida(i) for i in posicoes)
+
+    def colunas_constantes(self):
+        """Colunas com o mesmo valor em todas as linhas agregadas (coluna -> valor)"""
+        return {c: self.dimensoes[c].valores[0] for c in self.fieldnames
+                if c != 'QT_VOTOS' and len(self.dimensoes[c]) == 1}
+
+    def gravar(self, output_file, ordem='natural', compressao='nenhuma'):
+        """Grava o CSV agregado e retorna o numero de linhas (ver armazenamento_csv)"""
+        return gravar_csv(self.linhas_saida(ordem), self.fieldnames, output_file, compressao,
+                          self.colunas_constantes())
+
+    def gravar_parquet(self, destino, ordem='natural'):
+        """Grava o dataset Parquet particionado e retorna o numero de linhas"""
+        try:
+            from armazenamento_parquet import gravar_parquet
+        except ImportError:
+            raise ImportError("A saida Parquet requer o pacote pyarrow (pip install pyarrow)")
+        return gravar_parquet(self.linhas_saida(ordem), self.fieldnames, destino)
+
+
+def imprimir_progresso(evento):
+    """Callback de progresso padrao: imprime a mensagem de cada evento no terminal"""
+    if evento.get('mensagem'):
+        print(evento['mensagem'])
+
+
+class Progresso:
+    """
+    Repassa o andamento da leitura para um callback, a cada `intervalo` linhas
+
+    O callback recebe um dict com etapa ('processamento'), linhas, linhas_filtradas,
+    segundos, linhas_por_segundo e a mensagem pronta para o terminal (None no evento final).
+    """
+
+    def __init__(self, callback=None, intervalo=100000):
+        self.callback = callback or imprimir_progresso
+        self.intervalo = intervalo
+        self.inicio = time.perf_counter()
+        self._proximo = intervalo
+
+    def atualizar(self, linhas, linhas_filtradas):
+        if linhas >= self._proximo:
+            self._proximo = (linhas // self.intervalo + 1) * self.intervalo
+            self._emitir(linhas, linhas_filtradas,
+                         f"  Processadas: {linhas:,} | Filtradas: {linhas_filtradas:,}")
+
+    def concluir(self, linhas, linhas_filtradas):
+        self._emitir(linhas, linhas_filtradas, None)
+
+    def _emitir(self, linhas, linhas_filtradas, mensagem):
+        segundos = time.perf_counter() - self.inicio
+        self.callback({
+            'etapa': 'processamento',
+            'linhas': linhas,
+            'linhas_filtradas': linhas_filtradas,
+            'segundos': segundos,
+            'linhas_por_segundo': linhas / segundos if segundos > 0 else 0,
+            'mensagem': mensagem,
+        })
+
+
+def blocos_de_linhas(csvf, tamanho_bloco=TAMANHO_BLOCO_LINHAS):
+    """Le o arquivo binario em blocos de bytes terminados em quebra de linha"""
+    resto = b''
+    while True:
+        bloco = csvf.read(tamanho_bloco)
+        if not bloco:
+            break
+        bloco = resto + bloco
+        fim = bloco.rfind(b'\n') + 1
+        if fim == 0:
+            resto = bloco
+            continue
+        bloco, resto = bloco[:fim], bloco[fim:]
+        yield bloco
+
+    if resto:
+        yield resto + b'\n'
+
 
-    # Ler o arquivo filtrado e agregar
-    agregacao = defaultdict(lambda: defaultdict(int))
-    linhas_originais = {}  # Para manter os outros campos
+class PreFiltroBytes:
+    """
+    Descarta, ainda em bytes, as linhas de municipios fora da lista, antes do parser CSV
 
-    with open(OUTPUT_FILE, 'r', encoding='utf-8-sig') as infile:
-        reader = csv.DictReader(infile, delimiter=';')
-        fieldnames = reader.fieldnames
+    Blocos sem nenhum dos municipios procurados sao pulados inteiros (apenas as quebras
+    de linha sao contadas); nos demais, so o campo CD_MUNICIPIO de cada linha e
+    extraido e comparado. Assume um registro por linha, como nos arquivos do TSE.
+    A confirmacao final continua sendo feita pelo parser CSV.
+
+    Se o dict codigos crescer durante a leitura (municipios_tse.ColetorMunicipios),
+    os padroes sao refeitos no bloco seguinte.
+    """
+
+    def __init__(self, cabecalho, codigos):
+        """codigos: dict CD_MUNICIPIO -> NM_MUNICIPIO dos municipios a manter"""
+        self.cabecalho = cabecalho
+        self.total_linhas = 0
+        self.linhas_candidatas = 0
+
+        colunas = next(csv.reader([cabecalho], delimiter=';'))
+        self._indice = colunas.index('CD_MUNICIPIO')
+        self._codigo_e_nome = colunas.index('NM_MUNICIPIO') == self._indice + 1
+        self._codigos = codigos
+        self._montar_padroes()
+
+    def _montar_padroes(self):
+        def variantes(valor):
+            # Campo com e sem aspas (os arquivos do TSE usam aspas em todos os campos)
+            valor = valor.encode('latin-1')
+            return (valor, b'"' + valor + b'"')
+
+        codigos = self._codigos
+        self._n_codigos = len(codigos)
+        self._valores = {v for codigo in codigos for v in variantes(codigo)}
+        if self._codigo_e_nome:
+            # Codigo seguido do nome: padrao especifico, que nao casa com outras colunas numericas
+            self._padroes = [b';' + c + b';' + n + b';'
+                             for codigo, nome in codigos.items()
+                             for c, n in zip(variantes(codigo), variantes(nome))]
+        else:
+            self._padroes = [b';' + v + b';' for v in self._valores]
+        # Com muitos nomes, varrer o bloco por cada um custa mais do que extrair o campo
+        self._pular_blocos = len(self._padroes) <= 16
+
+    def iterar(self, csvf, ao_avancar=None):
+        """Gera o cabecalho e as linhas candidatas (texto) de todo o arquivo
+
+        ao_avancar(total de linhas lidas) e chamado depois de cada bloco
+        """
+        yield self.cabecalho
+        for bloco in blocos_de_linhas(csvf):
+            yield from self.filtrar_bloco(bloco)
+            if ao_avancar:
+                ao_avancar(self.total_linhas)
+
+    def filtrar_bloco(self, bloco):
+        """Retorna as linhas candidatas (texto) de um bloco terminado em quebra de linha"""
+        self.total_linhas += bloco.count(b'\n')
+        if len(self._codigos) != self._n_codigos:
+            self._montar_padroes()
+        if self._pular_blocos and not any(p in bloco for p in self._padroes):
+            return []
+
+        indice = self._indice
+        valores = self._valores
+        candidatas = []
+        for linha in bloco.split(b'\n'):
+            campos = linha.split(b';', indice + 1)
+            if len(campos) > indice and campos[indice] in valores:
+                candidatas.append(linha.decode('latin-1') + '\n')
+        self.linhas_candidatas += len(candidatas)
+        return candidatas
+
+
+def filtrar_e_agregar(csvf, arquivo_filtrado=None, prefiltro=True, niveis_rollup=(), codigos=None,
+                      progresso=None, matriz_secoes=False):
+    """
+    Filtra as linhas dos municipios selecionados e agrega em uma unica passada
+
+    Args:
+        csvf: Arquivo binario com o CSV do TSE (latin-1, separado por ';')
+        arquivo_filtrado (str): Se informado, grava tambem as linhas filtradas (depuracao)
+        prefiltro (bool): Descartar em bytes as linhas de outros municipios antes do parser CSV
+        niveis_rollup (tuple): Niveis do rollup calculados na mesma passada (ver rollup_tse.NIVEIS)
+        codigos (dict): CD_MUNICIPIO -> NM_MUNICIPIO dos municipios a manter (None para manter todos)
+        progresso (callable): Callback de andamento (ver Progresso). Padrao: imprimir no terminal
+        matriz_secoes (bool): Guardar tambem os votos de cada secao (ver matriz_secoes.MatrizSecoes)
+
+    Returns:
+        tuple: (Agregador, total de linhas, linhas filtradas, municipios encontrados)
+    """
+    progresso = Progresso(progresso)
+    if prefiltro and codigos is not None:
+        pre_filtro = PreFiltroBytes(csvf.readline().decode('latin-1'), codigos)
+        linhas = pre_filtro.iterar(csvf, lambda total: progresso.atualizar(total, linhas_filtradas))
+    else:
+        # Ler como texto
+        pre_filtro = None
+        linhas = io.TextIOWrapper(csvf, encoding='latin-1', newline='')
+    reader = csv.DictReader(linhas, delimiter=';')
+    agregador = Agregador(reader.fieldnames, niveis_rollup, matriz_secoes)
+
+    outf = open(arquivo_filtrado, 'w', newline='', encoding='utf-8-sig') if arquivo_filtrado else None
+    try:
+        writer = None
+        if outf:
+            writer = csv.DictWriter(outf, fieldnames=reader.fieldnames, delimiter=';')
+            writer.writeheader()
+
+        total_linhas = 0
+        linhas_filtradas = 0
+        municipios_encontrados = set()
 
         for row in reader:
-            # Chave de agrupamento: endereço + candidato
-            endereco = row.get('DS_LOCAL_VOTACAO_ENDERECO', '')
-            candidato = row.get('NM_VOTAVEL', '')
-            numero = row.get('NR_VOTAVEL', '')
-            municipio = row.get('NM_MUNICIPIO', '')
+            total_linhas += 1
+
+            # Verificar se o municipio esta na lista
+            if codigos is None or row['CD_MUNICIPIO'] in codigos:
+                agregador.adicionar(row)
+                if writer:
+                    writer.writerow(row)
+                linhas_filtradas += 1
+                municipios_encontrados.add(row['NM_MUNICIPIO'])
+
+            # Progresso a cada 100k linhas
+            if pre_filtro is None:
+                progresso.atualizar(total_linhas, linhas_filtradas)
+    finally:
+        if outf:
+            outf.close()
+
+    if pre_filtro is not None:
+        total_linhas = pre_filtro.total_linhas
+    progresso.concluir(total_linhas, linhas_filtradas)
+    return agregador, total_linhas, linhas_filtradas, municipios_encontrados
+
+
+def _processar_bloco(bloco, cabecalho, codigos, prefiltro, salvar_filtradas, niveis_rollup,
+                     matriz_secoes=False):
+    """
+    Filtra e pre-agrega um bloco de linhas em um processo de trabalho
 
-            chave = (endereco, candidato, numero, municipio)
+    Returns:
+        tuple: (Agregador parcial, linhas do bloco, linhas filtradas,
+                municipios encontrados, linhas filtradas para depuracao ou None)
+    """
+    fieldnames = next(csv.reader([cabecalho], delimiter=';'))
+    if prefiltro and codigos is not None:
+        pre_filtro = PreFiltroBytes(cabecalho, codigos)
+        linhas = pre_filtro.filtrar_bloco(bloco)
+        total_linhas = pre_filtro.total_linhas
+    else:
+        linhas = io.StringIO(bloco.decode('latin-1'), newline='')
+        total_linhas = bloco.count(b'\n')
 
-            # Somar votos
-            votos = int(row.get('QT_VOTOS', 0))
-            agregacao[chave]['QT_VOTOS'] += votos
+    agregador = Agregador(fieldnames, niveis_rollup, matriz_secoes)
+    linhas_filtradas = 0
+    municipios_encontrados = set()
+    filtradas = [] if salvar_filtradas else None
+    for row in csv.DictReader(linhas, fieldnames=fieldnames, delimiter=';'):
+        if codigos is None or row['CD_MUNICIPIO'] in codigos:
+            agregador.adicionar(row)
+            linhas_filtradas += 1
+            municipios_encontrados.add(row['NM_MUNICIPIO'])
+            if salvar_filtradas:
+                filtradas.append(row)
 
-            # Guardar a primeira linha para manter outros campos
-            if chave not in linhas_originais:
-                linhas_originais[chave] = row.copy()
+    return agregador, total_linhas, linhas_filtradas, municipios_encontrados, filtradas
 
-    # Salvar arquivo agregado
-    OUTPUT_FILE_AGREGADO = OUTPUT_FILE.replace('.csv', '_agregado.csv')
 
-    with open(OUTPUT_FILE_AGREGADO, 'w', newline='', encoding='utf-8-sig') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames, delimiter=';')
+def filtrar_e_agregar_paralelo(csvf, workers, arquivo_filtrado=None, prefiltro=True, niveis_rollup=(),
+                               codigos=None, progresso=None, matriz_secoes=False):
+    """
+    Versao multiprocesso de filtrar_e_agregar: o CSV descompactado e dividido em
+    blocos de linhas inteiras, cada processo filtra e pre-agrega o seu bloco e os
+    agregados parciais sao somados na ordem dos blocos
+
+    Returns:
+        tuple: (Agregador, total de linhas, linhas filtradas, municipios encontrados)
+    """
+    progresso = Progresso(progresso)
+    cabecalho = csvf.readline().decode('latin-1')
+    fieldnames = next(csv.reader([cabecalho], delimiter=';'))
+
+    agregador = Agregador(fieldnames, niveis_rollup, matriz_secoes)
+    total_linhas = 0
+    linhas_filtradas = 0
+    municipios_encontrados = set()
+
+    outf = open(arquivo_filtrado, 'w', newline='', encoding='utf-8-sig') if arquivo_filtrado else None
+    writer = None
+    if outf:
+        writer = csv.DictWriter(outf, fieldnames=fieldnames, delimiter=';')
         writer.writeheader()
 
-        linhas_agregadas = 0
-        for chave, valores in sorted(agregacao.items()):
-            row_original = linhas_originais[chave].copy()
-            row_original['QT_VOTOS'] = str(valores['QT_VOTOS'])
-            writer.writerow(row_original)
-            linhas_agregadas += 1
+    def consumir(resultado):
+        nonlocal total_linhas, linhas_filtradas
+        parcial, n_linhas, n_filtradas, encontrados, filtradas = resultado
+        agregador.mesclar(parcial)
+        total_linhas += n_linhas
+        linhas_filtradas += n_filtradas
+        municipios_encontrados.update(encontrados)
+        if writer:
+            writer.writerows(filtradas)
+        progresso.atualizar(total_linhas, linhas_filtradas)
 
-    print(f"[OK] Linhas originais: {linhas_filtradas:,}")
-    print(f"[OK] Linhas agregadas: {linhas_agregadas:,}")
-    print(f"[OK] Redução: {linhas_filtradas - linhas_agregadas:,} linhas ({(1 - linhas_agregadas/linhas_filtradas)*100:.1f}%)")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Limita os blocos em memoria; os resultados sao consumidos na ordem do arquivo
+            pendentes = deque()
+            for bloco in blocos_de_linhas(csvf, TAMANHO_BLOCO_PARALELO):
+                pendentes.append(executor.submit(
+                    _processar_bloco, bloco, cabecalho, codigos, prefiltro, writer is not None, niveis_rollup,
+                    matriz_secoes
+                ))
+                if len(pendentes) >= workers * 2:
+                    consumir(pendentes.popleft().result())
+            while pendentes:
+                consumir(pendentes.popleft().result())
+    finally:
+        if outf:
+            outf.close()
 
-    print("\n" + "="*80)
-    print("RESULTADO")
-    print("="*80)
-    print(f"\nMunicipios encontrados ({len(municipios_encontrados)}):")
-    for mun in sorted(municipios_encontrados):
-        print(f"  [OK] {mun}")
+    progresso.concluir(total_linhas, linhas_filtradas)
+    return agregador, total_linhas, linhas_filtradas, municipios_encontrados
+
+
+def _lotes_pandas(csvf, codigos):
+    """Le o CSV em lotes de DataFrames com a biblioteca pandas"""
+    import pandas as pd
+
+    leitor = pd.read_csv(csvf, sep=';', encoding='latin-1', dtype=str,
+                         keep_default_na=False, chunksize=LINHAS_POR_LOTE)
+    for lote in leitor:
+        if codigos is None:
+            yield len(lote), lote
+            continue
+        mascara = lote['CD_MUNICIPIO'].isin(list(codigos))
+        yield len(lote), lote[mascara]
+
+
+def _lotes_pyarrow(csvf, codigos):
+    """Le o CSV em blocos colunares com pyarrow, filtrando antes de converter para pandas"""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pacsv
+    except ImportError:
+        raise ImportError("A engine pyarrow requer o pacote pyarrow (pip install pyarrow)")
+
+    # Cabecalho lido a parte para declarar as colunas. Elas sao lidas como binario
+    # (sem transcodificar latin-1 o arquivo inteiro) e so as linhas filtradas sao decodificadas
+    cabecalho = next(csv.reader([csvf.readline().decode('latin-1')], delimiter=';'))
+    leitor = pacsv.open_csv(
+        csvf,
+        read_options=pacsv.ReadOptions(block_size=TAMANHO_BLOCO_PYARROW, column_names=cabecalho),
+        parse_options=pacsv.ParseOptions(delimiter=';'),
+        convert_options=pacsv.ConvertOptions(column_types={c: pa.binary() for c in cabecalho},
+                                             strings_can_be_null=False),
+    )
+    valores = None
+    for bloco in leitor:
+        filtrado = bloco
+        if codigos is not None:
+            if valores is None or len(valores) != len(codigos):
+                # Refeito se codigos crescer durante a leitura (municipios_tse.ColetorMunicipios)
+                valores = pa.array([c.encode('latin-1') for c in sorted(codigos)], pa.binary())
+            filtrado = bloco.filter(pc.is_in(bloco.column('CD_MUNICIPIO'), value_set=valores))
+        filtrado = filtrado.to_pandas()
+        for coluna in filtrado.columns:
+            filtrado[coluna] = filtrado[coluna].str.decode('latin-1')
+        yield bloco.num_rows, filtrado
+
+
+def filtrar_e_agregar_vetorizado(csvf, engine, arquivo_filtrado=None, niveis_rollup=(), codigos=None,
+                                 progresso=None, matriz_secoes=False):
+    """
+    Versao vetorizada de filtrar_e_agregar: le o CSV em lotes colunares,
+    aplica o filtro de municipio como mascara e agrega lote a lote
+
+    Returns:
+        tuple: (Agregador, total de linhas, linhas filtradas, municipios encontrados)
+    """
+    progresso = Progresso(progresso, intervalo=1)
+    lotes = _lotes_pyarrow(csvf, codigos) if engine == 'pyarrow' else _lotes_pandas(csvf, codigos)
+
+    agregador = None
+    total_linhas = 0
+    linhas_filtradas = 0
+    municipios_encontrados = set()
+    outf = open(arquivo_filtrado, 'w', newline='', encoding='utf-8-sig') if arquivo_filtrado else None
+    try:
+        for n_linhas, filtrado in lotes:
+            if agregador is None:
+                agregador = Agregador(list(filtrado.columns), niveis_rollup, matriz_secoes)
+                if outf:
+                    filtrado.iloc[:0].to_csv(outf, sep=';', index=False)
+
+            total_linhas += n_linhas
+            if len(filtrado):
+                agregador.adicionar_lote(filtrado)
+                if outf:
+                    filtrado.to_csv(outf, sep=';', index=False, header=False)
+                linhas_filtradas += len(filtrado)
+                municipios_encontrados.update(filtrado['NM_MUNICIPIO'].unique())
+
+            progresso.atualizar(total_linhas, linhas_filtradas)
+    finally:
+        if outf:
+            outf.close()
+
+    progresso.concluir(total_linhas, linhas_filtradas)
+    if agregador is None:
+        agregador = Agregador([], niveis_rollup, matriz_secoes)
+    return agregador, total_linhas, linhas_filtradas, municipios_encontrados
+
+
+def processar_csv(csvf, engine='csv', arquivo_filtrado=None, prefiltro=True, workers=1,
+                  niveis_rollup=(), codigos=None, progresso=None, matriz_secoes=False):
+    """
+    Filtra e agrega o CSV com a engine escolhida
+
+    codigos: dict CD_MUNICIPIO -> NM_MUNICIPIO dos municipios a manter (None mantem todos,
+    ver municipios_tse.ResolvedorMunicipios)
+    progresso: callback chamado com um dict a cada 100k linhas (ver Progresso)
+    matriz_secoes: guardar tambem a matriz de votos por secao (Agregador.secoes)
+    """
+    if engine == 'csv' and workers > 1:
+        return filtrar_e_agregar_paralelo(csvf, workers, arquivo_filtrado, prefiltro, niveis_rollup, codigos,
+                                          progresso, matriz_secoes)
+    if engine == 'csv':
+        return filtrar_e_agregar(csvf, arquivo_filtrado, prefiltro, niveis_rollup, codigos, progresso,
+                                 matriz_secoes)
+    return filtrar_e_agregar_vetorizado(csvf, engine, arquivo_filtrado, niveis_rollup, codigos, progresso,
+                                        matriz_secoes)
+
+
+def ler_indice_municipios(url, arquivo_zip=None, progresso=None):
+    """Le o indice CD_MUNICIPIO -> NM_MUNICIPIO do ZIP local ou baixado em streaming"""
+    if arquivo_zip:
+        with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+            csv_file = [f for f in zf.namelist() if f.endswith('.csv')][0]
+            with zf.open(csv_file) as csvf:
+                return indice_do_csv(csvf)
+
+    with requests.get(url, stream=True, timeout=180) as response:
+        response.raise_for_status()
+        _, csvf, _ = abrir_csv_zip_stream(response, progresso=progresso)
+        with csvf:
+            return indice_do_csv(csvf)
+
+
+def processar_entrada(url, arquivo_zip, arquivo_filtrado, niveis_rollup, codigos, engine='csv',
+                      prefiltro=True, workers=1, progresso=None, matriz_secoes=False, metricas=None,
+                      coletor=None):
+    """
+    Filtra e agrega o ZIP local (arquivo_zip) ou baixado em streaming (url)
+
+    Com coletor (municipios_tse.ColetorMunicipios), o indice de municipios e montado na
+    mesma passada e codigos deve ser coletor.codigos, preenchido durante a leitura.
+
+    Com metricas (MetricasIngestao), a passada pelo arquivo e dividida nas etapas
+    download (so em streaming), inflate (tempo dentro das leituras do CSV, sem a
+    espera da rede) e processamento (o restante: parse, filtro e agregacao). Com a
+    engine pyarrow a leitura acontece em outra thread e a divisao e aproximada.
+
+    Returns:
+        tuple: (Agregador, total de linhas, linhas filtradas)
+    """
+    def processar(csvf, fluxo=None):
+        medido = None
+        if metricas is not None:
+            medido = LeitorMedido(csvf)
+            csvf = io.BufferedReader(medido, buffer_size=TAMANHO_CHUNK_REDE)
+            metricas.reiniciar_pico()
+        if coletor is not None:
+            csvf = coletor.envolver(csvf, TAMANHO_CHUNK_REDE)
+        inicio = time.perf_counter()
+        agregador, total_linhas, linhas_filtradas, _ = processar_csv(
+            csvf, engine, arquivo_filtrado, prefiltro, workers, niveis_rollup, codigos, progresso,
+            matriz_secoes
+        )
+        if metricas is not None:
+            segundos = time.perf_counter() - inicio
+            espera = 0.0
+            if fluxo is not None:
+                espera = fluxo.segundos_espera
+                metricas.registrar('download', fluxo.segundos_rede, bytes=fluxo.total_bytes,
+                                   segundos_espera_rede=round(espera, 4))
+            metricas.registrar('inflate', medido.segundos - espera, bytes=medido.bytes)
+            metricas.registrar('processamento', segundos - medido.segundos, linhas=total_linhas,
+                               linhas_filtradas=linhas_filtradas, chaves_agregadas=len(agregador))
+        return agregador, total_linhas, linhas_filtradas
+
+    if arquivo_zip:
+        with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+            csv_file = [f for f in zf.namelist() if f.endswith('.csv')][0]
+            with zf.open(csv_file) as csvf:
+                return processar(csvf)
+
+    # Download, descompactacao e filtragem acontecem ao mesmo tempo
+    with requests.get(url, stream=True, timeout=180) as response:
+        response.raise_for_status()
+        _, csvf, fluxo = abrir_csv_zip_stream(response, progresso=progresso)
+        with csvf:
+            agregador, total_linhas, linhas_filtradas = processar(csvf, fluxo)
+    (progresso or imprimir_progresso)({
+        'etapa': 'download',
+        'mensagem': f"[OK] Download concluido: {fluxo.total_bytes / 1024 / 1024:.2f} MB",
+    })
+    return agregador, total_linhas, linhas_filtradas
 
-    nao_encontrados = MUNICIPIOS_FILTRAR - municipios_encontrados
-    if nao_encontrados:
-        print(f"\nMunicipios NAO encontrados ({len(nao_encontrados)}):")
-        for mun in sorted(nao_encontrados):
-            print(f"  [X] {mun}")
+
+def filtrar_comparecimento(csvf, indice, codigos=None, prefiltro=True, progresso=None):
+    """
+    Filtra as linhas do detalhe_votacao_secao dos municipios selecionados e soma o
+    comparecimento de cada local de votacao (ver comparecimento_tse)
+
+    Usa o mesmo pre-filtro em bytes e o mesmo DictReader da engine csv: o arquivo de
+    detalhe tem uma linha por secao e cargo, bem menor que o votacao_secao.
+
+    Args:
+        csvf: Arquivo binario com o CSV de detalhe (latin-1, separado por ';')
+        indice (IndiceSecoes): Secao -> local, da passada pelo votacao_secao
+        codigos (dict): CD_MUNICIPIO -> NM_MUNICIPIO dos municipios a manter (None para manter todos)
+
+    Returns:
+        tuple: (Comparecimento, total de linhas, linhas filtradas)
+    """
+    progresso = Progresso(progresso)
+    if prefiltro and codigos is not None:
+        pre_filtro = PreFiltroBytes(csvf.readline().decode('latin-1'), codigos)
+        linhas = pre_filtro.iterar(csvf, lambda total: progresso.atualizar(total, linhas_filtradas))
+    else:
+        pre_filtro = None
+        linhas = io.TextIOWrapper(csvf, encoding='latin-1', newline='')
+    reader = csv.DictReader(linhas, delimiter=';')
+    comparecimento = Comparecimento(indice, reader.fieldnames)
+
+    total_linhas = 0
+    linhas_filtradas = 0
+    for row in reader:
+        total_linhas += 1
+        if codigos is None or row['CD_MUNICIPIO'] in codigos:
+            comparecimento.adicionar(row)
+            linhas_filtradas += 1
+        if pre_filtro is None:
+            progresso.atualizar(total_linhas, linhas_filtradas)
+
+    if pre_filtro is not None:
+        total_linhas = pre_filtro.total_linhas
+    progresso.concluir(total_linhas, linhas_filtradas)
+    return comparecimento, total_linhas, linhas_filtradas
+
+
+def processar_comparecimento(url, arquivo_zip, uf, indice, codigos, prefiltro=True, progresso=None):
+    """
+    Le o CSV da UF no ZIP de detalhe por secao, local (arquivo_zip) ou em streaming (url)
+
+    Returns:
+        tuple: (Comparecimento, total de linhas, linhas filtradas)
+    """
+    sufixo = f"_{uf}.csv"
+    if arquivo_zip:
+        with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+            nomes = [f for f in zf.namelist() if f.endswith(sufixo)]
+            if not nomes:
+                raise ValueError(f"Nenhum arquivo *{sufixo} encontrado em {arquivo_zip}")
+            with zf.open(nomes[0]) as csvf:
+                return filtrar_comparecimento(csvf, indice, codigos, prefiltro, progresso)
+
+    with requests.get(url, stream=True, timeout=180) as response:
+        response.raise_for_status()
+        _, csvf, _ = abrir_csv_zip_stream(response, sufixo, progresso)
+        with csvf:
+            return filtrar_comparecimento(csvf, indice, codigos, prefiltro, progresso)
+
+
+def processar_candidatos(url, arquivo_zip, uf, progresso=None):
+    """
+    Le o cadastro de candidatos da UF e o dos cargos nacionais (consulta_cand_{ano}_{uf}.csv
+    e consulta_cand_{ano}_BR.csv) do ZIP local (arquivo_zip) ou baixado em streaming (url)
+
+    Returns:
+        IndiceCandidatos
+    """
+    sufixos = (f"_{uf}.csv", "_BR.csv")
+    candidatos = IndiceCandidatos()
+    if arquivo_zip:
+        with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+            for nome in [f for f in zf.namelist() if f.endswith(sufixos)]:
+                with zf.open(nome) as csvf:
+                    candidatos.ler(csvf)
+    else:
+        with requests.get(url, stream=True, timeout=180) as response:
+            response.raise_for_status()
+            for _, csvf in entradas_csv_zip_stream(response, sufixos, progresso):
+                candidatos.ler(csvf)
+    if not candidatos:
+        raise ValueError(f"Nenhum candidato em *_{uf}.csv / *_BR.csv no cadastro de candidatos")
+    return candidatos
+
+
+def ingerir(url=DATA_URL, arquivo_zip=None, cache_dir=None, conexoes=1, engine='csv', prefiltro=True,
+            workers=1, formato='csv', niveis_rollup=NIVEIS_PADRAO, municipios=None,
+            dir_particoes=DIR_PARTICOES, forcar=False, salvar_filtrado=False, prefixo_saida=None,
+            ordem='natural', compressao='gzip', matriz_secoes=False, comparecimento=False,
+            url_detalhe=DETALHE_URL, zip_detalhe=None, uf='MG', partidos=False, url_candidatos=CANDIDATOS_URL,
+            zip_candidatos=None, progresso=None, metricas=None):
+    """
+    Baixa (ou abre), filtra e agrega o arquivo do TSE e grava os arquivos de saida
+
+    Funcao usada pela linha de comando (main) e importavel por outros programas, como
+    o dashboard, que acompanham o andamento pelo callback em vez da saida do terminal.
+
+    Args:
+        url (str): URL do ZIP do TSE
+        arquivo_zip (str): ZIP ja baixado (em vez do download em streaming)
+        cache_dir (str): Baixar o ZIP para este diretorio antes de processar
+        conexoes (int): Conexoes paralelas do download com cache_dir
+        engine (str), prefiltro (bool), workers (int): Ver processar_csv
+        formato (str): 'csv', 'parquet' ou 'ambos'
+        niveis_rollup (tuple): Niveis do rollup (ver rollup_tse.NIVEIS)
+        municipios (list): Nomes ou codigos dos municipios (padrao: MUNICIPIOS_FILTRAR)
+        dir_particoes (str): Diretorio das particoes e do manifesto
+        forcar (bool): Reprocessar todos os municipios
+        salvar_filtrado (bool): Gravar tambem as linhas filtradas ({prefixo_saida}.csv)
+        prefixo_saida (str): Prefixo dos arquivos gerados (padrao: nome com data e hora)
+        ordem (str): Ordem das linhas do arquivo agregado (ver ORDENS_SAIDA)
+        compressao (str): Compressao do CSV agregado (ver armazenamento_csv.COMPRESSOES)
+        matriz_secoes (bool): Gravar tambem a matriz de votos por secao de cada municipio
+            (ver matriz_secoes; abrir com LeitorMatrizSecoes(manifesto_tse.pasta_secoes(municipio,
+            dir_execucao)))
+        comparecimento (bool): Ler tambem o detalhe por secao e gravar aptos, comparecimento e
+            abstencoes por local ({prefixo_saida}_comparecimento.csv, ver comparecimento_tse).
+            Usa as secoes do rollup: requer ao menos um nivel em niveis_rollup
+        url_detalhe (str), zip_detalhe (str): ZIP de detalhe por secao, remoto ou ja baixado
+        uf (str): UF do CSV usado dentro do ZIP de detalhe (detalhe_votacao_secao_{ano}_{uf}.csv)
+            e do cadastro de candidatos
+        partidos (bool): Acrescentar partido e coligacao (NR_PARTIDO, SG_PARTIDO, NM_COLIGACAO)
+            as linhas agregadas, pelo cadastro de candidatos do TSE, e gravar os rollups por
+            partido e por coligacao de cada nivel ({prefixo_saida}_rollup_partido_{nivel}.csv
+            e _rollup_coligacao_{nivel}.csv, ver candidatos_tse)
+        url_candidatos (str), zip_candidatos (str): ZIP do cadastro de candidatos, remoto ou ja baixado
+        progresso (callable): Recebe um dict por evento, com 'etapa' (download, indice,
+            processamento, gravacao ou concluido) e 'mensagem'; os eventos de processamento
+            trazem tambem linhas, linhas_filtradas, segundos e linhas_por_segundo.
+            Padrao: imprimir as mensagens no terminal
+        metricas (MetricasIngestao): Recebe o tempo, a vazao e o pico de memoria de cada
+            etapa (ver metricas_ingestao). Padrao: coletar so em memoria
+
+    Returns:
+        dict: arquivos (tipo -> caminho), rollup (nivel -> (caminho, linhas)), total_linhas,
+              linhas_filtradas, linhas_agregadas, municipios_encontrados, desconhecidos
+              (nome -> sugestoes), nada_mudou (saida anterior reaproveitada), dir_execucao
+              (pasta das particoes desta execucao em dir_particoes, ver manifesto_tse) e
+              metricas (um dict por etapa). As pastas de execucoes anteriores ficam no
+              disco: apagar com manifesto_tse.limpar_execucoes quando nao forem mais lidas
+    """
+    callback = progresso or imprimir_progresso
+    if metricas is None:
+        metricas = MetricasIngestao(arquivo=None)
+    if comparecimento and not niveis_rollup:
+        raise ValueError("O comparecimento usa as secoes do rollup: informe ao menos um nivel")
+
+    def avisar(etapa, mensagem):
+        callback({'etapa': etapa, 'mensagem': mensagem})
+
+    nomes = sorted(MUNICIPIOS_FILTRAR) if municipios is None else list(municipios)
+    prefixo = prefixo_saida or arquivo_saida().replace('.csv', '')
+    arquivo_filtrado = prefixo + '.csv' if salvar_filtrado else None
+    output_file_agregado = caminho_saida(prefixo + '_agregado.csv', compressao)
+    output_dir_parquet = prefixo + '_agregado.parquet'
+
+    manifesto = Manifesto(dir_particoes)
+    if cache_dir:
+        avisar('download', "[1/3] Atualizando cache local do ZIP...")
+        os.makedirs(cache_dir, exist_ok=True)
+        destino = os.path.join(cache_dir, os.path.basename(url))
+        with metricas.etapa('download') as medida:
+            resultado = baixar_arquivo(url, destino, conexoes=conexoes, progresso=callback)
+            medida['bytes'] = resultado['bytes']
+        if resultado['baixado']:
+            avisar('download', f"[OK] Download concluido: {resultado['bytes'] / 1024 / 1024:.2f} MB")
+        arquivo_zip = resultado['caminho']
+
+    # Versao da entrada: hash do ZIP local ou ETag/Last-Modified do arquivo remoto
+    with metricas.etapa('hash_entrada') as medida:
+        entrada = manifesto.hash_arquivo(arquivo_zip) if arquivo_zip else impressao_remota(url)
+        if arquivo_zip:
+            medida['bytes'] = os.path.getsize(arquivo_zip)
+    manifesto.preparar(entrada, versao_codigo())
+
+    # Nomes -> CD_MUNICIPIO, antes de processar (o indice fica no manifesto)
+    indice = manifesto.dados.get('indice_municipios')
+    processado = None
+    if not indice and not arquivo_zip:
+        # Sem ZIP local nem indice salvo: o indice e montado na passada do processamento, que ja
+        # filtra os municipios pedidos conforme os codigos aparecem (um download so). Sem indice
+        # salvo nao ha particoes reaproveitaveis: todos os municipios sao processados
+        avisar('indice', "[AVISO] Sem ZIP local nem indice salvo: o indice de municipios e montado durante o "
+                         "download e os nomes so sao validados ao fim desta primeira execucao "
+                         "(com ZIP local ou cache, antes de processar)")
+        avisar('processamento', "[2/3] Baixando, descompactando, filtrando e agregando dados em streaming...")
+        coletor = ColetorMunicipios(nomes)
+        processado = processar_entrada(
+            url, None, arquivo_filtrado, niveis_rollup, coletor.codigos, engine, prefiltro, workers, callback,
+            matriz_secoes, metricas, coletor
+        )
+        indice = coletor.indice
+        manifesto.dados['indice_municipios'] = indice
+    elif not indice:
+        avisar('indice', "Montando o indice de municipios do arquivo do TSE...")
+        with metricas.etapa('indice'):
+            indice = ler_indice_municipios(url, arquivo_zip, callback)
+        manifesto.dados['indice_municipios'] = indice
+    codigos, desconhecidos = ResolvedorMunicipios(indice).resolver(nomes)
+    for nome, sugestoes in desconhecidos.items():
+        dica = f" (voce quis dizer: {', '.join(sugestoes)}?)" if sugestoes else ""
+        avisar('indice', f"  [X] Municipio desconhecido: {nome}{dica}")
+    if not codigos:
+        raise ValueError("Nenhum municipio da lista existe no arquivo do TSE")
+    selecionados = set(codigos.values())
+
+    if comparecimento:
+        with metricas.etapa('hash_detalhe'):
+            entrada_detalhe = manifesto.hash_arquivo(zip_detalhe) if zip_detalhe else impressao_remota(url_detalhe)
+        manifesto.preparar_comparecimento(entrada_detalhe)
+    if partidos:
+        with metricas.etapa('hash_candidatos'):
+            entrada_candidatos = (manifesto.hash_arquivo(zip_candidatos) if zip_candidatos
+                                  else impressao_remota(url_candidatos))
+        manifesto.preparar_candidatos(entrada_candidatos)
+
+    resultado = {'arquivos': {}, 'rollup': {}, 'linhas_agregadas': None, 'desconhecidos': desconhecidos,
+                 'nada_mudou': False, 'metricas': metricas.etapas}
+
+    if forcar or arquivo_filtrado or processado is not None:
+        pendentes = selecionados
+    else:
+        pendentes = manifesto.pendentes(selecionados, niveis_rollup, ordem, matriz_secoes, comparecimento, partidos)
+
+    arquivos = manifesto.saida_atual(selecionados, niveis_rollup, formato, ordem, compressao, comparecimento,
+                                     partidos)
+    if arquivos and not pendentes:
+        manifesto.salvar()
+        linhas_por_municipio = manifesto.linhas_filtradas(selecionados)
+        resultado.update({
+            'arquivos': arquivos,
+            'rollup': {chave[len('rollup_'):]: (caminho, None) for chave, caminho in arquivos.items()
+                       if chave.startswith('rollup_')},
+            'total_linhas': manifesto.dados['total_linhas'],
+            'linhas_filtradas': sum(linhas_por_municipio.values()),
+            'municipios_encontrados': {m for m, n in linhas_por_municipio.items() if n},
+            'nada_mudou': True,
+            'dir_execucao': manifesto.pasta,
+        })
+        avisar('concluido', "[OK] Arquivo do TSE, municipios e codigo inalterados: nada a reprocessar")
+        return resultado
+
+    if pendentes:
+        avisar('processamento', f"Municipios a processar: {len(pendentes)} "
+                                f"(reaproveitados de {dir_particoes}: {len(selecionados) - len(pendentes)})")
+        codigos_pendentes = {codigo: nome for codigo, nome in codigos.items() if nome in pendentes}
+        if processado is not None:
+            # Ja processados na passada que montou o indice
+            agregador, total_linhas, linhas_filtradas = processado
+            del processado
+        else:
+            if arquivo_zip:
+                if not cache_dir:
+                    avisar('processamento', f"[1/3] Abrindo arquivo local: {arquivo_zip}")
+                avisar('processamento', "[2/3] Extraindo, filtrando e agregando dados...")
+            else:
+                avisar('processamento', "[2/3] Baixando, descompactando, filtrando e agregando dados em streaming...")
+            agregador, total_linhas, linhas_filtradas = processar_entrada(
+                url, arquivo_zip, arquivo_filtrado, niveis_rollup, codigos_pendentes,
+                engine, prefiltro, workers, callback, matriz_secoes, metricas
+            )
+        avisar('processamento', f"[OK] Linhas filtradas nesta execucao: {linhas_filtradas:,}")
+
+        locais = None
+        if comparecimento:
+            avisar('processamento', "Lendo o detalhe por secao (aptos, comparecimento e abstencoes)...")
+            with metricas.etapa('comparecimento') as medida:
+                locais, medida['linhas'], medida['linhas_filtradas'] = processar_comparecimento(
+                    url_detalhe, zip_detalhe, uf, IndiceSecoes(agregador.rollup), codigos_pendentes,
+                    prefiltro, callback
+                )
+            avisar('processamento', f"[OK] Comparecimento: {len(locais):,} locais/turnos/cargos "
+                                    f"({medida['linhas_filtradas']:,} linhas de detalhe)")
+            if locais.sem_local:
+                avisar('processamento', f"  [X] {locais.sem_local:,} linhas de detalhe de secoes sem votos "
+                                        "no votacao_secao (local pelo proprio arquivo de detalhe)")
+
+        candidatos = None
+        if partidos:
+            avisar('processamento', "Lendo o cadastro de candidatos (partidos e coligacoes)...")
+            with metricas.etapa('candidatos') as medida:
+                candidatos = processar_candidatos(url_candidatos, zip_candidatos, uf, callback)
+                medida['linhas'] = len(candidatos)
+            avisar('processamento', f"[OK] Cadastro de candidatos: {len(candidatos):,} candidatos "
+                                    f"de {len(candidatos.partidos)} partidos")
+
+        with metricas.etapa('particoes') as medida:
+            manifesto.gravar_particoes(agregador, pendentes, niveis_rollup, total_linhas, ordem, locais,
+                                       candidatos)
+            medida['linhas'] = len(agregador)
+        if matriz_secoes:
+            avisar('processamento', f"[OK] Matriz de votos por secao: {len(agregador.secoes):,} celulas "
+                                    f"em {os.path.join(manifesto.pasta, 'secoes')}")
+        manifesto.salvar()
+        del agregador
+    else:
+        avisar('processamento', f"[OK] Todos os municipios ja processados em {dir_particoes}: "
+                                "remontando os arquivos")
+
+    linhas_por_municipio = manifesto.linhas_filtradas(selecionados)
+    resultado['total_linhas'] = manifesto.dados['total_linhas']
+    resultado['linhas_filtradas'] = sum(linhas_por_municipio.values())
+    resultado['municipios_encontrados'] = {m for m, n in linhas_por_municipio.items() if n}
+    resultado['dir_execucao'] = manifesto.pasta
+
+    avisar('gravacao', "[3/3] Gravando dados agregados por endereço e candidato...")
+    arquivos = resultado['arquivos']
+    with metricas.etapa('gravacao') as medida:
+        if formato in ('csv', 'ambos'):
+            resultado['linhas_agregadas'] = manifesto.gravar_csv(output_file_agregado, selecionados,
+                                                                 CAMPOS_CHAVE, ordem, compressao)
+            arquivos['agregado_csv'] = output_file_agregado
+            if compressao != 'nenhuma':
+                arquivos['agregado_metadados'] = caminho_metadados(output_file_agregado)
+        if formato in ('parquet', 'ambos'):
+            resultado['linhas_agregadas'] = manifesto.gravar_parquet(output_dir_parquet, selecionados,
+                                                                     CAMPOS_CHAVE, ordem)
+            arquivos['agregado_parquet'] = output_dir_parquet
+
+        resultado['rollup'] = manifesto.gravar_rollup(prefixo + '_rollup', selecionados, niveis_rollup, partidos)
+        for nivel, (caminho, n) in resultado['rollup'].items():
+            avisar('gravacao', f"[OK] Rollup {nivel}: {n:,} linhas")
+            arquivos[f'rollup_{nivel}'] = caminho
+        if comparecimento:
+            caminho, n = manifesto.gravar_comparecimento(prefixo + '_comparecimento.csv', selecionados)
+            avisar('gravacao', f"[OK] Comparecimento por local: {n:,} linhas")
+            arquivos['comparecimento'] = caminho
+        medida['linhas'] = resultado['linhas_agregadas'] or 0
+        medida['bytes'] = sum(tamanho_em_disco(caminho) for caminho in arquivos.values())
+    manifesto.registrar_saida(selecionados, niveis_rollup, formato, arquivos, ordem, compressao, partidos)
+    manifesto.salvar()
+    if arquivo_filtrado:
+        arquivos['filtrado'] = arquivo_filtrado
+
+    avisar('concluido', "[OK] Arquivos gravados")
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Filtra os dados de votacao por secao do TSE por municipio")
+    parser.add_argument('--url', default=DATA_URL, help="URL do ZIP do TSE")
+    parser.add_argument('--zip', dest='arquivo_zip',
+                        help="Usar um ZIP ja baixado em vez de baixar em streaming")
+    parser.add_argument('--cache-dir',
+                        help="Baixar o ZIP para este diretorio (download retomavel e condicional)")
+    parser.add_argument('--conexoes', type=int, default=1,
+                        help="Numero de conexoes paralelas do download com --cache-dir")
+    parser.add_argument('--engine', choices=ENGINES, default='csv',
+                        help="Leitor do CSV: csv (DictReader, linha a linha), pandas ou pyarrow (lotes vetorizados)")
+    parser.add_argument('--sem-prefiltro', action='store_true',
+                        help="Desativar o pre-filtro em bytes da engine csv (todas as linhas passam pelo parser)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Numero de processos para filtrar/agregar em paralelo (engine csv)")
+    parser.add_argument('--formato', choices=('csv', 'parquet', 'ambos'), default='csv',
+                        help="Formato do arquivo agregado (parquet: dataset particionado, requer pyarrow)")
+    parser.add_argument('--ordem', choices=ORDENS_SAIDA, default='natural',
+                        help="Ordem das linhas do arquivo agregado: natural (ordem do arquivo do TSE, sem "
+                             "ordenacao) ou chave (ordenado por endereco, candidato, municipio, turno e cargo)")
+    parser.add_argument('--compressao', choices=COMPRESSOES, default='gzip',
+                        help="Compressao do CSV agregado; com compressao, as colunas constantes vao para o "
+                             "arquivo *_agregado.meta.json (zstd requer o pacote zstandard). "
+                             "nenhuma: CSV completo, para planilhas. Padrao: %(default)s")
+    parser.add_argument('--matriz-secoes', action='store_true',
+                        help="Gravar tambem a matriz de votos por secao e votavel de cada municipio "
+                             "(arrays NumPy em <dir-particoes>/execucao_*/secoes, lidos com np.memmap; requer numpy)")
+    parser.add_argument('--metricas', default=ARQUIVO_METRICAS,
+                        help="Arquivo JSON lines onde as metricas de cada etapa (tempo, MB/s, linhas/s, "
+                             "pico de memoria) sao acrescentadas. Padrao: %(default)s")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="Registrar tambem o pico de memoria alocada pelo Python em cada etapa "
+                             "(tracemalloc; deixa a ingestao mais lenta)")
+    parser.add_argument('--comparecimento', action='store_true',
+                        help="Ler tambem o detalhe por secao do TSE e gravar aptos, comparecimento e abstencoes "
+                             "por local de votacao (*_comparecimento.csv)")
+    parser.add_argument('--url-detalhe', default=DETALHE_URL,
+                        help="URL do ZIP de detalhe por secao. Padrao: %(default)s")
+    parser.add_argument('--zip-detalhe',
+                        help="Usar um ZIP de detalhe por secao ja baixado em vez de baixar em streaming")
+    parser.add_argument('--uf', default='MG',
+                        help="UF do CSV lido dentro do ZIP de detalhe por secao e do cadastro de candidatos. "
+                             "Padrao: %(default)s")
+    parser.add_argument('--partidos', action='store_true',
+                        help="Acrescentar partido e coligacao as linhas agregadas (cadastro de candidatos do TSE) "
+                             "e gravar os rollups por partido e por coligacao de cada nivel")
+    parser.add_argument('--url-candidatos', default=CANDIDATOS_URL,
+                        help="URL do ZIP do cadastro de candidatos. Padrao: %(default)s")
+    parser.add_argument('--zip-candidatos',
+                        help="Usar um ZIP do cadastro de candidatos ja baixado em vez de baixar em streaming")
+    parser.add_argument('--niveis', default=','.join(NIVEIS_PADRAO),
+                        help="Niveis do rollup, separados por virgula "
+                             f"({', '.join(NIVEIS)}; vazio para nao gerar). Padrao: %(default)s")
+    parser.add_argument('--municipios',
+                        help="Municipios a filtrar, separados por virgula (nome com ou sem acentos, ou CD_MUNICIPIO). "
+                             "Padrao: MUNICIPIOS_FILTRAR")
+    parser.add_argument('--arquivo-municipios',
+                        help="Arquivo com um municipio por linha (em vez de --municipios)")
+    parser.add_argument('--salvar-filtrado', action='store_true',
+                        help="Gravar tambem o CSV com as linhas filtradas, antes da agregacao (depuracao)")
+    parser.add_argument('--dir-particoes', default=DIR_PARTICOES,
+                        help="Diretorio das particoes por municipio e do manifesto. Padrao: %(default)s")
+    parser.add_argument('--forcar', action='store_true',
+                        help="Reprocessar todos os municipios, mesmo que o manifesto indique que nada mudou")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.engine != 'csv':
+        parser.error("--workers so pode ser usado com --engine csv")
+    niveis_rollup = tuple(n.strip() for n in args.niveis.split(',') if n.strip())
+    desconhecidos = set(niveis_rollup) - set(NIVEIS)
+    if desconhecidos:
+        parser.error(f"Niveis de rollup desconhecidos: {', '.join(sorted(desconhecidos))}")
+    if args.comparecimento and not niveis_rollup:
+        parser.error("--comparecimento usa as secoes do rollup: informe ao menos um nivel em --niveis")
+    if args.arquivo_municipios:
+        nomes = ler_lista_municipios(args.arquivo_municipios)
+    elif args.municipios:
+        nomes = [m.strip() for m in args.municipios.split(',') if m.strip()]
+    else:
+        nomes = sorted(MUNICIPIOS_FILTRAR)
+
+    print("="*80)
+    print("FILTRO DE DADOS ELEITORAIS - TSE 2022")
+    print("="*80)
+    print(f"\nMunicipios a filtrar: {len(nomes)}")
 
     print("\n" + "="*80)
-    print("[OK] PROCESSO CONCLUIDO!")
+    print("Baixando e processando arquivo (streaming)...")
     print("="*80)
-    print(f"\nArquivo filtrado: {OUTPUT_FILE}")
-    print(f"Linhas: {linhas_filtradas:,}")
-    print(f"\nArquivo agregado: {OUTPUT_FILE_AGREGADO}")
-    print(f"Linhas: {linhas_agregadas:,}")
-
-except Exception as e:
-    print(f"\n[ERRO] {e}")
-    import traceback
-    traceback.print_exc()
+
+    metricas = MetricasIngestao(args.metricas, args.tracemalloc,
+                                {'engine': args.engine, 'workers': args.workers, 'prefiltro': not args.sem_prefiltro,
+                                 'formato': args.formato, 'compressao': args.compressao, 'municipios': len(nomes)})
+    try:
+        resultado = ingerir(
+            url=args.url, arquivo_zip=args.arquivo_zip, cache_dir=args.cache_dir, conexoes=args.conexoes,
+            engine=args.engine, prefiltro=not args.sem_prefiltro, workers=args.workers,
+            formato=args.formato, niveis_rollup=niveis_rollup, municipios=nomes,
+            dir_particoes=args.dir_particoes, forcar=args.forcar, salvar_filtrado=args.salvar_filtrado,
+            prefixo_saida=OUTPUT_FILE.replace('.csv', ''), ordem=args.ordem, compressao=args.compressao,
+            matriz_secoes=args.matriz_secoes, comparecimento=args.comparecimento,
+            url_detalhe=args.url_detalhe, zip_detalhe=args.zip_detalhe, uf=args.uf, partidos=args.partidos,
+            url_candidatos=args.url_candidatos, zip_candidatos=args.zip_candidatos, metricas=metricas,
+        )
+        limpar_execucoes(args.dir_particoes, resultado['dir_execucao'])
+        if resultado['nada_mudou']:
+            for caminho in resultado['arquivos'].values():
+                print(f"  {caminho}")
+            return
+
+        linhas_filtradas = resultado['linhas_filtradas']
+        linhas_agregadas = resultado['linhas_agregadas']
+        municipios_encontrados = resultado['municipios_encontrados']
+        arquivos = resultado['arquivos']
+
+        print(f"[OK] Total processado: {resultado['total_linhas']:,} linhas")
+        print(f"[OK] Total filtrado: {linhas_filtradas:,} linhas")
+        print(f"[OK] Municipios encontrados: {len(municipios_encontrados)}")
+        pico = pico_memoria_mb()
+        if pico is not None:
+            print(f"[OK] Pico de memoria (RSS): {pico:,.0f} MB")
+        print(f"[OK] Linhas originais: {linhas_filtradas:,}")
+        print(f"[OK] Linhas agregadas: {linhas_agregadas:,}")
+        print(f"[OK] Redução: {linhas_filtradas - linhas_agregadas:,} linhas ({(1 - linhas_agregadas/max(linhas_filtradas, 1))*100:.1f}%)")
+
+        print("\n" + "="*80)
+        print("RESULTADO")
+        print("="*80)
+        print(f"\nMunicipios encontrados ({len(municipios_encontrados)}):")
+        for mun in sorted(municipios_encontrados):
+            print(f"  [OK] {mun}")
+
+        if resultado['desconhecidos']:
+            print(f"\nMunicipios NAO encontrados ({len(resultado['desconhecidos'])}):")
+            for mun in sorted(resultado['desconhecidos']):
+                print(f"  [X] {mun}")
+
+        print("\n" + "="*80)
+        print("[OK] PROCESSO CONCLUIDO!")
+        print("="*80)
+        if 'filtrado' in arquivos:
+            print(f"\nArquivo filtrado: {arquivos['filtrado']}")
+            print(f"Linhas: {linhas_filtradas:,}")
+        if 'agregado_csv' in arquivos:
+            print(f"\nArquivo agregado: {arquivos['agregado_csv']}")
+        if 'agregado_parquet' in arquivos:
+            print(f"\nDataset Parquet: {arquivos['agregado_parquet']}")
+        print(f"Linhas: {linhas_agregadas:,}")
+        for nivel, (caminho, n) in resultado['rollup'].items():
+            print(f"\nRollup ({nivel}): {caminho}")
+            print(f"Linhas: {n:,}")
+        if 'comparecimento' in arquivos:
+            print(f"\nComparecimento por local: {arquivos['comparecimento']}")
+
+        print("\n" + "="*80)
+        print("METRICAS POR ETAPA")
+        print("="*80)
+        print(metricas.resumo())
+        print(f"\nMetricas gravadas em: {args.metricas}")
+
+    except ValueError as e:
+        print(f"\n[ERRO] {e}")
+    except Exception as e:
+        print(f"\n[ERRO] {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
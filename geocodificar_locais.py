@@ -6,6 +6,8 @@ import glob
 import os
 from datetime import datetime
 
+from armazenamento_csv import ler_csv
+
 # API de geocodificação
 GEOCODE_API = "https://geocode.maps.co/search"
 
@@ -16,8 +18,8 @@ print("="*80)
 # Carregar dados agregados
 print("\n[1/4] Carregando dados agregados...")
 
-# Buscar arquivo agregado mais recente
-DATA_FILE_PATTERN = "eleicoes_2022_mg_filtrados_*_agregado.csv"
+# Buscar arquivo agregado mais recente (.csv, ou .csv.gz/.csv.zst com colunas constantes no .meta.json)
+DATA_FILE_PATTERN = "eleicoes_2022_mg_filtrados_*_agregado.csv*"
 arquivos = glob.glob(DATA_FILE_PATTERN)
 
 if not arquivos:
@@ -29,7 +31,7 @@ if not arquivos:
 arquivo_mais_recente = max(arquivos, key=os.path.getmtime)
 print(f"Usando arquivo: {os.path.basename(arquivo_mais_recente)}")
 
-df = pd.read_csv(arquivo_mais_recente, sep=';', encoding='utf-8-sig')
+df = ler_csv(arquivo_mais_recente)
 print(f"Total de registros: {len(df):,}")
 
 # Identificar locais únicos
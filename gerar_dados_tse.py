@@ -0,0 +1,360 @@
+"""
+Gerador de arquivos sinteticos no formato votacao_secao do TSE
+
+Grava um ZIP com um CSV de 26 colunas, separado por ';', todos os campos entre
+aspas e codificado em latin-1, como o arquivo publicado pelo TSE. As linhas
+seguem a ordem do arquivo real (municipio, zona, secao, turno, cargo) e so
+aparecem os votaveis com voto na secao. Os municipios de MUNICIPIOS_FILTRAR
+entram no arquivo (com acentos, para exercitar a resolucao de nomes), junto
+com municipios ficticios, e o numero de secoes de cada um segue uma
+distribuicao desigual, como entre capital e interior.
+
+Com --detalhe, grava tambem o ZIP correspondente no formato detalhe_votacao_secao
+(aptos, comparecimento, abstencoes e votos nominais/brancos/nulos por secao e
+cargo), derivado das secoes do ZIP de votacao gerado. Com --cadastro-candidatos,
+grava o cadastro de candidatos no formato consulta_cand (partido, federacao e
+coligacao de cada SQ_CANDIDATO do ZIP de votacao; o partido e o prefixo de dois
+digitos do numero do candidato, como no TSE).
+
+Uso:
+    python gerar_dados_tse.py votacao_secao_sintetico.zip --linhas 2000000 --municipios 300 --candidatos 800
+    python gerar_dados_tse.py votacao_secao_sintetico.zip --detalhe detalhe_votacao_secao_sintetico.zip
+    python gerar_dados_tse.py votacao_secao_sintetico.zip --cadastro-candidatos consulta_cand_sintetico.zip
+"""
+import argparse
+import csv
+import io
+import math
+import random
+import zipfile
+from collections import defaultdict
+
+COLUNAS = [
+    'DT_GERACAO', 'HH_GERACAO', 'ANO_ELEICAO', 'CD_TIPO_ELEICAO', 'NM_TIPO_ELEICAO', 'NR_TURNO',
+    'CD_ELEICAO', 'DS_ELEICAO', 'DT_ELEICAO', 'TP_ABRANGENCIA', 'SG_UF', 'SG_UE', 'NM_UE',
+    'CD_MUNICIPIO', 'NM_MUNICIPIO', 'NR_ZONA', 'NR_SECAO', 'CD_CARGO', 'DS_CARGO', 'NR_VOTAVEL',
+    'NM_VOTAVEL', 'QT_VOTOS', 'NR_LOCAL_VOTACAO', 'SQ_CANDIDATO', 'NM_LOCAL_VOTACAO',
+    'DS_LOCAL_VOTACAO_ENDERECO',
+]
+
+# Municipios da lista padrao, com a grafia acentuada
+MUNICIPIOS_REAIS = [
+    'BELO HORIZONTE', 'RIBEIRÃO DAS NEVES', 'SABARÁ', 'CONTAGEM', 'NOVA LIMA', 'SÃO JOAQUIM DE BICAS',
+    'JUIZ DE FORA', 'BARBACENA', 'SÃO JOÃO DEL REI', 'PASSOS', 'PEDRALVA', 'UBERLÂNDIA',
+    'GOVERNADOR VALADARES', 'MONTES CLAROS', 'TEÓFILO OTONI', 'PIRAPORA', 'VIÇOSA', 'CAMPO DO MEIO',
+    'ARAÇUAÍ', 'PATOS DE MINAS', 'ARAXÁ', 'IPATINGA', 'CONGONHAS', 'SERRO', 'CONCEIÇÃO DO MATO DENTRO',
+    'SANTA BÁRBARA', 'ALMENARA', 'FELISBURGO',
+]
+
+PREFIXOS = ['SÃO', 'SANTA', 'SANTO', 'NOVA', 'CONCEIÇÃO DO', 'BOM JESUS DO', 'ALTO', 'PARÁ DE', '']
+RADICAIS = ['ITA', 'PIRA', 'GUARA', 'ARA', 'CAMBU', 'JACU', 'TIRA', 'IBI', 'CARA', 'URU', 'ITU', 'MACA']
+SUFIXOS = ['ÚBA', 'NGA', 'TINGA', 'POLIS', 'CÊ', 'RANA', 'DENTES', 'MIRIM', 'ÇU', 'TUBA']
+LOGRADOUROS = ['RUA', 'AVENIDA', 'PRAÇA', 'TRAVESSA', 'RODOVIA']
+TIPOS_LOCAL = ['ESCOLA ESTADUAL', 'ESCOLA MUNICIPAL', 'COLÉGIO', 'CENTRO EDUCACIONAL', 'FACULDADE']
+NOMES = ['JOSÉ', 'MARIA', 'ANTÔNIO', 'JOÃO', 'ANA', 'FRANCISCO', 'LÚCIA', 'PAULO', 'CARLOS', 'HELENA']
+SOBRENOMES = ['SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'GONÇALVES', 'ARAÚJO', 'MAGALHÃES', 'CONCEIÇÃO']
+
+# (CD_CARGO, DS_CARGO, digitos do numero, tem segundo turno)
+CARGOS = [
+    (1, 'PRESIDENTE', 2, True),
+    (3, 'GOVERNADOR', 2, True),
+    (5, 'SENADOR', 3, False),
+    (6, 'DEPUTADO FEDERAL', 4, False),
+    (7, 'DEPUTADO ESTADUAL', 5, False),
+]
+VOTOS_BRANCO_NULO = [(95, 'VOTO BRANCO'), (96, 'VOTO NULO')]
+
+# Detalhe por secao: colunas da eleicao e da secao (as mesmas do votacao_secao) e contagens
+COLUNAS_DETALHE = COLUNAS[:17] + [
+    'CD_CARGO', 'DS_CARGO', 'QT_APTOS', 'QT_COMPARECIMENTO', 'QT_ABSTENCOES', 'QT_VOTOS_NOMINAIS',
+    'QT_VOTOS_BRANCOS', 'QT_VOTOS_NULOS', 'QT_VOTOS_LEGENDA', 'QT_VOTOS_ANULADOS_APU_SEP',
+]
+
+# Cadastro de candidatos: subconjunto das colunas do consulta_cand do TSE
+COLUNAS_CANDIDATOS = [
+    'DT_GERACAO', 'HH_GERACAO', 'ANO_ELEICAO', 'NR_TURNO', 'SG_UF', 'CD_CARGO', 'DS_CARGO', 'SQ_CANDIDATO',
+    'NR_CANDIDATO', 'NM_URNA_CANDIDATO', 'TP_AGREMIACAO', 'NR_PARTIDO', 'SG_PARTIDO', 'NM_PARTIDO',
+    'NR_FEDERACAO', 'NM_FEDERACAO', 'SG_FEDERACAO', 'NM_COLIGACAO', 'DS_COMPOSICAO_COLIGACAO',
+]
+CARGOS_MAJORITARIOS = ('1', '3', '5')
+PARTIDOS_FEDERADOS = 6  # Os primeiros partidos formam federacoes de dois nos cargos proporcionais
+
+SECOES_POR_LOCAL = 8
+LOCAIS_POR_ZONA = 40
+
+
+def _nome_ficticio(rnd, usados):
+    while True:
+        nome = ' '.join(p for p in (rnd.choice(PREFIXOS), rnd.choice(RADICAIS) + rnd.choice(SUFIXOS)) if p)
+        if nome not in usados:
+            usados.add(nome)
+            return nome
+
+
+def _pessoa(rnd):
+    return f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}"
+
+
+def _candidatos(rnd, candidatos):
+    """Votaveis de cada cargo: (NR_VOTAVEL, NM_VOTAVEL, SQ_CANDIDATO)"""
+    quantidade = {1: 11, 3: 9, 5: 11, 6: candidatos, 7: int(candidatos * 1.3)}
+    sq = 130001000000
+    resultado = {}
+    for cd_cargo, _, digitos, _ in CARGOS:
+        numeros = rnd.sample(range(10 ** (digitos - 1), 10 ** digitos), min(quantidade[cd_cargo], 9 * 10 ** (digitos - 1)))
+        lista = []
+        for nr in numeros:
+            sq += 1
+            lista.append((str(nr), _pessoa(rnd), str(sq)))
+        resultado[cd_cargo] = lista
+    return resultado
+
+
+def gerar_zip(caminho, linhas=1000000, municipios=100, candidatos=500, votaveis_por_secao=40,
+              ano=2022, uf='MG', semente=0):
+    """
+    Grava um ZIP sintetico no formato votacao_secao
+
+    Args:
+        caminho (str): ZIP de destino
+        linhas (int): Numero de linhas do CSV (sem o cabecalho)
+        municipios (int): Numero de municipios (incluindo os de MUNICIPIOS_REAIS)
+        candidatos (int): Candidatos a deputado federal (estadual: 30% a mais)
+        votaveis_por_secao (int): Maximo de votaveis com voto por secao, em cada cargo
+        ano (int), uf (str): Usados nos campos e no nome do CSV
+        semente (int): Semente do gerador (mesmos parametros -> mesmo arquivo)
+
+    Returns:
+        dict: linhas, municipios e tamanho do CSV em bytes
+    """
+    rnd = random.Random(semente)
+    usados = set(MUNICIPIOS_REAIS)
+    nomes = MUNICIPIOS_REAIS[:municipios]
+    nomes += [_nome_ficticio(rnd, usados) for _ in range(municipios - len(nomes))]
+    rnd.shuffle(nomes)
+    votaveis = _candidatos(rnd, candidatos)
+
+    # Secoes por municipio: distribuicao desigual (poucos municipios grandes)
+    pesos = [1 / (i + 1) ** 0.9 for i in range(municipios)]
+    rnd.shuffle(pesos)
+    linhas_por_secao = sum(min(votaveis_por_secao, len(votaveis[c[0]])) + 2 for c in CARGOS) \
+        + sum(min(votaveis_por_secao, 2) + 2 for c in CARGOS if c[3])
+    total_secoes = max(municipios, math.ceil(linhas / linhas_por_secao))
+    # Uma secao para cada municipio e o restante dividido pelos pesos (maiores restos)
+    cotas = [(total_secoes - municipios) * p / sum(pesos) for p in pesos]
+    secoes = [1 + int(c) for c in cotas]
+    for i in sorted(range(municipios), key=lambda i: int(cotas[i]) - cotas[i])[:total_secoes - sum(secoes)]:
+        secoes[i] += 1
+
+    fixos_inicio = ['17/10/2022', '10:00:00', str(ano), '2', 'ELEIÇÃO ORDINÁRIA']
+    fixos_eleicao = {1: ['544', f'ELEIÇÕES GERAIS ESTADUAIS {ano}', f'02/10/{ano}', 'E', uf, uf, 'MINAS GERAIS'],
+                     2: ['545', f'ELEIÇÕES GERAIS ESTADUAIS {ano} - 2º TURNO', f'30/10/{ano}', 'E', uf, uf,
+                         'MINAS GERAIS']}
+
+    def q(valores):
+        return ';'.join('"' + v + '"' for v in valores)
+
+    nome_csv = f"votacao_secao_{ano}_{uf}.csv"
+    escritas = 0
+    tamanho = 0
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        with zf.open(nome_csv, 'w', force_zip64=True) as bruto:
+            def escrever(texto):
+                nonlocal tamanho
+                dados = texto.encode('latin-1')
+                tamanho += len(dados)
+                bruto.write(dados)
+
+            escrever(q(COLUNAS) + '\n')
+            for i, (nome, n_secoes) in enumerate(zip(nomes, secoes)):
+                if escritas >= linhas:
+                    break
+                cd_municipio = str(40000 + i * 7)
+                bloco = []
+                for s in range(n_secoes):
+                    if escritas >= linhas:
+                        break
+                    zona = str(100 + i * 3 + s // (SECOES_POR_LOCAL * LOCAIS_POR_ZONA))
+                    if s % SECOES_POR_LOCAL == 0:
+                        local = [str(1000 + s // SECOES_POR_LOCAL),
+                                 f"{rnd.choice(TIPOS_LOCAL)} {_pessoa(rnd)}",
+                                 f"{rnd.choice(LOGRADOUROS)} {_pessoa(rnd)}, {rnd.randint(1, 3000)}"]
+                    for turno in (1, 2):
+                        inicio = q(fixos_inicio + [str(turno)] + fixos_eleicao[turno]
+                                   + [cd_municipio, nome, zona, str(s + 1)])
+                        for cd_cargo, ds_cargo, _, segundo_turno in CARGOS:
+                            if turno == 2 and not segundo_turno:
+                                continue
+                            pool = votaveis[cd_cargo][:2] if turno == 2 else votaveis[cd_cargo]
+                            k = min(votaveis_por_secao, len(pool))
+                            escolhidos = rnd.sample(pool, k)
+                            escolhidos += [(str(nr), nm, '-1') for nr, nm in VOTOS_BRANCO_NULO]
+                            for nr, nm, sq in escolhidos:
+                                if escritas >= linhas:
+                                    break
+                                bloco.append(inicio + ';' + q([str(cd_cargo), ds_cargo, nr, nm,
+                                                                str(rnd.randint(1, 60)), local[0], sq,
+                                                                local[1], local[2]]) + '\n')
+                                escritas += 1
+                    if len(bloco) >= 10000:
+                        escrever(''.join(bloco))
+                        bloco = []
+                escrever(''.join(bloco))
+
+    return {'linhas': escritas, 'municipios': min(municipios, len(nomes)), 'bytes_csv': tamanho}
+
+
+def gerar_detalhe_zip(votacao_zip, caminho, uf='MG', ano=2022, semente=0):
+    """
+    Grava um ZIP sintetico no formato detalhe_votacao_secao a partir de um ZIP de votacao
+
+    Cada secao tem o mesmo comparecimento em todos os cargos do turno (o maior total de
+    votos entre eles; a diferenca dos demais cargos vira voto nulo) e os mesmos aptos nos
+    dois turnos. Como no ZIP do TSE, o CSV da UF vem depois de um leiame.pdf.
+
+    Returns:
+        dict: linhas (sem o cabecalho) e secoes
+    """
+    rnd = random.Random(semente)
+    votos = defaultdict(lambda: [0, 0, 0])  # (turno, secao, cargo) -> [nominais, brancos, nulos]
+    fixos = {}  # (turno, secao) -> valores das 17 primeiras colunas
+    cargos = {}
+    with zipfile.ZipFile(votacao_zip, 'r') as zf:
+        nome_csv = [f for f in zf.namelist() if f.endswith('.csv')][0]
+        with zf.open(nome_csv) as bruto:
+            reader = csv.reader(io.TextIOWrapper(bruto, encoding='latin-1', newline=''), delimiter=';')
+            cabecalho = next(reader)
+            i_turno, i_mun, i_zona, i_secao, i_cargo, i_ds, i_nr, i_qt = (cabecalho.index(c) for c in (
+                'NR_TURNO', 'CD_MUNICIPIO', 'NR_ZONA', 'NR_SECAO', 'CD_CARGO', 'DS_CARGO', 'NR_VOTAVEL', 'QT_VOTOS'))
+            for row in reader:
+                secao = (row[i_mun], row[i_zona], row[i_secao])
+                fixos.setdefault((row[i_turno], secao), row[:17])
+                cargos.setdefault(row[i_cargo], row[i_ds])
+                posicao = {'95': 1, '96': 2}.get(row[i_nr], 0)
+                votos[(row[i_turno], secao, row[i_cargo])][posicao] += int(row[i_qt])
+
+    comparecimento = defaultdict(int)  # (turno, secao) -> comparecimento
+    for (turno, secao, _), (nominais, brancos, nulos) in votos.items():
+        comparecimento[(turno, secao)] = max(comparecimento[(turno, secao)], nominais + brancos + nulos)
+    aptos = defaultdict(int)  # secao -> aptos (maior comparecimento dos turnos mais as abstencoes)
+    for (_, secao), total in comparecimento.items():
+        aptos[secao] = max(aptos[secao], total)
+    aptos = {secao: total + rnd.randint(total // 10, total // 4 + 1) for secao, total in aptos.items()}
+
+    def q(valores):
+        return ';'.join('"' + str(v) + '"' for v in valores)
+
+    linhas = 0
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        zf.writestr('leiame.pdf', b'%PDF-1.4 sintetico')
+        with zf.open(f"detalhe_votacao_secao_{ano}_{uf}.csv", 'w', force_zip64=True) as bruto:
+            bruto.write((q(COLUNAS_DETALHE) + '\n').encode('latin-1'))
+            bloco = []
+            for (turno, secao, cd_cargo), (nominais, brancos, nulos) in sorted(votos.items()):
+                total = comparecimento[(turno, secao)]
+                nulos += total - (nominais + brancos + nulos)
+                bloco.append(q(fixos[(turno, secao)] + [cd_cargo, cargos[cd_cargo], aptos[secao], total,
+                                                       aptos[secao] - total, nominais, brancos, nulos, 0, 0]) + '\n')
+                linhas += 1
+                if len(bloco) >= 10000:
+                    bruto.write(''.join(bloco).encode('latin-1'))
+                    bloco = []
+            bruto.write(''.join(bloco).encode('latin-1'))
+    return {'linhas': linhas, 'secoes': len(aptos)}
+
+
+def gerar_candidatos_zip(votacao_zip, caminho, uf='MG', ano=2022, semente=0):
+    """
+    Grava um ZIP sintetico no formato consulta_cand a partir de um ZIP de votacao
+
+    Cada SQ_CANDIDATO do ZIP de votacao vira um candidato do partido com o prefixo de
+    dois digitos do seu numero. Nos cargos majoritarios, parte dos candidatos concorre
+    por coligacao; nos proporcionais, os primeiros partidos formam federacoes e os
+    demais concorrem isolados. Como no ZIP do TSE, ha um leiame.pdf, o CSV da UF e o
+    dos cargos nacionais (_BR.csv, presidente).
+
+    Returns:
+        dict: candidatos e partidos
+    """
+    rnd = random.Random(semente)
+    candidatos = {}  # SQ_CANDIDATO -> (CD_CARGO, DS_CARGO, NR_VOTAVEL, NM_VOTAVEL)
+    with zipfile.ZipFile(votacao_zip, 'r') as zf:
+        nome_csv = [f for f in zf.namelist() if f.endswith('.csv')][0]
+        with zf.open(nome_csv) as bruto:
+            reader = csv.reader(io.TextIOWrapper(bruto, encoding='latin-1', newline=''), delimiter=';')
+            cabecalho = next(reader)
+            i_cargo, i_ds, i_nr, i_nm, i_sq = (cabecalho.index(c) for c in (
+                'CD_CARGO', 'DS_CARGO', 'NR_VOTAVEL', 'NM_VOTAVEL', 'SQ_CANDIDATO'))
+            for row in reader:
+                if row[i_sq] != '-1' and row[i_sq] not in candidatos:
+                    candidatos[row[i_sq]] = (row[i_cargo], row[i_ds], row[i_nr], row[i_nm])
+
+    partidos = sorted({nr[:2] for _, _, nr, _ in candidatos.values()}, key=int)
+    federacoes = {}
+    for i in range(0, min(PARTIDOS_FEDERADOS, len(partidos)) - 1, 2):
+        membros = partidos[i:i + 2]
+        for nr in membros:
+            federacoes[nr] = (str(900 + i), 'FEDERAÇÃO ' + ' / '.join(f"P{m}" for m in membros),
+                              'FED' + ''.join(membros))
+
+    def q(valores):
+        return ';'.join('"' + str(v) + '"' for v in valores)
+
+    linhas = {'BR': [], uf: []}
+    for sq, (cd_cargo, ds_cargo, nr, nm) in sorted(candidatos.items()):
+        nr_partido = nr[:2]
+        sg_partido = f"P{nr_partido}"
+        federacao = ('#NULO#', '#NULO#', '#NULO#')
+        if cd_cargo in CARGOS_MAJORITARIOS and rnd.random() < 0.6:
+            tipo = 'COLIGAÇÃO'
+            coligacao = f"{rnd.choice(PREFIXOS)} {rnd.choice(RADICAIS)}{rnd.choice(SUFIXOS)}".strip()
+            composicao = ' / '.join([sg_partido] + [f"P{p}" for p in rnd.sample(partidos, min(2, len(partidos)))
+                                                    if p != nr_partido])
+        elif cd_cargo not in CARGOS_MAJORITARIOS and nr_partido in federacoes:
+            tipo, coligacao, composicao = 'FEDERAÇÃO', '#NULO#', '#NULO#'
+            federacao = federacoes[nr_partido]
+        else:
+            tipo, coligacao, composicao = 'PARTIDO ISOLADO', 'PARTIDO ISOLADO', sg_partido
+        sg_uf = 'BR' if cd_cargo == '1' else uf
+        linhas[sg_uf].append(q(['17/10/2022', '10:00:00', ano, 1, sg_uf, cd_cargo, ds_cargo, sq, nr, nm, tipo,
+                                nr_partido, sg_partido, f"PARTIDO {nr_partido}", *federacao, coligacao,
+                                composicao]) + '\n')
+
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        zf.writestr('leiame.pdf', b'%PDF-1.4 sintetico')
+        for sg_uf, bloco in linhas.items():
+            texto = q(COLUNAS_CANDIDATOS) + '\n' + ''.join(bloco)
+            zf.writestr(f"consulta_cand_{ano}_{sg_uf}.csv", texto.encode('latin-1'))
+    return {'candidatos': len(candidatos), 'partidos': len(partidos)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um ZIP sintetico no formato votacao_secao do TSE")
+    parser.add_argument('destino', help="ZIP de destino")
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--municipios', type=int, default=100)
+    parser.add_argument('--candidatos', type=int, default=500, help="Candidatos a deputado federal")
+    parser.add_argument('--votaveis-por-secao', type=int, default=40)
+    parser.add_argument('--ano', type=int, default=2022)
+    parser.add_argument('--uf', default='MG')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--detalhe',
+                        help="Gravar tambem o ZIP de detalhe por secao (detalhe_votacao_secao) neste caminho")
+    parser.add_argument('--cadastro-candidatos',
+                        help="Gravar tambem o ZIP do cadastro de candidatos (consulta_cand) neste caminho")
+    args = parser.parse_args(argv)
+
+    info = gerar_zip(args.destino, args.linhas, args.municipios, args.candidatos,
+                     args.votaveis_por_secao, args.ano, args.uf, args.semente)
+    print(f"[OK] {args.destino}: {info['linhas']:,} linhas, {info['municipios']} municipios, "
+          f"{info['bytes_csv'] / 1024 / 1024:.1f} MB descompactados")
+    if args.detalhe:
+        info = gerar_detalhe_zip(args.destino, args.detalhe, args.uf, args.ano, args.semente)
+        print(f"[OK] {args.detalhe}: {info['linhas']:,} linhas, {info['secoes']:,} secoes")
+    if args.cadastro_candidatos:
+        info = gerar_candidatos_zip(args.destino, args.cadastro_candidatos, args.uf, args.ano, args.semente)
+        print(f"[OK] {args.cadastro_candidatos}: {info['candidatos']:,} candidatos, {info['partidos']} partidos")
+
+
+if __name__ == "__main__":
+    main()
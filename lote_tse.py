@@ -0,0 +1,237 @@
+"""
+Processamento em lote de varios arquivos votacao_secao do TSE (ano x UF)
+
+Os ZIPs sao baixados para o cache local (download retomavel e condicional)
+por um pool de threads limitado, e cada ZIP baixado e filtrado/agregado em
+um pool de processos separado, enquanto os proximos downloads continuam.
+Cada alvo gera o seu proprio conjunto de arquivos no diretorio de saida.
+
+Uso:
+    python lote_tse.py 2018:MG 2020:MG 2022:MG
+    python lote_tse.py --anos 2018 2022 --ufs MG SP RJ ES --downloads 2 --processos 4
+"""
+import argparse
+import csv
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from armazenamento_csv import COMPRESSOES, caminho_saida
+from download_tse import baixar_arquivo
+from filtrar_municipios_stream import ENGINES, ORDENS_SAIDA, URL_MODELO, processar_csv
+from municipios_tse import ResolvedorMunicipios, indice_do_csv
+from rollup_tse import NIVEIS, NIVEIS_PADRAO
+
+CAMPOS_RESUMO = ['ANO', 'UF', 'STATUS', 'MB_ZIP', 'SEGUNDOS_DOWNLOAD', 'MB_CSV', 'LINHAS',
+                 'LINHAS_FILTRADAS', 'LINHAS_AGREGADAS', 'SEGUNDOS_PROCESSAMENTO',
+                 'LINHAS_POR_SEGUNDO', 'MB_POR_SEGUNDO', 'MUNICIPIOS_DESCONHECIDOS', 'ERRO']
+
+
+def ler_alvo(texto):
+    """Converte 'ANO:UF' em (ano, uf)"""
+    try:
+        ano, uf = texto.split(':')
+        return int(ano), uf.strip().upper()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Alvo invalido: {texto!r} (use ANO:UF, por exemplo 2022:MG)")
+
+
+def prefixo_saida(dir_saida, ano, uf):
+    return os.path.join(dir_saida, f"votacao_secao_{ano}_{uf}")
+
+
+def baixar_alvo(ano, uf, cache_dir, conexoes=1, progresso=None):
+    """Atualiza o ZIP do alvo no cache local e mede o download (eventos em progresso, ver baixar_arquivo)"""
+    url = URL_MODELO.format(ano=ano, uf=uf)
+    destino = os.path.join(cache_dir, os.path.basename(url))
+    t0 = time.perf_counter()
+    resultado = baixar_arquivo(url, destino, conexoes=conexoes, progresso=progresso)
+    resultado['segundos'] = time.perf_counter() - t0
+    return resultado
+
+
+def processar_alvo(ano, uf, arquivo_zip, dir_saida, engine='csv', niveis_rollup=NIVEIS_PADRAO,
+                   formato='csv', municipios=None, prefiltro=True, ordem='natural', compressao='gzip'):
+    """
+    Filtra e agrega o ZIP de um alvo (executado em um processo do pool)
+
+    Os nomes em municipios sao resolvidos para os codigos do TSE com o indice do
+    proprio arquivo (uma leitura extra, so quando ha filtro de municipios).
+
+    Returns:
+        dict: linhas, linhas filtradas/agregadas, tamanho do CSV, tempo de processamento
+              e nomes de municipio desconhecidos
+    """
+    prefixo = prefixo_saida(dir_saida, ano, uf)
+    t0 = time.perf_counter()
+    with zipfile.ZipFile(arquivo_zip, 'r') as zf:
+        csv_file = [f for f in zf.namelist() if f.endswith('.csv')][0]
+        tamanho_csv = zf.getinfo(csv_file).file_size
+        codigos, desconhecidos = None, {}
+        if municipios is not None:
+            with zf.open(csv_file) as csvf:
+                codigos, desconhecidos = ResolvedorMunicipios(indice_do_csv(csvf)).resolver(municipios)
+        with zf.open(csv_file) as csvf:
+            agregador, total_linhas, linhas_filtradas, _ = processar_csv(
+                csvf, engine, prefiltro=prefiltro, niveis_rollup=niveis_rollup, codigos=codigos
+            )
+
+    if formato in ('csv', 'ambos'):
+        linhas_agregadas = agregador.gravar(caminho_saida(prefixo + '_agregado.csv', compressao), ordem, compressao)
+    if formato in ('parquet', 'ambos'):
+        linhas_agregadas = agregador.gravar_parquet(prefixo + '_agregado.parquet', ordem)
+    if agregador.rollup:
+        agregador.rollup.gravar(prefixo + '_rollup')
+
+    return {
+        'linhas': total_linhas,
+        'filtradas': linhas_filtradas,
+        'agregadas': linhas_agregadas,
+        'mb_csv': tamanho_csv / 1024 / 1024,
+        'segundos': time.perf_counter() - t0,
+        'desconhecidos': sorted(desconhecidos),
+    }
+
+
+def executar_lote(alvos, cache_dir, dir_saida, downloads=2, processos=None, conexoes=1, **opcoes):
+    """
+    Baixa e processa todos os alvos, com um pool para downloads e outro para o processamento
+
+    Args:
+        alvos (list): Lista de (ano, uf)
+        cache_dir (str): Diretorio do cache dos ZIPs
+        dir_saida (str): Diretorio dos arquivos gerados
+        downloads (int): Downloads simultaneos
+        processos (int): Alvos processados simultaneamente (padrao: numero de CPUs)
+        conexoes (int): Conexoes paralelas de cada download
+        **opcoes: engine, niveis_rollup, formato, municipios, prefiltro, ordem e compressao
+            (ver processar_alvo)
+
+    Returns:
+        list: Um dict por alvo, na ordem de alvos, com os campos de CAMPOS_RESUMO
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(dir_saida, exist_ok=True)
+    resumo = {alvo: {'ANO': alvo[0], 'UF': alvo[1], 'STATUS': 'pendente'} for alvo in alvos}
+
+    def falhou(alvo, erro):
+        resumo[alvo]['STATUS'] = 'erro'
+        resumo[alvo]['ERRO'] = str(erro)
+        print(f"[ERRO] {alvo[0]} {alvo[1]}: {erro}")
+
+    def andamento(ano, uf):
+        # Os downloads rodam em paralelo: identificar o alvo em cada mensagem
+        return lambda evento: print(f"  {ano} {uf}: {evento['mensagem'].strip()}")
+
+    with ThreadPoolExecutor(max_workers=downloads) as pool_download, \
+            ProcessPoolExecutor(max_workers=processos or os.cpu_count()) as pool_processos:
+        pendentes = {pool_download.submit(baixar_alvo, ano, uf, cache_dir, conexoes, andamento(ano, uf)):
+                     ('download', (ano, uf)) for ano, uf in alvos}
+        while pendentes:
+            concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                etapa, alvo = pendentes.pop(futuro)
+                ano, uf = alvo
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    falhou(alvo, e)
+                    continue
+
+                if etapa == 'download':
+                    resumo[alvo]['MB_ZIP'] = round(os.path.getsize(resultado['caminho']) / 1024 / 1024, 2)
+                    resumo[alvo]['SEGUNDOS_DOWNLOAD'] = round(resultado['segundos'], 2)
+                    print(f"[OK] {ano} {uf}: ZIP pronto, processando...")
+                    pendentes[pool_processos.submit(processar_alvo, ano, uf, resultado['caminho'],
+                                                    dir_saida, **opcoes)] = ('processamento', alvo)
+                else:
+                    segundos = max(resultado['segundos'], 1e-9)
+                    resumo[alvo].update({
+                        'STATUS': 'ok',
+                        'MB_CSV': round(resultado['mb_csv'], 2),
+                        'LINHAS': resultado['linhas'],
+                        'LINHAS_FILTRADAS': resultado['filtradas'],
+                        'LINHAS_AGREGADAS': resultado['agregadas'],
+                        'SEGUNDOS_PROCESSAMENTO': round(resultado['segundos'], 2),
+                        'LINHAS_POR_SEGUNDO': round(resultado['linhas'] / segundos),
+                        'MB_POR_SEGUNDO': round(resultado['mb_csv'] / segundos, 2),
+                        'MUNICIPIOS_DESCONHECIDOS': ', '.join(resultado['desconhecidos']),
+                    })
+                    if resultado['desconhecidos']:
+                        print(f"  [X] {ano} {uf}: municipios desconhecidos: {', '.join(resultado['desconhecidos'])}")
+                    print(f"[OK] {ano} {uf}: {resultado['linhas']:,} linhas em {resultado['segundos']:.1f} s")
+
+    return [resumo[alvo] for alvo in alvos]
+
+
+def gravar_resumo(linhas, caminho):
+    with open(caminho, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=CAMPOS_RESUMO, delimiter=';')
+        writer.writeheader()
+        writer.writerows(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processa em lote os arquivos votacao_secao do TSE (ano x UF)")
+    parser.add_argument('alvos', nargs='*', type=ler_alvo, help="Alvos no formato ANO:UF (ex.: 2022:MG)")
+    parser.add_argument('--anos', type=int, nargs='+', default=[], help="Anos (combinados com --ufs)")
+    parser.add_argument('--ufs', nargs='+', default=[], help="UFs (combinadas com --anos)")
+    parser.add_argument('--cache-dir', default='dados_tse', help="Diretorio do cache dos ZIPs")
+    parser.add_argument('--saida', default='saida_lote', help="Diretorio dos arquivos gerados")
+    parser.add_argument('--downloads', type=int, default=2, help="Downloads simultaneos")
+    parser.add_argument('--processos', type=int, default=None,
+                        help="Alvos processados simultaneamente (padrao: numero de CPUs)")
+    parser.add_argument('--conexoes', type=int, default=1, help="Conexoes paralelas de cada download")
+    parser.add_argument('--engine', choices=ENGINES, default='csv')
+    parser.add_argument('--sem-prefiltro', action='store_true')
+    parser.add_argument('--formato', choices=('csv', 'parquet', 'ambos'), default='csv')
+    parser.add_argument('--ordem', choices=ORDENS_SAIDA, default='natural',
+                        help="Ordem das linhas do arquivo agregado (chave: ordenado, como nas versoes anteriores)")
+    parser.add_argument('--compressao', choices=COMPRESSOES, default='gzip',
+                        help="Compressao do CSV agregado (nenhuma: CSV completo). Padrao: %(default)s")
+    parser.add_argument('--niveis', default=','.join(NIVEIS_PADRAO),
+                        help=f"Niveis do rollup ({', '.join(NIVEIS)}; vazio para nao gerar). Padrao: %(default)s")
+    parser.add_argument('--municipios',
+                        help="Municipios a manter, separados por virgula (com ou sem acentos). Padrao: todos")
+    args = parser.parse_args(argv)
+
+    alvos = list(dict.fromkeys(args.alvos + [(ano, uf.upper()) for ano in args.anos for uf in args.ufs]))
+    if not alvos:
+        parser.error("Informe os alvos (ANO:UF) ou --anos e --ufs")
+    niveis_rollup = tuple(n.strip() for n in args.niveis.split(',') if n.strip())
+    desconhecidos = set(niveis_rollup) - set(NIVEIS)
+    if desconhecidos:
+        parser.error(f"Niveis de rollup desconhecidos: {', '.join(sorted(desconhecidos))}")
+    municipios = None
+    if args.municipios:
+        municipios = [m.strip() for m in args.municipios.split(',') if m.strip()]
+
+    print("="*80)
+    print(f"LOTE TSE - {len(alvos)} alvo(s): {', '.join(f'{ano}:{uf}' for ano, uf in alvos)}")
+    print("="*80)
+
+    t0 = time.perf_counter()
+    resumo = executar_lote(alvos, args.cache_dir, args.saida, downloads=args.downloads,
+                           processos=args.processos, conexoes=args.conexoes, engine=args.engine,
+                           niveis_rollup=niveis_rollup, formato=args.formato, municipios=municipios,
+                           prefiltro=not args.sem_prefiltro, ordem=args.ordem, compressao=args.compressao)
+    duracao = time.perf_counter() - t0
+
+    caminho_resumo = os.path.join(args.saida, 'resumo_lote.csv')
+    gravar_resumo(resumo, caminho_resumo)
+
+    print("\n" + "="*80)
+    print(f"{'Alvo':<10}{'Status':>8}{'Download (s)':>14}{'Linhas':>14}{'Proc. (s)':>11}{'Linhas/s':>12}{'MB/s':>8}")
+    for r in resumo:
+        if r['STATUS'] == 'ok':
+            print(f"{r['ANO']}:{r['UF']:<5}{r['STATUS']:>8}{r['SEGUNDOS_DOWNLOAD']:>14.1f}{r['LINHAS']:>14,}"
+                  f"{r['SEGUNDOS_PROCESSAMENTO']:>11.1f}{r['LINHAS_POR_SEGUNDO']:>12,.0f}{r['MB_POR_SEGUNDO']:>8.1f}")
+        else:
+            print(f"{r['ANO']}:{r['UF']:<5}{r['STATUS']:>8}  {r.get('ERRO', '')}")
+    print("="*80)
+    print(f"Tempo total: {duracao:.1f} s | Resumo: {caminho_resumo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Manifesto dos artefatos derivados do arquivo do TSE, para reprocessar so o que mudou
+
+O resultado de cada municipio (linhas agregadas e rollup) e guardado como uma
+particao, junto com um manifesto que registra o hash do arquivo de entrada, a
+versao do codigo (hash dos modulos do pipeline) e os niveis de rollup de cada
+particao. Em uma nova execucao:
+- entrada, codigo, municipios, niveis e formato iguais: nada e recalculado
+- so a lista de municipios mudou: apenas os municipios novos sao filtrados
+  e os arquivos de saida sao remontados a partir das particoes (concatenadas,
+  na ordem natural, ou intercaladas por heapq.merge, na ordem por chave, sem
+  carregar todas na memoria)
+- entrada ou codigo diferentes: todas as particoes sao descartadas
+
+Cada execucao que grava particoes usa uma pasta nova (execucao_<data e hora>),
+que comeca com hardlinks para as particoes da execucao anterior. Quem le as
+particoes da execucao anterior (o dashboard abre a matriz por secao com
+np.memmap) nunca ve um arquivo apagado ou regravado no meio da leitura. O
+manifesto aponta para a pasta da execucao atual (pasta_execucao). As pastas
+antigas sao apagadas por limpar_execucoes, depois que quem as usava passou para
+a nova (ver tarefa_ingestao).
+
+Com a matriz de votos por secao (--matriz-secoes), cada municipio tem tambem
+uma pasta em secoes/ (ver matriz_secoes e pasta_secoes). Com --comparecimento,
+cada municipio tem uma particao em comparecimento/, invalidada quando o arquivo
+de detalhe por secao muda (registrado a parte, em entrada_detalhe). Com --partidos,
+as linhas agregadas tem as colunas de partido e coligacao e cada nivel tem tambem
+os rollups por partido e por coligacao, invalidados quando o cadastro de
+candidatos muda (entrada_candidatos).
+"""
+import csv
+import hashlib
+import heapq
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+
+import requests
+
+from armazenamento_csv import gravar_csv
+from candidatos_tse import AGRUPAMENTOS, CAMPOS_PARTIDO
+from comparecimento_tse import chave_ordenacao as chave_comparecimento
+from download_tse import consultar_servidor
+from rollup_tse import chave_ordenacao, chave_ordenacao_agrupada
+
+DIR_PARTICOES = 'particoes_tse'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+PREFIXO_EXECUCAO = 'execucao_'
+
+# Modulos cujo codigo determina o conteudo dos artefatos
+MODULOS_PIPELINE = ('filtrar_municipios_stream.py', 'rollup_tse.py', 'armazenamento_parquet.py',
+                    'armazenamento_csv.py', 'manifesto_tse.py', 'municipios_tse.py', 'matriz_secoes.py',
+                    'comparecimento_tse.py', 'candidatos_tse.py')
+
+TAMANHO_BLOCO_HASH = 4 * 1024 * 1024
+
+
+def _hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def versao_codigo():
+    """Hash do codigo dos modulos do pipeline"""
+    sha = hashlib.sha256()
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    for nome in MODULOS_PIPELINE:
+        sha.update(nome.encode())
+        sha.update(_hash_arquivo(os.path.join(diretorio, nome)).encode())
+    return sha.hexdigest()
+
+
+def impressao_remota(url):
+    """
+    Identifica a versao do arquivo remoto sem baixa-lo (ETag / Last-Modified / tamanho)
+
+    Returns:
+        str: Hash dos metadados, ou None se o servidor nao informar ETag nem Last-Modified
+    """
+    info = consultar_servidor(requests.Session(), url)
+    if not info['etag'] and not info['last_modified']:
+        return None
+    texto = f"{url}|{info['etag']}|{info['last_modified']}|{info['tamanho']}"
+    return 'remoto:' + hashlib.sha256(texto.encode()).hexdigest()
+
+
+def _nome_particao(municipio, extensao='.csv'):
+    return re.sub(r'[^A-Za-z0-9]+', '_', municipio).strip('_') + extensao
+
+
+def pasta_secoes(municipio, execucao):
+    """
+    Pasta da matriz de votos por secao de um municipio (abrir com matriz_secoes.LeitorMatrizSecoes)
+
+    execucao: pasta da execucao que gravou a matriz (ver pasta_execucao)
+    """
+    return os.path.join(execucao, 'secoes', _nome_particao(municipio, ''))
+
+
+def pasta_execucao(diretorio=DIR_PARTICOES):
+    """Pasta das particoes da ultima execucao registrada no manifesto, ou None"""
+    return Manifesto(diretorio).pasta
+
+
+def limpar_execucoes(diretorio=DIR_PARTICOES, manter=None):
+    """
+    Apaga as pastas de execucoes anteriores (e particoes no formato antigo, sem pasta de execucao)
+
+    Mantem a pasta atual do manifesto e a pasta manter. Chamar so depois que quem
+    le as particoes passou a usar a pasta nova.
+    """
+    if not os.path.isdir(diretorio):
+        return
+    atuais = {pasta_execucao(diretorio), manter}
+    atuais = {os.path.basename(os.path.normpath(pasta)) for pasta in atuais if pasta}
+    for item in os.listdir(diretorio):
+        if item != ARQUIVO_MANIFESTO and item not in atuais:
+            caminho = os.path.join(diretorio, item)
+            if os.path.isdir(caminho):
+                shutil.rmtree(caminho, ignore_errors=True)
+
+
+def _vincular(origem, destino):
+    """Hardlink de origem em destino (copia, se o sistema de arquivos nao permitir)"""
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+
+
+class Manifesto:
+    """Particoes por municipio e o manifesto que as descreve"""
+
+    def __init__(self, diretorio=DIR_PARTICOES):
+        self.diretorio = diretorio
+        self.caminho = os.path.join(diretorio, ARQUIVO_MANIFESTO)
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                self.dados = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.dados = {}
+        self.dados.setdefault('hashes', {})
+        self.dados.setdefault('municipios', {})
+        if 'execucao' not in self.dados:
+            # Particoes no formato antigo (fora de uma pasta de execucao): processa tudo de novo
+            self.dados.update({'entrada': None, 'execucao': None})
+        self._execucao_nova = False
+
+    @property
+    def pasta(self):
+        """Pasta das particoes da execucao atual, ou None se nenhuma foi gravada"""
+        if self.dados['execucao'] is None:
+            return None
+        return os.path.join(self.diretorio, self.dados['execucao'])
+
+    def _nova_execucao(self):
+        """Cria a pasta desta execucao (uma vez), com hardlinks para as particoes da anterior"""
+        if self._execucao_nova:
+            return
+        anterior = self.pasta
+        nome = PREFIXO_EXECUCAO + datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        destino = os.path.join(self.diretorio, nome)
+        if anterior is not None and os.path.isdir(anterior):
+            shutil.copytree(anterior, destino, copy_function=_vincular)
+        else:
+            os.makedirs(destino)
+        self.dados['execucao'] = nome
+        self._execucao_nova = True
+
+    def salvar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(self.caminho + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.dados, f, ensure_ascii=False, indent=2)
+        os.replace(self.caminho + '.tmp', self.caminho)
+
+    def hash_arquivo(self, caminho):
+        """Hash do arquivo local, reaproveitado enquanto tamanho e data de modificacao nao mudarem"""
+        stat = os.stat(caminho)
+        chave = os.path.abspath(caminho)
+        registro = self.dados['hashes'].get(chave)
+        if registro and registro['tamanho'] == stat.st_size and registro['mtime_ns'] == stat.st_mtime_ns:
+            return registro['sha256']
+        sha256 = _hash_arquivo(caminho)
+        self.dados['hashes'][chave] = {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        return sha256
+
+    def preparar(self, entrada, versao):
+        """
+        Descarta as particoes se a entrada ou o codigo mudaram (entrada None: sempre descarta)
+
+        A pasta da execucao anterior fica no disco (pode estar em uso) ate limpar_execucoes.
+        """
+        if entrada is not None and self.dados.get('entrada') == entrada and self.dados.get('versao') == versao:
+            return
+        self.dados.update({'entrada': entrada, 'versao': versao, 'municipios': {}, 'saida': None,
+                           'indice_municipios': None, 'execucao': None})
+
+    def _preparar_complemento(self, chave_entrada, campo, entrada):
+        """Marca o campo das particoes como invalido se o arquivo complementar mudou"""
+        if entrada is not None and self.dados.get(chave_entrada) == entrada:
+            return
+        for registro in self.dados['municipios'].values():
+            registro[campo] = False
+        self.dados[chave_entrada] = entrada
+
+    def preparar_comparecimento(self, entrada):
+        """Invalida o comparecimento das particoes se o arquivo de detalhe mudou (entrada None: sempre)"""
+        self._preparar_complemento('entrada_detalhe', 'comparecimento', entrada)
+
+    def preparar_candidatos(self, entrada):
+        """Invalida partidos e coligacoes das particoes se o cadastro de candidatos mudou (entrada None: sempre)"""
+        self._preparar_complemento('entrada_candidatos', 'partidos', entrada)
+
+    def pendentes(self, municipios, niveis, ordem='natural', secoes=False, comparecimento=False, partidos=False):
+        """
+        Municipios sem particao valida para os niveis e a ordem pedidos (e para a matriz
+        por secao, o comparecimento e os partidos, se pedidos)
+        """
+        if self.dados.get('entrada') is None:
+            return set(municipios)
+        return {m for m in municipios
+                if m not in self.dados['municipios']
+                or not set(niveis) <= set(self.dados['municipios'][m]['niveis'])
+                or self.dados['municipios'][m].get('ordem') != ordem
+                or (secoes and not self.dados['municipios'][m].get('secoes'))
+                or (comparecimento and not self.dados['municipios'][m].get('comparecimento'))
+                or (partidos and not self.dados['municipios'][m].get('partidos'))}
+
+    def _gravar_grupos(self, pasta, cabecalho, linhas, municipios):
+        """Grava um CSV por municipio (nome na posicao 4 de cada linha), com cabecalho mesmo se vazio"""
+        pasta = os.path.join(self.pasta, pasta)
+        os.makedirs(pasta, exist_ok=True)
+        grupos = {m: [] for m in municipios}
+        for linha in linhas:
+            grupos.setdefault(linha[4], []).append(linha)
+        for municipio, linhas_municipio in grupos.items():
+            caminho = os.path.join(pasta, _nome_particao(municipio))
+            if os.path.exists(caminho):
+                os.remove(caminho)  # Hardlink para a particao da execucao anterior: nao regravar o mesmo arquivo
+            with open(caminho, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(cabecalho)
+                writer.writerows(linhas_municipio)
+
+    def gravar_particoes(self, agregador, municipios, niveis, total_linhas, ordem='natural', comparecimento=None,
+                         candidatos=None):
+        """
+        Grava as particoes dos municipios processados (inclusive os sem nenhuma linha) na pasta
+        de uma nova execucao
+
+        comparecimento: comparecimento_tse.Comparecimento dos mesmos municipios, ou None
+        candidatos: candidatos_tse.IndiceCandidatos para as colunas de partido e os rollups
+            por partido e coligacao, ou None
+        """
+        self._nova_execucao()
+        fieldnames = agregador.fieldnames
+        if candidatos is not None:
+            fieldnames = fieldnames + [c for c in CAMPOS_PARTIDO if c not in fieldnames]
+        self.dados['fieldnames'] = fieldnames
+        self.dados['total_linhas'] = total_linhas
+
+        pasta = os.path.join(self.pasta, 'agregado')
+        os.makedirs(pasta, exist_ok=True)
+        for municipio in municipios:
+            caminho = os.path.join(pasta, _nome_particao(municipio))
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        for municipio, linhas in agregador.linhas_por_municipio(ordem):
+            if candidatos is not None:
+                linhas = map(candidatos.enriquecer, linhas)
+            with open(os.path.join(pasta, _nome_particao(municipio)), 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=';')
+                writer.writeheader()
+                writer.writerows(linhas)
+
+        rollup = agregador.rollup
+        cabecalhos = self.dados.setdefault('cabecalhos_rollup', {})
+        for nivel in niveis:
+            cabecalhos[nivel] = rollup.cabecalho(nivel)
+            self._gravar_grupos(f'rollup_{nivel}', cabecalhos[nivel], rollup.linhas(nivel), municipios)
+            if candidatos is None:
+                continue
+            for agrupamento, campos in AGRUPAMENTOS.items():
+                chave = f'{agrupamento}_{nivel}'
+                cabecalhos[chave] = rollup.cabecalho_agrupado(nivel, campos)
+                linhas = rollup.linhas_agrupadas(
+                    nivel, lambda *votavel, agrupamento=agrupamento: candidatos.grupo(agrupamento, *votavel)
+                )
+                self._gravar_grupos(f'rollup_{chave}', cabecalhos[chave], linhas, municipios)
+
+        if comparecimento is not None:
+            self.dados['cabecalho_comparecimento'] = comparecimento.cabecalho()
+            self._gravar_grupos('comparecimento', comparecimento.cabecalho(), comparecimento.linhas(), municipios)
+
+        if agregador.secoes is not None:
+            for municipio in municipios:
+                shutil.rmtree(pasta_secoes(municipio, self.pasta), ignore_errors=True)
+            agregador.secoes.gravar(lambda municipio: pasta_secoes(municipio, self.pasta))
+
+        constantes = agregador.colunas_constantes()
+        for municipio in municipios:
+            anterior = self.dados['municipios'].get(municipio, {})
+            self.dados['municipios'][municipio] = {
+                'linhas_filtradas': agregador.linhas_municipio.get(municipio, 0),
+                'niveis': list(niveis),
+                'ordem': ordem,
+                'constantes': constantes,
+                # Sem matriz nesta execucao, a gravada antes (mesma entrada e codigo) continua valida
+                'secoes': agregador.secoes is not None or anterior.get('secoes', False),
+                'comparecimento': comparecimento is not None or anterior.get('comparecimento', False),
+                'partidos': candidatos is not None or anterior.get('partidos', False),
+            }
+
+    def colunas_constantes(self, municipios):
+        """Colunas com o mesmo valor nas particoes de todos os municipios (com alguma linha)"""
+        resultado = None
+        for municipio in municipios:
+            registro = self.dados['municipios'][municipio]
+            if not registro['linhas_filtradas']:
+                continue
+            if resultado is None:
+                resultado = dict(registro['constantes'])
+            else:
+                resultado = {c: v for c, v in resultado.items() if registro['constantes'].get(c) == v}
+        return resultado or {}
+
+    def linhas_filtradas(self, municipios):
+        return {m: self.dados['municipios'][m]['linhas_filtradas'] for m in municipios}
+
+    def _ler_particoes(self, pasta, municipios):
+        leitores = []
+        for municipio in sorted(municipios):
+            caminho = os.path.join(self.pasta, pasta, _nome_particao(municipio))
+            if os.path.exists(caminho):
+                f = open(caminho, 'r', newline='', encoding='utf-8')
+                leitor = csv.reader(f, delimiter=';')
+                next(leitor)
+                leitores.append((f, leitor))
+        return leitores
+
+    def linhas_agregadas(self, municipios, campos_chave, ordem='natural'):
+        """
+        Junta as particoes dos municipios
+
+        Ordem natural: uma particao apos a outra, em ordem alfabetica de municipio.
+        Ordem chave: intercala as particoes (ja ordenadas) pelos valores de campos_chave,
+        na mesma ordem de Agregador.linhas_saida('chave'), com uma linha de cada na memoria.
+        """
+        fieldnames = self.dados['fieldnames']
+        if ordem == 'natural':
+            for municipio in sorted(municipios):
+                for f, leitor in self._ler_particoes('agregado', [municipio]):
+                    with f:
+                        for linha in leitor:
+                            yield dict(zip(fieldnames, linha))
+            return
+
+        indices = [fieldnames.index(c) for c in campos_chave]
+        leitores = self._ler_particoes('agregado', municipios)
+        try:
+            for linha in heapq.merge(*(leitor for _, leitor in leitores),
+                                     key=lambda linha: [linha[i] for i in indices]):
+                yield dict(zip(fieldnames, linha))
+        finally:
+            for f, _ in leitores:
+                f.close()
+
+    def gravar_csv(self, caminho, municipios, campos_chave, ordem='natural', compressao='nenhuma'):
+        """Grava o CSV agregado a partir das particoes e retorna o numero de linhas"""
+        return gravar_csv(self.linhas_agregadas(municipios, campos_chave, ordem), self.dados['fieldnames'],
+                          caminho, compressao, self.colunas_constantes(municipios))
+
+    def gravar_parquet(self, destino, municipios, campos_chave, ordem='natural'):
+        """Grava o dataset Parquet particionado a partir das particoes e retorna o numero de linhas"""
+        try:
+            from armazenamento_parquet import gravar_parquet
+        except ImportError:
+            raise ImportError("A saida Parquet requer o pacote pyarrow (pip install pyarrow)")
+        return gravar_parquet(self.linhas_agregadas(municipios, campos_chave, ordem), self.dados['fieldnames'],
+                              destino)
+
+    def gravar_rollup(self, prefixo, municipios, niveis, partidos=False):
+        """
+        Grava um CSV por nivel ({prefixo}_{nivel}.csv) a partir das particoes e, com
+        partidos, um por nivel e agrupamento ({prefixo}_partido_{nivel}.csv...)
+
+        Returns:
+            dict: nivel (ou agrupamento_nivel) -> (caminho, numero de linhas)
+        """
+        resultado = {}
+        for nivel in niveis:
+            caminho = f"{prefixo}_{nivel}.csv"
+            n = self._intercalar(caminho, f'rollup_{nivel}', self.dados['cabecalhos_rollup'][nivel], municipios,
+                                 lambda linha: chave_ordenacao(nivel, linha))
+            resultado[nivel] = (caminho, n)
+        if partidos:
+            for agrupamento, campos in AGRUPAMENTOS.items():
+                for nivel in niveis:
+                    chave = f'{agrupamento}_{nivel}'
+                    caminho = f"{prefixo}_{chave}.csv"
+                    n = self._intercalar(caminho, f'rollup_{chave}', self.dados['cabecalhos_rollup'][chave],
+                                         municipios, lambda linha: chave_ordenacao_agrupada(nivel, len(campos), linha))
+                    resultado[chave] = (caminho, n)
+        return resultado
+
+    def gravar_comparecimento(self, caminho, municipios):
+        """Grava o CSV de comparecimento por local a partir das particoes e retorna (caminho, linhas)"""
+        n = self._intercalar(caminho, 'comparecimento', self.dados['cabecalho_comparecimento'], municipios,
+                             chave_comparecimento)
+        return caminho, n
+
+    def _intercalar(self, caminho, pasta, cabecalho, municipios, chave):
+        """Intercala as particoes (ja ordenadas por chave) em um CSV e retorna o numero de linhas"""
+        leitores = self._ler_particoes(pasta, municipios)
+        n = 0
+        try:
+            with open(caminho, 'w', newline='', encoding='utf-8-sig') as outfile:
+                writer = csv.writer(outfile, delimiter=';')
+                writer.writerow(cabecalho)
+                for linha in heapq.merge(*(leitor for _, leitor in leitores), key=chave):
+                    writer.writerow(linha)
+                    n += 1
+        finally:
+            for f, _ in leitores:
+                f.close()
+        return n
+
+    def saida_atual(self, municipios, niveis, formato, ordem='natural', compressao='nenhuma', comparecimento=False,
+                    partidos=False):
+        """Arquivos da ultima saida, se foram gerados com os mesmos parametros e ainda existem"""
+        saida = self.dados.get('saida')
+        if not saida or self.dados.get('entrada') is None:
+            return None
+        if saida['municipios'] != sorted(municipios) or saida['niveis'] != list(niveis) \
+                or saida['formato'] != formato or saida.get('ordem') != ordem \
+                or saida.get('compressao') != compressao:
+            return None
+        if comparecimento and 'comparecimento' not in saida['arquivos']:
+            return None
+        if partidos and not saida.get('partidos'):
+            return None
+        if not all(os.path.exists(caminho) for caminho in saida['arquivos'].values()):
+            return None
+        return saida['arquivos']
+
+    def registrar_saida(self, municipios, niveis, formato, arquivos, ordem='natural', compressao='nenhuma',
+                        partidos=False):
+        self.dados['saida'] = {'municipios': sorted(municipios), 'niveis': list(niveis), 'formato': formato,
+                               'ordem': ordem, 'compressao': compressao, 'partidos': partidos, 'arquivos': arquivos}
@@ -0,0 +1,200 @@
+"""
+Camadas do mapa de locais de votacao (folium)
+
+Um folium.Marker por local gera um bloco de HTML/JS para cada marcador (icone,
+popup e tooltip proprios), que o st_folium serializa e o navegador interpreta a
+cada rerun. Com centenas ou milhares de locais, o mapa fica pesado. As camadas
+abaixo levam todos os locais ao mapa como dados, e o navegador monta popup e
+estilo a partir deles:
+- camada_geojson: uma FeatureCollection GeoJSON, com cor, popup e tooltip vindos
+  das propriedades de cada feature (GeoJsonPopup/GeoJsonTooltip)
+- camada_cluster: FastMarkerCluster, com uma lista de valores por local e um
+  callback JS que cria o marcador e o popup
+
+camada_marcadores (um folium.Marker por local) continua disponivel para poucos locais.
+
+Cada funcao recebe um DataFrame com uma linha por local e as colunas lat, lon,
+nome, endereco, secoes, votos, vencedor, votos_vencedor, percentual, segundo,
+votos_segundo, margem e, se houver, bairro (ver app_eleicoes_mg.py).
+"""
+import html
+
+import folium
+from folium.plugins import FastMarkerCluster
+
+# Modos de desenho do mapa (o primeiro e o padrao)
+MODOS_MAPA = ('GeoJSON', 'Cluster rápido', 'Marcadores')
+
+# Cor por numero de secoes: (minimo de secoes, cor), do maior para o menor
+CORES_SECOES = ((10, 'red'), (5, 'orange'), (0, 'blue'))
+
+# Cor por vencedor: os que vencem em mais locais recebem uma cor cada, os demais COR_OUTROS e
+# os locais sem vencedor (sem votos validos) COR_SEM_VENCEDOR
+# (nomes aceitos tanto pelo CSS quanto pelo folium.Icon)
+PALETA_VENCEDORES = ('red', 'blue', 'green', 'purple', 'orange', 'darkred', 'darkblue', 'darkgreen',
+                     'cadetblue', 'pink')
+COR_OUTROS = 'gray'
+COR_SEM_VENCEDOR = 'lightgray'
+
+RAIO_CIRCULO = 7
+
+
+def colorir(df_locais, por='secoes'):
+    """
+    Cor de cada local e legenda
+
+    Args:
+        df_locais (pandas.DataFrame): Um local por linha
+        por (str): 'secoes' (numero de secoes) ou 'vencedor' (1o colocado)
+
+    Returns:
+        tuple: (lista de cores, na ordem das linhas; lista de (rotulo, cor) da legenda)
+    """
+    if por == 'vencedor':
+        vencedores = df_locais['vencedor']
+        sem_vencedor = vencedores.isna()
+        mais_frequentes = list(vencedores.value_counts().index[:len(PALETA_VENCEDORES)])
+        paleta = dict(zip(mais_frequentes, PALETA_VENCEDORES))
+        cores = [COR_SEM_VENCEDOR if vazio else paleta.get(v, COR_OUTROS)
+                 for v, vazio in zip(vencedores, sem_vencedor)]
+        legenda = list(paleta.items())
+        if len(paleta) < vencedores.nunique():
+            legenda.append(('Outros', COR_OUTROS))
+        if sem_vencedor.any():
+            legenda.append(('Sem vencedor (N/A)', COR_SEM_VENCEDOR))
+        return cores, legenda
+
+    cores = [next(cor for minimo, cor in CORES_SECOES if s >= minimo) for s in df_locais['secoes']]
+    legenda = [('1-4 seções', 'blue'), ('5-9 seções', 'orange'), ('10+ seções', 'red')]
+    return cores, legenda
+
+
+def _textos(local):
+    """Textos do popup de um local (dict ou linha do DataFrame)"""
+    vencedor = local.get('vencedor')
+    textos = {
+        'nome': local['nome'],
+        'endereco': local['endereco'],
+        'secoes': f"{local['secoes']}",
+        'votos': f"{local['votos']:,.0f}",
+        'vencedor': 'N/A' if vencedor is None else
+                    f"{vencedor} - {local['votos_vencedor']:,.0f} votos ({local['percentual']:.1f}%)",
+        'segundo': '-' if local.get('segundo') is None else
+                   f"{local['segundo']} - {local['votos_segundo']:,.0f} votos (margem {local['margem']:.1f} p.p.)",
+    }
+    if 'bairro' in local:
+        textos['bairro'] = local['bairro'] if isinstance(local['bairro'], str) else 'Não especificado'
+    return textos
+
+
+def _registros(df_locais):
+    """Linhas do DataFrame como dicts, com None no lugar de NaN"""
+    return df_locais.astype(object).where(df_locais.notna(), None).to_dict('records')
+
+
+def popup_html(local, cargo):
+    """HTML do popup de um local (modo 'Marcadores')"""
+    t = {campo: html.escape(valor) for campo, valor in _textos(local).items()}
+    bairro_info = f'<p style="margin: 5px 0;"><b>Bairro:</b> {t["bairro"]}</p>' if 'bairro' in t else ''
+    return f"""
+    <div style="font-family: Arial; width: 300px;">
+        <h4 style="color: #2c3e50; margin-bottom: 10px;">{t['nome']}</h4>
+        <hr style="margin: 5px 0;">
+        <p style="margin: 5px 0;"><b>Endereco:</b><br>{t['endereco']}</p>
+        {bairro_info}
+        <p style="margin: 5px 0;"><b>Secoes:</b> {t['secoes']}</p>
+        <p style="margin: 5px 0;"><b>Total de Votos:</b> {t['votos']}</p>
+        <hr style="margin: 5px 0;">
+        <p style="margin: 5px 0;"><b>1º Colocado ({html.escape(cargo)}):</b><br>{t['vencedor']}</p>
+        <p style="margin: 5px 0;"><b>2º Colocado:</b><br>{t['segundo']}</p>
+    </div>
+    """
+
+
+def camada_marcadores(df_locais, cores, cargo):
+    """Um folium.Marker por local, em um MarkerCluster (popup e icone proprios em cada marcador)"""
+    from folium.plugins import MarkerCluster
+
+    camada = MarkerCluster(name="Locais de Votação")
+    for local, cor in zip(_registros(df_locais), cores):
+        folium.Marker(
+            location=[local['lat'], local['lon']],
+            popup=folium.Popup(popup_html(local, cargo), max_width=320),
+            tooltip=f"{local['nome']} ({local['secoes']} seções)",
+            icon=folium.Icon(color=cor, icon='info-sign')
+        ).add_to(camada)
+    return camada
+
+
+def colecao_geojson(df_locais, cores):
+    """
+    FeatureCollection GeoJSON com um ponto por local e os textos do popup nas propriedades
+
+    Os textos ja vao escapados, como em popup_html: GeoJsonPopup e GeoJsonTooltip
+    inserem os valores das propriedades como HTML.
+    """
+    features = []
+    for local, cor in zip(_registros(df_locais), cores):
+        propriedades = {campo: html.escape(valor) for campo, valor in _textos(local).items()}
+        propriedades['cor'] = cor
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [float(local['lon']), float(local['lat'])]},
+            'properties': propriedades,
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def camada_geojson(df_locais, cores, cargo):
+    """Todos os locais em uma unica camada GeoJSON (circulos coloridos pela propriedade 'cor')"""
+    campos = ['nome', 'endereco'] + (['bairro'] if 'bairro' in df_locais.columns else []) + \
+        ['secoes', 'votos', 'vencedor', 'segundo']
+    rotulos = {'nome': 'Local', 'endereco': 'Endereço', 'bairro': 'Bairro', 'secoes': 'Seções',
+               'votos': 'Total de votos', 'vencedor': f'1º colocado ({cargo})', 'segundo': '2º colocado'}
+    return folium.GeoJson(
+        colecao_geojson(df_locais, cores),
+        name="Locais de Votação",
+        marker=folium.CircleMarker(radius=RAIO_CIRCULO, weight=1, fill=True, fill_opacity=0.8),
+        style_function=lambda feature: {'color': feature['properties']['cor'],
+                                        'fillColor': feature['properties']['cor']},
+        popup=folium.GeoJsonPopup(fields=campos, aliases=[rotulos[c] for c in campos], max_width=320),
+        tooltip=folium.GeoJsonTooltip(fields=['nome', 'secoes'], aliases=['Local', 'Seções']),
+        zoom_on_click=False,
+    )
+
+
+# Cria cada marcador do FastMarkerCluster a partir de [lat, lon, cor, tooltip, popup (textos)]
+CALLBACK_CLUSTER = """
+function (row) {
+    var texto = function (valor) {
+        var div = document.createElement('div');
+        div.textContent = valor;
+        return div.innerHTML;
+    };
+    var t = row[4];
+    var html = '<div style="font-family: Arial; width: 300px;">'
+        + '<h4 style="color: #2c3e50; margin-bottom: 10px;">' + texto(t.nome) + '</h4><hr style="margin: 5px 0;">'
+        + '<p style="margin: 5px 0;"><b>Endereco:</b><br>' + texto(t.endereco) + '</p>'
+        + (t.bairro !== undefined ? '<p style="margin: 5px 0;"><b>Bairro:</b> ' + texto(t.bairro) + '</p>' : '')
+        + '<p style="margin: 5px 0;"><b>Secoes:</b> ' + texto(t.secoes) + '</p>'
+        + '<p style="margin: 5px 0;"><b>Total de Votos:</b> ' + texto(t.votos) + '</p><hr style="margin: 5px 0;">'
+        + '<p style="margin: 5px 0;"><b>1º Colocado (' + texto(t.cargo) + '):</b><br>' + texto(t.vencedor) + '</p>'
+        + '<p style="margin: 5px 0;"><b>2º Colocado:</b><br>' + texto(t.segundo) + '</p></div>';
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: %(raio)d, weight: 1, color: row[2], fillColor: row[2], fillOpacity: 0.8});
+    marker.bindTooltip(texto(row[3]));
+    marker.bindPopup(html, {maxWidth: 320});
+    return marker;
+}
+""" % {'raio': RAIO_CIRCULO}
+
+
+def camada_cluster(df_locais, cores, cargo):
+    """Todos os locais em um FastMarkerCluster (marcadores criados no navegador por CALLBACK_CLUSTER)"""
+    dados = []
+    for local, cor in zip(_registros(df_locais), cores):
+        textos = _textos(local)
+        textos['cargo'] = cargo
+        dados.append([float(local['lat']), float(local['lon']), cor,
+                      f"{local['nome']} ({local['secoes']} seções)", textos])
+    return FastMarkerCluster(dados, callback=CALLBACK_CLUSTER, name="Locais de Votação")
@@ -0,0 +1,191 @@
+"""
+Matriz de votos por secao (secao x votavel), gravada em disco e lida com np.memmap
+
+A agregacao por endereco descarta o detalhe de cada secao. Com --matriz-secoes,
+a mesma passada pelo arquivo do TSE guarda tambem, para cada municipio, os votos
+de cada votavel em cada secao, em formato CSR (linhas = secoes):
+- inicio.npy: posicao da primeira celula de cada secao (n_secoes + 1, int64)
+- votavel.npy: id do votavel de cada celula (uint32)
+- votos.npy: votos de cada celula (uint32)
+- secoes.csv / votaveis.csv: tabelas de dimensao (a linha i descreve o id i)
+
+Os arrays sao abertos com np.load(mmap_mode='r'): consultar uma secao e ler
+uma fatia, sem percorrer CSV nenhum.
+
+A gravacao e a leitura requerem o pacote numpy (o acumulo usa arrays tipados).
+"""
+import csv
+import os
+from array import array
+from itertools import groupby
+
+CAMPOS_SECAO = ('NR_ZONA', 'NR_SECAO', 'NR_LOCAL_VOTACAO')
+CAMPOS_VOTAVEL = ('NR_TURNO', 'CD_CARGO', 'DS_CARGO', 'NR_VOTAVEL', 'NM_VOTAVEL')
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("A matriz de votos por secao requer o pacote numpy (pip install numpy)")
+    return np
+
+
+def _ordem_numerica(texto):
+    """Chave que ordena codigos numericos em texto pelo valor ('9' < '10')"""
+    return len(texto), texto
+
+
+class MatrizSecoes:
+    """Acumula os votos de cada (secao, votavel) das linhas filtradas"""
+
+    def __init__(self):
+        self.secoes = {}  # (CD_MUNICIPIO, NR_ZONA, NR_SECAO) -> id
+        self.info_secoes = []  # (NM_MUNICIPIO, NR_LOCAL_VOTACAO) de cada id
+        self.votaveis = {}  # (NR_TURNO, CD_CARGO, NR_VOTAVEL, NM_VOTAVEL) -> id
+        self.cargos = {}  # CD_CARGO -> DS_CARGO
+        self.secao = array('I')
+        self.votavel = array('I')
+        self.votos = array('I')
+
+    def _id_secao(self, chave, nm_municipio, nr_local):
+        i = self.secoes.get(chave)
+        if i is None:
+            i = self.secoes[chave] = len(self.info_secoes)
+            self.info_secoes.append((nm_municipio, nr_local))
+        return i
+
+    def _id_votavel(self, chave, ds_cargo):
+        i = self.votaveis.get(chave)
+        if i is None:
+            i = self.votaveis[chave] = len(self.votaveis)
+            self.cargos.setdefault(chave[1], ds_cargo)
+        return i
+
+    def _acumular(self, cd_municipio, nm_municipio, nr_zona, nr_secao, nr_local,
+                  nr_turno, cd_cargo, ds_cargo, nr_votavel, nm_votavel, votos):
+        self.secao.append(self._id_secao((cd_municipio, nr_zona, nr_secao), nm_municipio, nr_local))
+        self.votavel.append(self._id_votavel((nr_turno, cd_cargo, nr_votavel, nm_votavel), ds_cargo))
+        self.votos.append(int(votos))
+
+    def adicionar(self, row):
+        self._acumular(row['CD_MUNICIPIO'], row['NM_MUNICIPIO'], row['NR_ZONA'], row['NR_SECAO'],
+                       row['NR_LOCAL_VOTACAO'], row['NR_TURNO'], row['CD_CARGO'], row['DS_CARGO'],
+                       row['NR_VOTAVEL'], row['NM_VOTAVEL'], row['QT_VOTOS'])
+
+    def adicionar_lote(self, df):
+        """Acumula um lote de linhas ja filtradas (DataFrame com colunas texto)"""
+        colunas = ['CD_MUNICIPIO', 'NM_MUNICIPIO', 'NR_ZONA', 'NR_SECAO', 'NR_LOCAL_VOTACAO',
+                   'NR_TURNO', 'CD_CARGO', 'DS_CARGO', 'NR_VOTAVEL', 'NM_VOTAVEL', 'QT_VOTOS']
+        for valores in zip(*(df[c].tolist() for c in colunas)):
+            self._acumular(*valores)
+
+    def mesclar(self, outro):
+        """Acrescenta as celulas de um acumulador parcial (de um bloco posterior do arquivo)"""
+        mapa_secoes = [self._id_secao(chave, *outro.info_secoes[i]) for chave, i in outro.secoes.items()]
+        mapa_votaveis = [self._id_votavel(chave, outro.cargos[chave[1]]) for chave in outro.votaveis]
+        self.secao.extend(mapa_secoes[i] for i in outro.secao)
+        self.votavel.extend(mapa_votaveis[i] for i in outro.votavel)
+        self.votos.extend(outro.votos)
+
+    def __len__(self):
+        return len(self.votos)
+
+    def gravar(self, destino):
+        """
+        Grava uma matriz por municipio
+
+        Args:
+            destino (callable): Recebe o nome do municipio e devolve a pasta da matriz
+
+        Returns:
+            dict: municipio -> numero de celulas (secao, votavel) gravadas
+        """
+        np = _numpy()
+        chaves_secoes = list(self.secoes)
+        chaves_votaveis = list(self.votaveis)
+
+        # Secoes ordenadas por municipio, zona e secao: cada municipio fica em uma faixa continua
+        ordem_secoes = sorted(range(len(chaves_secoes)), key=lambda i: (
+            self.info_secoes[i][0], _ordem_numerica(chaves_secoes[i][1]), _ordem_numerica(chaves_secoes[i][2])
+        ))
+        posto = np.empty(len(chaves_secoes), dtype=np.int64)
+        posto[ordem_secoes] = np.arange(len(chaves_secoes))
+
+        secao = posto[np.frombuffer(self.secao, dtype=np.uint32)] if len(self) else np.empty(0, np.int64)
+        votavel = np.frombuffer(self.votavel, dtype=np.uint32)
+        ordem = np.lexsort((votavel, secao))
+        secao, votavel = secao[ordem], votavel[ordem]
+        votos = np.frombuffer(self.votos, dtype=np.uint32)[ordem]
+        inicio = np.searchsorted(secao, np.arange(len(chaves_secoes) + 1))
+
+        resultado = {}
+        postos = enumerate(ordem_secoes)
+        for municipio, grupo in groupby(postos, key=lambda item: self.info_secoes[item[1]][0]):
+            grupo = list(grupo)
+            a, b = grupo[0][0], grupo[-1][0] + 1
+            ini, fim = inicio[a], inicio[b]
+            ids_votaveis, votavel_local = np.unique(votavel[ini:fim], return_inverse=True)
+
+            pasta = destino(municipio)
+            os.makedirs(pasta, exist_ok=True)
+            np.save(os.path.join(pasta, 'inicio.npy'), (inicio[a:b + 1] - ini).astype(np.int64))
+            np.save(os.path.join(pasta, 'votavel.npy'), votavel_local.astype(np.uint32))
+            np.save(os.path.join(pasta, 'votos.npy'), votos[ini:fim])
+            with open(os.path.join(pasta, 'secoes.csv'), 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(CAMPOS_SECAO)
+                for _, i in grupo:
+                    writer.writerow((chaves_secoes[i][1], chaves_secoes[i][2], self.info_secoes[i][1]))
+            with open(os.path.join(pasta, 'votaveis.csv'), 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(CAMPOS_VOTAVEL)
+                for j in ids_votaveis:
+                    nr_turno, cd_cargo, nr_votavel, nm_votavel = chaves_votaveis[j]
+                    writer.writerow((nr_turno, cd_cargo, self.cargos[cd_cargo], nr_votavel, nm_votavel))
+            resultado[municipio] = int(fim - ini)
+        return resultado
+
+
+class LeitorMatrizSecoes:
+    """Matriz de um municipio aberta com np.memmap (so as fatias consultadas sao lidas do disco)"""
+
+    def __init__(self, pasta):
+        np = _numpy()
+        self.inicio = np.load(os.path.join(pasta, 'inicio.npy'), mmap_mode='r')
+        self.votavel = np.load(os.path.join(pasta, 'votavel.npy'), mmap_mode='r')
+        self.votos = np.load(os.path.join(pasta, 'votos.npy'), mmap_mode='r')
+        with open(os.path.join(pasta, 'secoes.csv'), 'r', newline='', encoding='utf-8') as f:
+            self.secoes = list(csv.DictReader(f, delimiter=';'))
+        with open(os.path.join(pasta, 'votaveis.csv'), 'r', newline='', encoding='utf-8') as f:
+            self.votaveis = list(csv.DictReader(f, delimiter=';'))
+        self._indice = {(s['NR_ZONA'], s['NR_SECAO']): i for i, s in enumerate(self.secoes)}
+
+    def secao(self, nr_zona, nr_secao):
+        """
+        Votos de cada votavel em uma secao
+
+        Returns:
+            list: Um dict por votavel (CAMPOS_VOTAVEL + QT_VOTOS); vazio se a secao nao existir
+        """
+        i = self._indice.get((str(nr_zona), str(nr_secao)))
+        if i is None:
+            return []
+        a, b = self.inicio[i], self.inicio[i + 1]
+        return [dict(self.votaveis[v], QT_VOTOS=int(q)) for v, q in zip(self.votavel[a:b], self.votos[a:b])]
+
+    def votos_votavel(self, nr_turno, cd_cargo, nr_votavel):
+        """
+        Votos de um votavel em cada secao do municipio
+
+        Returns:
+            list: Um dict por secao (CAMPOS_SECAO + QT_VOTOS), so as secoes com celula para o votavel
+        """
+        np = _numpy()
+        ids = [j for j, v in enumerate(self.votaveis)
+               if (v['NR_TURNO'], v['CD_CARGO'], v['NR_VOTAVEL']) == (str(nr_turno), str(cd_cargo), str(nr_votavel))]
+        if not ids:
+            return []
+        celulas = np.flatnonzero(np.isin(self.votavel, ids))
+        secoes = np.searchsorted(self.inicio, celulas, side='right') - 1
+        return [dict(self.secoes[s], QT_VOTOS=int(self.votos[c])) for s, c in zip(secoes, celulas)]
@@ -0,0 +1,223 @@
+"""
+Metricas por etapa da ingestao (vazao e memoria), em JSON lines e tabela de resumo
+
+Cada etapa de uma execucao de filtrar_municipios_stream.ingerir vira uma linha
+JSON no arquivo de metricas, com a identificacao da execucao e da maquina (host,
+CPUs, engine, workers), para comparar em que etapa cada tipo de maquina gasta o
+tempo:
+- download: bytes/s recebidos e tempo parado esperando a rede
+- inflate: MB/s descompactados (tempo dentro das leituras do CSV, sem a espera da rede)
+- processamento: linhas lidas/s, linhas mantidas e chaves agregadas (parse, filtro e
+  agregacao; o restante do tempo da passada pelo arquivo)
+- particoes e gravacao: bytes/s gravados
+
+O pico de RSS de cada etapa (pico_rss_mb) vem de uma thread que le o RSS atual
+do processo a cada INTERVALO_AMOSTRA segundos, zerada no inicio da etapa (Linux:
+/proc/self/statm; outros sistemas: psutil, se instalado). As etapas da mesma
+passada pelo arquivo (download, inflate, processamento) registram o pico da
+passada. O pico do processo ate o fim da etapa (ru_maxrss, que so aumenta) fica em
+pico_rss_processo_mb. Com tracemalloc=True, cada etapa registra tambem o pico de
+memoria alocada pelo Python nela (o tracemalloc deixa as alocacoes bem mais lentas,
+por isso e opcional).
+"""
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc as _tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ARQUIVO_METRICAS = 'metricas_ingestao.jsonl'
+
+INTERVALO_AMOSTRA = 0.05  # segundos entre leituras do RSS durante as etapas
+
+try:
+    _TAMANHO_PAGINA = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):  # Windows
+    _TAMANHO_PAGINA = None
+
+
+def pico_memoria_mb():
+    """Pico de memoria residente (RSS) do processo desde o inicio, em MB, ou None se indisponivel"""
+    if resource is None:
+        return None
+    # ru_maxrss e em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+
+def memoria_atual_mb():
+    """Memoria residente (RSS) atual do processo em MB, ou None se indisponivel"""
+    if _TAMANHO_PAGINA is not None:
+        try:
+            with open('/proc/self/statm', 'rb') as f:
+                return int(f.read().split()[1]) * _TAMANHO_PAGINA / 1024 / 1024
+        except (OSError, ValueError, IndexError):
+            pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+class AmostradorRSS:
+    """Pico do RSS desde a ultima chamada a reiniciar, lido por uma thread em segundo plano"""
+
+    def __init__(self):
+        self.pico = None
+        self._trava = threading.Lock()
+        self._thread = None
+
+    def _atualizar(self, atual):
+        with self._trava:
+            if self.pico is not None and atual > self.pico:
+                self.pico = atual
+
+    def _amostrar(self):
+        while True:
+            time.sleep(INTERVALO_AMOSTRA)
+            atual = memoria_atual_mb()
+            if atual is not None:
+                self._atualizar(atual)
+
+    def reiniciar(self):
+        atual = memoria_atual_mb()
+        if atual is None:
+            return
+        with self._trava:
+            self.pico = atual
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._amostrar, name='amostrador_rss', daemon=True)
+            self._thread.start()
+
+    def ler(self):
+        """Pico desde reiniciar (incluindo o RSS de agora), ou None se indisponivel"""
+        atual = memoria_atual_mb()
+        if atual is not None:
+            self._atualizar(atual)
+        return self.pico
+
+
+# Uma thread por processo, compartilhada pelas execucoes
+_amostrador = AmostradorRSS()
+
+
+def tamanho_em_disco(caminho):
+    """Bytes de um arquivo ou de todos os arquivos de um diretorio (dataset Parquet)"""
+    if os.path.isdir(caminho):
+        return sum(os.path.getsize(os.path.join(raiz, nome))
+                   for raiz, _, nomes in os.walk(caminho) for nome in nomes)
+    return os.path.getsize(caminho) if os.path.exists(caminho) else 0
+
+
+class LeitorMedido(io.RawIOBase):
+    """Repassa as leituras de um arquivo binario contando os bytes e o tempo gasto dentro delas"""
+
+    def __init__(self, bruto):
+        super().__init__()
+        self._bruto = bruto
+        self.bytes = 0
+        self.segundos = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        inicio = time.perf_counter()
+        n = self._bruto.readinto(b)
+        self.segundos += time.perf_counter() - inicio
+        self.bytes += n or 0
+        return n
+
+
+class MetricasIngestao:
+    """
+    Coleta as metricas de cada etapa de uma execucao
+
+    Args:
+        arquivo (str): Arquivo JSON lines onde cada etapa e acrescentada (None: so em memoria)
+        tracemalloc (bool): Registrar tambem o pico de memoria alocada pelo Python em cada etapa
+        contexto (dict): Campos repetidos em todas as linhas (engine, workers...)
+    """
+
+    def __init__(self, arquivo=ARQUIVO_METRICAS, tracemalloc=False, contexto=None):
+        self.arquivo = arquivo
+        self.tracemalloc = tracemalloc
+        self.etapas = []
+        self.contexto = {
+            'execucao': datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'python': sys.version.split()[0],
+        }
+        self.contexto.update(contexto or {})
+        if tracemalloc and not _tracemalloc.is_tracing():
+            _tracemalloc.start()
+
+    def reiniciar_pico(self):
+        """Zera o pico de RSS (e o do tracemalloc) no inicio de um trecho medido com registrar"""
+        _amostrador.reiniciar()
+        if self.tracemalloc:
+            _tracemalloc.reset_peak()
+
+    @contextmanager
+    def etapa(self, nome):
+        """
+        Mede o tempo e a memoria do bloco with; o dict devolvido recebe os volumes
+        da etapa (bytes, linhas...) e as vazoes sao calculadas na saida
+        """
+        campos = {}
+        self.reiniciar_pico()
+        inicio = time.perf_counter()
+        yield campos
+        campos.setdefault('segundos', time.perf_counter() - inicio)
+        self.registrar(nome, **campos)
+
+    def registrar(self, nome, segundos, **campos):
+        """Registra uma etapa medida por fora de etapa() (ex.: partes de uma mesma passada)"""
+        linha = {'etapa': nome, 'segundos': round(segundos, 4)}
+        linha.update(campos)
+        if segundos > 0:
+            if 'bytes' in campos:
+                linha['mb_por_segundo'] = round(campos['bytes'] / 1024 / 1024 / segundos, 2)
+            if 'linhas' in campos:
+                linha['linhas_por_segundo'] = round(campos['linhas'] / segundos)
+        pico = _amostrador.ler()
+        linha['pico_rss_mb'] = round(pico, 1) if pico is not None else None
+        pico = pico_memoria_mb()
+        linha['pico_rss_processo_mb'] = round(pico, 1) if pico is not None else None
+        if self.tracemalloc:
+            linha['pico_tracemalloc_mb'] = round(_tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        self.etapas.append(linha)
+        if self.arquivo:
+            with open(self.arquivo, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(self.contexto, **linha), ensure_ascii=False) + '\n')
+        return linha
+
+    def resumo(self):
+        """Tabela de texto com uma linha por etapa, marcando a mais lenta"""
+        linhas = [f"{'Etapa':<15}{'Tempo (s)':>11}{'MB/s':>10}{'Linhas/s':>14}{'Pico RSS (MB)':>15}"
+                  + (f"{'Pico Python (MB)':>18}" if self.tracemalloc else '')]
+        mais_lenta = max(self.etapas, key=lambda e: e['segundos'], default=None)
+        for e in self.etapas:
+            mb_s = f"{e['mb_por_segundo']:.1f}" if 'mb_por_segundo' in e else '-'
+            linhas_s = f"{e['linhas_por_segundo']:,}" if 'linhas_por_segundo' in e else '-'
+            pico = f"{e['pico_rss_mb']:.0f}" if e['pico_rss_mb'] is not None else '-'
+            texto = f"{e['etapa']:<15}{e['segundos']:>11.2f}{mb_s:>10}{linhas_s:>14}{pico:>15}"
+            if self.tracemalloc:
+                texto += f"{e['pico_tracemalloc_mb']:>18.1f}"
+            if e is mais_lenta:
+                texto += '  <- mais lenta'
+            linhas.append(texto)
+        return '\n'.join(linhas)
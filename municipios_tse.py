@@ -0,0 +1,179 @@
+"""
+Resolucao dos nomes de municipio para os codigos do TSE (CD_MUNICIPIO)
+
+O indice codigo -> nome e montado a partir do proprio arquivo do TSE e os nomes
+informados pelo usuario sao comparados sem acentos, sem diferenca entre
+maiusculas e minusculas e ignorando a pontuacao ("Sao Joao del-Rei" encontra
+"SÃO JOÃO DEL REI"). Com o indice ja conhecido (ZIP local ou indice guardado no
+manifesto), nomes desconhecidos sao informados antes do processamento, com
+sugestoes, e o filtro por linha compara apenas o codigo do municipio.
+
+Sem ZIP local, ler o arquivo so para o indice custaria um download a mais.
+ColetorMunicipios monta o indice na mesma passada do processamento: cada trecho
+do CSV passa por ele antes do filtro, que ja recebe os codigos dos municipios
+pedidos que aparecerem no trecho. Nesse caso (primeira execucao em streaming) um
+nome so pode ser dado como desconhecido ao fim da leitura do arquivo inteiro.
+"""
+import csv
+import difflib
+import io
+import re
+import unicodedata
+
+TAMANHO_BLOCO_INDICE = 16 * 1024 * 1024
+
+
+def normalizar_nome(nome):
+    """Nome sem acentos, em maiusculas e sem pontuacao ('Pingo-d'Água' -> 'PINGO D AGUA')"""
+    sem_acentos = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^A-Z0-9]+', ' ', sem_acentos.upper()).split())
+
+
+def ler_lista_municipios(caminho):
+    """Le um arquivo com um municipio por linha (linhas vazias e comentarios com # sao ignorados)"""
+    with open(caminho, 'r', encoding='utf-8-sig') as f:
+        linhas = (linha.split('#', 1)[0].strip() for linha in f)
+        return [linha for linha in linhas if linha]
+
+
+def _extrator_pares(cabecalho):
+    """
+    Funcao que extrai os pares (codigo, nome) de um trecho de linhas inteiras do CSV
+
+    Os dois campos de cada linha, com ou sem aspas, sao extraidos por um regex em vez
+    de um split por linha.
+    """
+    colunas = next(csv.reader([cabecalho.decode('latin-1')], delimiter=';'))
+    i_codigo, i_nome = colunas.index('CD_MUNICIPIO'), colunas.index('NM_MUNICIPIO')
+    primeiro, segundo = sorted((i_codigo, i_nome))
+    padrao = re.compile(
+        rb'^(?:[^;\n]*;){%d}"?([^;"\n]*)"?;(?:[^;\n]*;){%d}"?([^;"\n]*)"?' % (primeiro, segundo - primeiro - 1),
+        re.M,
+    )
+    if i_codigo < i_nome:
+        return lambda bloco: set(padrao.findall(bloco))
+    return lambda bloco: {(codigo, nome) for nome, codigo in padrao.findall(bloco)}
+
+
+def indice_do_csv(csvf):
+    """
+    Le os pares CD_MUNICIPIO / NM_MUNICIPIO de todo o CSV do TSE (arquivo binario, latin-1)
+
+    Returns:
+        dict: codigo -> nome do municipio
+    """
+    extrair = _extrator_pares(csvf.readline())
+
+    pares = set()
+    resto = b''
+    while True:
+        bloco = csvf.read(TAMANHO_BLOCO_INDICE)
+        if not bloco:
+            break
+        bloco = resto + bloco
+        fim = bloco.rfind(b'\n') + 1
+        bloco, resto = bloco[:fim], bloco[fim:]
+        pares.update(extrair(bloco))
+    if resto:
+        pares.update(extrair(resto))
+    return {codigo.decode('latin-1'): nome.decode('latin-1') for codigo, nome in pares}
+
+
+class ColetorMunicipios:
+    """
+    Indice codigo -> nome e codigos dos municipios pedidos, montados durante a leitura do CSV
+
+    envolver(csvf) devolve um leitor do mesmo CSV que, a cada leitura, passa as
+    linhas inteiras lidas pelo coletor antes de entrega-las. O dict codigos (o
+    mesmo objeto durante toda a leitura) ganha um municipio pedido antes que a
+    primeira linha dele chegue ao consumidor. Quem filtra por codigos deve
+    consulta-lo a cada trecho, nao uma vez no inicio. Os nomes sao comparados como
+    em ResolvedorMunicipios.resolver.
+
+    Args:
+        nomes (list): Nomes ou codigos dos municipios pedidos
+    """
+
+    def __init__(self, nomes):
+        nomes = [str(nome).strip() for nome in nomes]
+        self._codigos_pedidos = set(nomes)
+        self._nomes_pedidos = {normalizar_nome(nome) for nome in nomes}
+        self._pares = set()
+        self._extrair = None
+        self._resto = b''
+        self.indice = {}
+        self.codigos = {}
+
+    def atualizar(self, dados, fim=False):
+        """Le os pares dos trechos de linha inteiros em dados (o resto fica para a proxima chamada)"""
+        dados = self._resto + dados
+        if self._extrair is None:
+            quebra = dados.find(b'\n')
+            if quebra < 0 and not fim:
+                self._resto = dados
+                return
+            self._extrair = _extrator_pares(dados[:quebra + 1] if quebra >= 0 else dados)
+            dados = dados[quebra + 1:] if quebra >= 0 else b''
+        corte = len(dados) if fim else dados.rfind(b'\n') + 1
+        dados, self._resto = dados[:corte], dados[corte:]
+        for codigo, nome in self._extrair(dados) - self._pares:
+            self._pares.add((codigo, nome))
+            codigo, nome = codigo.decode('latin-1'), nome.decode('latin-1')
+            self.indice[codigo] = nome
+            if codigo in self._codigos_pedidos or normalizar_nome(nome) in self._nomes_pedidos:
+                self.codigos[codigo] = nome
+
+    def envolver(self, csvf, tamanho_buffer=io.DEFAULT_BUFFER_SIZE):
+        """Leitor binario do CSV que alimenta o coletor a cada leitura"""
+        return io.BufferedReader(_LeitorColetado(csvf, self), buffer_size=tamanho_buffer)
+
+
+class _LeitorColetado(io.RawIOBase):
+    """Repassa as leituras de um arquivo binario, entregando cada trecho ao ColetorMunicipios antes"""
+
+    def __init__(self, csvf, coletor):
+        self.csvf = csvf
+        self.coletor = coletor
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        dados = self.csvf.read(len(b))
+        self.coletor.atualizar(dados, fim=not dados)
+        b[:len(dados)] = dados
+        return len(dados)
+
+
+class ResolvedorMunicipios:
+    """Indice normalizado nome -> codigos, montado uma vez a partir de {codigo: nome}"""
+
+    def __init__(self, municipios):
+        self.municipios = dict(municipios)
+        self._por_nome = {}
+        for codigo, nome in self.municipios.items():
+            self._por_nome.setdefault(normalizar_nome(nome), []).append(codigo)
+
+    def resolver(self, nomes):
+        """
+        Converte nomes (ou codigos) de municipio para os codigos do TSE
+
+        Returns:
+            tuple: (dict codigo -> nome oficial, dict nome desconhecido -> lista de sugestoes)
+        """
+        codigos = {}
+        desconhecidos = {}
+        for nome in nomes:
+            nome = str(nome).strip()
+            if nome in self.municipios:
+                codigos[nome] = self.municipios[nome]
+                continue
+            chave = normalizar_nome(nome)
+            encontrados = self._por_nome.get(chave)
+            if encontrados:
+                for codigo in encontrados:
+                    codigos[codigo] = self.municipios[codigo]
+            else:
+                parecidos = difflib.get_close_matches(chave, self._por_nome, n=3, cutoff=0.75)
+                desconhecidos[nome] = [self.municipios[self._por_nome[p][0]] for p in parecidos]
+        return codigos, desconhecidos
@@ -0,0 +1,211 @@
+"""
+Resultados do painel pre-calculados por (DS_CARGO, NR_TURNO, NM_MUNICIPIO)
+
+A aba "Por Municipio" mostra, para o cargo, turno e municipio escolhidos, o
+ranking dos votaveis, o total de votos e o numero de zonas e secoes. Em vez de
+filtrar o DataFrame inteiro e agrupar a cada interacao, CuboResultados calcula
+tudo uma vez, para todas as combinacoes, em poucos groupby sobre o DataFrame
+inteiro, ordenados pela chave (o resultado de cada combinacao e uma fatia
+continua). Cada interacao passa a ser uma consulta a um dict.
+
+Com a coluna BAIRRO (dados geocodificados), o cubo guarda tambem um resultado
+por bairro. O filtro por varios bairros soma os resultados dos bairros escolhidos
+(poucas dezenas de linhas cada).
+
+Zonas e secoes vem do rollup por local, quando houver (o arquivo agregado guarda
+so uma secao por chave). Sem ele, sao contadas no proprio arquivo agregado.
+
+vencedores_por_local calcula, para o mapa, o primeiro e o segundo colocados de
+todos os locais de um municipio de uma vez.
+"""
+import numpy as np
+import pandas as pd
+
+from candidatos_tse import VOTOS_SEM_PARTIDO
+
+CHAVE = ['DS_CARGO', 'NR_TURNO', 'NM_MUNICIPIO']
+
+# Votos que nao contam para rankings e vencedores (NR_VOTAVEL): brancos, nulos e anulados
+NUMEROS_NAO_VALIDOS = tuple(int(nr) for nr in VOTOS_SEM_PARTIDO)
+
+# Locais sem bairro nos dados geocodificados
+SEM_BAIRRO = 'Não especificado'
+
+
+def _chave(valores):
+    cargo, turno, municipio = valores[:3]
+    return (cargo, int(turno), municipio) + tuple(valores[3:])
+
+
+def vencedores_por_local(df):
+    """
+    Primeiro e segundo colocados de cada local de votacao, em um unico groupby
+
+    Brancos e nulos contam no total do local, mas nao concorrem. Empates ficam com
+    o votavel que vem primeiro em ordem alfabetica.
+
+    Args:
+        df (pandas.DataFrame): Linhas agregadas de um cargo, turno e municipio
+            (NR_ZONA, NR_LOCAL_VOTACAO, NR_VOTAVEL, NM_VOTAVEL, QT_VOTOS e, se houver, SG_PARTIDO)
+
+    Returns:
+        pandas.DataFrame: Uma linha por (NR_ZONA, NR_LOCAL_VOTACAO) (indice; o numero do
+            local se repete em zonas diferentes), com TOTAL_VOTOS,
+            VENCEDOR, VOTOS_VENCEDOR, PERCENTUAL, SEGUNDO, VOTOS_SEGUNDO e MARGEM
+            (pontos percentuais), mais PARTIDO_VENCEDOR e PARTIDO_SEGUNDO com
+            SG_PARTIDO; VENCEDOR e SEGUNDO sao None quando nao houver
+    """
+    local = ['NR_ZONA', 'NR_LOCAL_VOTACAO']
+    total = df.groupby(local, observed=True)['QT_VOTOS'].sum().astype(np.int64)
+    nao_validos = df['NR_VOTAVEL'].isin(NUMEROS_NAO_VALIDOS)
+    chave = local + ['NM_VOTAVEL'] + (['SG_PARTIDO'] if 'SG_PARTIDO' in df.columns else [])
+    votos = df[~nao_validos].groupby(chave, observed=True, dropna=False)['QT_VOTOS'].sum().reset_index()
+    votos = votos.sort_values(local + ['QT_VOTOS', 'NM_VOTAVEL'], ascending=[True, True, False, True],
+                              kind='stable')
+    posicao = votos.groupby(local, observed=True).cumcount().to_numpy()
+
+    resultado = pd.DataFrame({'TOTAL_VOTOS': total})
+    for prefixo, n in (('VENCEDOR', 0), ('SEGUNDO', 1)):
+        colocado = votos[posicao == n].set_index(local)
+        resultado[prefixo] = colocado['NM_VOTAVEL'].astype(object)
+        resultado[f'VOTOS_{prefixo}'] = colocado['QT_VOTOS'].astype(np.int64)
+        if 'SG_PARTIDO' in colocado.columns:
+            resultado[f'PARTIDO_{prefixo}'] = colocado['SG_PARTIDO'].astype(object)
+    resultado = resultado.fillna({'VOTOS_VENCEDOR': 0, 'VOTOS_SEGUNDO': 0}).astype(
+        {'VOTOS_VENCEDOR': np.int64, 'VOTOS_SEGUNDO': np.int64})
+    resultado = resultado.replace({np.nan: None})
+
+    base = resultado['TOTAL_VOTOS'].where(resultado['TOTAL_VOTOS'] > 0)
+    resultado['PERCENTUAL'] = (resultado['VOTOS_VENCEDOR'] / base * 100).fillna(0)
+    resultado['MARGEM'] = ((resultado['VOTOS_VENCEDOR'] - resultado['VOTOS_SEGUNDO']) / base * 100).fillna(0)
+    return resultado
+
+
+def _fatias(df, chave):
+    """(valores da chave, inicio, fim) de cada valor de chave em um DataFrame ordenado pela chave"""
+    if df.empty:
+        return []
+    grupo = df.groupby(chave, observed=True, sort=False).ngroup().to_numpy()
+    inicios = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]])
+    fins = np.r_[inicios[1:], len(grupo)]
+    return zip(df[chave].iloc[inicios].itertuples(index=False, name=None), inicios, fins)
+
+
+class CuboResultados:
+    """
+    Ranking, total, locais, zonas e secoes de cada (cargo, turno, municipio[, bairro])
+
+    O ranking inclui brancos e nulos (contam no total). O ranking 'validos' deixa de
+    fora os votaveis com NR_VOTAVEL em NUMEROS_NAO_VALIDOS.
+
+    Args:
+        df (pandas.DataFrame): Dados agregados (carga_dashboard.carregar_agregado),
+            com ou sem a coluna BAIRRO
+        df_rollup_local (pandas.DataFrame): Rollup por local (QT_SECOES por local), ou None
+    """
+
+    def __init__(self, df, df_rollup_local=None):
+        self.com_bairro = 'BAIRRO' in df.columns
+        colunas = ['NR_VOTAVEL', 'NM_VOTAVEL', 'QT_VOTOS', 'NR_ZONA', 'NR_SECAO', 'NR_LOCAL_VOTACAO']
+        base = df[CHAVE + (['BAIRRO'] if self.com_bairro else []) + colunas]
+        if self.com_bairro:
+            bairro = base['BAIRRO']
+            if isinstance(bairro.dtype, pd.CategoricalDtype) and SEM_BAIRRO not in bairro.cat.categories:
+                bairro = bairro.cat.add_categories(SEM_BAIRRO)
+            base = base.assign(BAIRRO=bairro.fillna(SEM_BAIRRO))
+
+        secoes_local = None
+        if df_rollup_local is not None:
+            secoes_local = df_rollup_local.drop_duplicates(CHAVE + ['NR_ZONA', 'NR_LOCAL_VOTACAO'])[
+                CHAVE + ['NR_ZONA', 'NR_LOCAL_VOTACAO', 'QT_SECOES']]
+            secoes_local = secoes_local.astype({'DS_CARGO': str, 'NR_TURNO': int, 'NM_MUNICIPIO': str})
+
+        # Nomes dos votos nao validos (o ranking e indexado por NM_VOTAVEL)
+        self.nao_validos = set(base.loc[base['NR_VOTAVEL'].isin(NUMEROS_NAO_VALIDOS), 'NM_VOTAVEL'].astype(str))
+
+        self.resultados = self._calcular(base, CHAVE, secoes_local, self.nao_validos)
+        self.bairros = {}
+        if self.com_bairro:
+            por_bairro = self._calcular(base, CHAVE + ['BAIRRO'], secoes_local, self.nao_validos)
+            self.resultados.update(por_bairro)
+            for chave in sorted(por_bairro):
+                self.bairros.setdefault(chave[:3], []).append(chave[3])
+
+        self.municipios = {}
+        for cargo, turno, municipio in sorted(k for k in self.resultados if len(k) == 3):
+            self.municipios.setdefault((cargo, turno), []).append(municipio)
+
+    @staticmethod
+    def _calcular(base, chave, secoes_local, nao_validos):
+        """Resultado de cada valor de chave, com um groupby e algumas ordenacoes do DataFrame inteiro"""
+        n = len(chave)
+        votos = base.groupby(chave + ['NM_VOTAVEL'], observed=True)['QT_VOTOS'].sum().reset_index()
+        votos = votos.sort_values(chave + ['QT_VOTOS'], ascending=[True] * n + [False], kind='stable')
+        nomes = pd.Index(votos['NM_VOTAVEL'].astype(str), name='NM_VOTAVEL')
+        qt_votos = votos['QT_VOTOS'].to_numpy()
+        resultados = {}
+        for valores, i, j in _fatias(votos, chave):
+            ranking = pd.Series(qt_votos[i:j], index=nomes[i:j], name='QT_VOTOS')
+            resultados[_chave(valores)] = {'ranking': ranking, 'validos': ranking[~ranking.index.isin(nao_validos)],
+                                           'total': int(qt_votos[i:j].sum()),
+                                           'zonas': np.array([], dtype=np.int64), 'secoes': 0}
+
+        locais = base[chave + ['NR_LOCAL_VOTACAO']].drop_duplicates().sort_values(chave + ['NR_LOCAL_VOTACAO'])
+        nr_local = locais['NR_LOCAL_VOTACAO'].to_numpy(np.int64)
+        for valores, i, j in _fatias(locais, chave):
+            resultados[_chave(valores)]['locais'] = nr_local[i:j]
+
+        if secoes_local is None:
+            # Sem o rollup: zonas e secoes (zona, secao) presentes no arquivo agregado
+            pares = base[chave + ['NR_ZONA', 'NR_SECAO']].drop_duplicates().sort_values(chave)
+            qt_secoes = np.ones(len(pares), dtype=np.int64)
+        else:
+            # Rollup: locais presentes no arquivo agregado, com o QT_SECOES do rollup
+            pares = locais.astype({'DS_CARGO': str, 'NR_TURNO': int, 'NM_MUNICIPIO': str, 'NR_LOCAL_VOTACAO': int})
+            pares = pares.merge(secoes_local, on=CHAVE + ['NR_LOCAL_VOTACAO']).sort_values(chave, kind='stable')
+            qt_secoes = pares['QT_SECOES'].to_numpy(np.int64)
+        nr_zona = pares['NR_ZONA'].to_numpy(np.int64)
+        for valores, i, j in _fatias(pares, chave):
+            resultado = resultados[_chave(valores)]
+            resultado['zonas'] = np.unique(nr_zona[i:j])
+            resultado['secoes'] = int(qt_secoes[i:j].sum())
+        return resultados
+
+    def resultado(self, cargo, turno, municipio, bairros=None):
+        """
+        Resultado de um municipio, inteiro ou so dos bairros escolhidos
+
+        Returns:
+            dict: ranking (pandas.Series NM_VOTAVEL -> votos, decrescente), validos
+                  (ranking sem brancos e nulos), total, locais, zonas (arrays de NR_LOCAL_VOTACAO / NR_ZONA) e secoes; ou
+                  None se a combinacao nao tiver votos
+        """
+        chave = (cargo, int(turno), municipio)
+        if not bairros:
+            return self.resultados.get(chave)
+        partes = [self.resultados[chave + (b,)] for b in bairros if chave + (b,) in self.resultados]
+        if not partes:
+            return None
+        if len(partes) == 1:
+            return partes[0]
+        ranking = pd.concat([p['ranking'] for p in partes]).groupby(level=0).sum().sort_values(
+            ascending=False, kind='stable')
+        return {
+            'ranking': ranking,
+            'validos': ranking[~ranking.index.isin(self.nao_validos)],
+            'total': int(ranking.sum()),
+            'locais': np.unique(np.concatenate([p['locais'] for p in partes])),
+            'zonas': np.unique(np.concatenate([p['zonas'] for p in partes])),
+            'secoes': sum(p['secoes'] for p in partes),
+        }
+
+    def municipios_com_votos(self, cargo, turno):
+        """Municipios com votos no cargo e turno, em ordem alfabetica"""
+        return self.municipios.get((cargo, int(turno)), [])
+
+    def bairros_do_municipio(self, cargo, turno, municipio):
+        """Bairros do municipio (com dados geocodificados), em ordem alfabetica"""
+        return self.bairros.get((cargo, int(turno), municipio), [])
+
+    def __len__(self):
+        return len(self.resultados)
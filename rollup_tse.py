@@ -0,0 +1,200 @@
+"""
+Rollup dos votos em varios niveis (secao, local, zona e municipio)
+
+Todos os niveis sao calculados na mesma passada pelo arquivo do TSE e sao
+chaveados por turno e cargo, com o total de votos de cada votavel e o numero
+de secoes de cada secao/local/zona/municipio.
+
+Os rollups por partido e por coligacao (linhas_agrupadas) sao derivados dos
+totais por votavel na gravacao, com o cadastro de candidatos (ver candidatos_tse).
+"""
+import csv
+from collections import defaultdict
+
+# Colunas de cada nivel, alem de NR_TURNO, CD_CARGO e CD_MUNICIPIO
+NIVEIS = {
+    'secao': ('NR_ZONA', 'NR_SECAO'),
+    'local': ('NR_ZONA', 'NR_LOCAL_VOTACAO'),
+    'zona': ('NR_ZONA',),
+    'municipio': (),
+}
+NIVEIS_PADRAO = ('local', 'zona', 'municipio')
+
+CAMPOS_BASE = ('NR_TURNO', 'CD_CARGO', 'CD_MUNICIPIO')
+CAMPOS_SECAO = ('NR_TURNO', 'CD_CARGO', 'CD_MUNICIPIO', 'NR_ZONA', 'NR_SECAO', 'NR_LOCAL_VOTACAO')
+
+
+class RollupNiveis:
+    """Acumula os votos de cada nivel e as secoes vistas em uma unica passada"""
+
+    def __init__(self, niveis=NIVEIS_PADRAO):
+        self.niveis = tuple(niveis)
+        self.campos = {n: CAMPOS_BASE + NIVEIS[n] + ('NR_VOTAVEL',) for n in self.niveis}
+        self.votos = {n: defaultdict(int) for n in self.niveis}
+        self.secoes = set()  # (turno, cargo, municipio, zona, secao, local)
+
+        # Tabelas de dimensao (nomes guardados uma vez por codigo)
+        self.cargos = {}
+        self.municipios = {}
+        self.locais = {}
+        self.votaveis = {}
+        self.candidatos = {}  # (cargo, municipio, NR_VOTAVEL) -> SQ_CANDIDATO
+
+    def adicionar(self, row):
+        votos = int(row['QT_VOTOS'])
+        for nivel in self.niveis:
+            self.votos[nivel][tuple(row[c] for c in self.campos[nivel])] += votos
+        self.secoes.add(tuple(row[c] for c in CAMPOS_SECAO))
+
+        cd_municipio = row['CD_MUNICIPIO']
+        chave_votavel = (row['CD_CARGO'], cd_municipio, row['NR_VOTAVEL'])
+        if chave_votavel not in self.votaveis:
+            self.votaveis[chave_votavel] = row['NM_VOTAVEL']
+            self.candidatos[chave_votavel] = row.get('SQ_CANDIDATO', '')
+            self.cargos.setdefault(row['CD_CARGO'], row['DS_CARGO'])
+            self.municipios.setdefault(cd_municipio, row['NM_MUNICIPIO'])
+        chave_local = (cd_municipio, row['NR_ZONA'], row['NR_LOCAL_VOTACAO'])
+        if chave_local not in self.locais:
+            self.locais[chave_local] = (row['NM_LOCAL_VOTACAO'], row['DS_LOCAL_VOTACAO_ENDERECO'])
+
+    def adicionar_lote(self, df):
+        """Acumula um lote de linhas ja filtradas (DataFrame com colunas texto)"""
+        votos = df['QT_VOTOS'].astype('int64')
+        for nivel in self.niveis:
+            campos = list(self.campos[nivel])
+            soma = votos.groupby([df[c] for c in campos], sort=False).sum()
+            destino = self.votos[nivel]
+            for chave, total in soma.items():
+                destino[chave] += int(total)
+        self.secoes.update(df[list(CAMPOS_SECAO)].drop_duplicates().itertuples(index=False, name=None))
+
+        for cd_cargo, ds_cargo in df[['CD_CARGO', 'DS_CARGO']].drop_duplicates().itertuples(index=False):
+            self.cargos.setdefault(cd_cargo, ds_cargo)
+        for cd, nome in df[['CD_MUNICIPIO', 'NM_MUNICIPIO']].drop_duplicates().itertuples(index=False):
+            self.municipios.setdefault(cd, nome)
+        for cargo, cd, nr, nome in df[['CD_CARGO', 'CD_MUNICIPIO', 'NR_VOTAVEL', 'NM_VOTAVEL']] \
+                .drop_duplicates().itertuples(index=False):
+            self.votaveis.setdefault((cargo, cd, nr), nome)
+        if 'SQ_CANDIDATO' in df.columns:
+            for cargo, cd, nr, sq in df[['CD_CARGO', 'CD_MUNICIPIO', 'NR_VOTAVEL', 'SQ_CANDIDATO']] \
+                    .drop_duplicates().itertuples(index=False):
+                self.candidatos.setdefault((cargo, cd, nr), sq)
+        for cd, zona, local, nome, endereco in df[['CD_MUNICIPIO', 'NR_ZONA', 'NR_LOCAL_VOTACAO',
+                                                   'NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO']] \
+                .drop_duplicates().itertuples(index=False):
+            self.locais.setdefault((cd, zona, local), (nome, endereco))
+
+    def mesclar(self, outro):
+        """Soma um rollup parcial (de um bloco posterior do arquivo) a este"""
+        for nivel in self.niveis:
+            destino = self.votos[nivel]
+            for chave, votos in outro.votos[nivel].items():
+                destino[chave] += votos
+        self.secoes |= outro.secoes
+        for proprio, dele in ((self.cargos, outro.cargos), (self.municipios, outro.municipios),
+                              (self.locais, outro.locais), (self.votaveis, outro.votaveis),
+                              (self.candidatos, outro.candidatos)):
+            for chave, valor in dele.items():
+                proprio.setdefault(chave, valor)
+
+    def contar_secoes(self, nivel):
+        """Numero de secoes distintas por entidade do nivel (turno, cargo, municipio, ...)"""
+        if nivel == 'secao':
+            return None
+        contagem = defaultdict(int)
+        for turno, cargo, municipio, zona, secao, local in self.secoes:
+            if nivel == 'local':
+                contagem[(turno, cargo, municipio, zona, local)] += 1
+            elif nivel == 'zona':
+                contagem[(turno, cargo, municipio, zona)] += 1
+            else:
+                contagem[(turno, cargo, municipio)] += 1
+        return contagem
+
+    def cabecalho(self, nivel):
+        """Colunas do CSV de um nivel"""
+        fieldnames = ['NR_TURNO', 'CD_CARGO', 'DS_CARGO', 'CD_MUNICIPIO', 'NM_MUNICIPIO'] + list(NIVEIS[nivel])
+        if nivel == 'local':
+            fieldnames += ['NM_LOCAL_VOTACAO', 'DS_LOCAL_VOTACAO_ENDERECO']
+        return fieldnames + ['NR_VOTAVEL', 'NM_VOTAVEL', 'QT_VOTOS', 'QT_SECOES']
+
+    def linhas(self, nivel):
+        """Gera as linhas de um nivel, ordenadas pela chave (ver chave_ordenacao)"""
+        secoes = self.contar_secoes(nivel)
+        n = len(CAMPOS_BASE) + len(NIVEIS[nivel])
+        for chave, votos in sorted(self.votos[nivel].items()):
+            turno, cargo, municipio = chave[:3]
+            entidade = chave[:n]
+            linha = [turno, cargo, self.cargos[cargo], municipio, self.municipios[municipio]]
+            linha += chave[3:n]
+            if nivel == 'local':
+                linha += self.locais[(municipio, chave[3], chave[4])]
+            nr_votavel = chave[n]
+            linha += [nr_votavel, self.votaveis[(cargo, municipio, nr_votavel)], votos,
+                      1 if secoes is None else secoes[entidade]]
+            yield linha
+
+    def cabecalho_agrupado(self, nivel, campos):
+        """Colunas do CSV de um nivel agrupado por partido/coligacao (campos: colunas do grupo)"""
+        return self.cabecalho(nivel)[:-4] + list(campos) + ['QT_VOTOS', 'QT_SECOES']
+
+    def linhas_agrupadas(self, nivel, grupo):
+        """
+        Gera as linhas de um nivel com os votos somados por grupo de votaveis, ordenadas
+        pela chave (ver chave_ordenacao_agrupada)
+
+        Args:
+            nivel (str): Nivel do rollup
+            grupo (callable): Recebe (cargo, NR_VOTAVEL, SQ_CANDIDATO, NM_VOTAVEL) e devolve a
+                tupla de valores do grupo (ex.: candidatos_tse.IndiceCandidatos.grupo)
+        """
+        secoes = self.contar_secoes(nivel)
+        n = len(CAMPOS_BASE) + len(NIVEIS[nivel])
+        grupos = {}
+        totais = defaultdict(int)
+        for chave, votos in self.votos[nivel].items():
+            cargo, municipio, nr_votavel = chave[1], chave[2], chave[n]
+            chave_votavel = (cargo, municipio, nr_votavel)
+            valores = grupos.get(chave_votavel)
+            if valores is None:
+                sq_candidato = self.candidatos.get(chave_votavel, '')
+                valores = grupos[chave_votavel] = tuple(grupo(cargo, nr_votavel, sq_candidato,
+                                                              self.votaveis[chave_votavel]))
+            totais[chave[:n] + valores] += votos
+        for chave, votos in sorted(totais.items()):
+            turno, cargo, municipio = chave[:3]
+            linha = [turno, cargo, self.cargos[cargo], municipio, self.municipios[municipio]]
+            linha += chave[3:n]
+            if nivel == 'local':
+                linha += self.locais[(municipio, chave[3], chave[4])]
+            linha += list(chave[n:]) + [votos, 1 if secoes is None else secoes[chave[:n]]]
+            yield linha
+
+    def gravar(self, prefixo):
+        """
+        Grava um CSV por nivel ({prefixo}_{nivel}.csv)
+
+        Returns:
+            dict: nivel -> (caminho, numero de linhas)
+        """
+        resultado = {}
+        for nivel in self.niveis:
+            caminho = f"{prefixo}_{nivel}.csv"
+            with open(caminho, 'w', newline='', encoding='utf-8-sig') as outfile:
+                writer = csv.writer(outfile, delimiter=';')
+                writer.writerow(self.cabecalho(nivel))
+                writer.writerows(self.linhas(nivel))
+            resultado[nivel] = (caminho, len(self.votos[nivel]))
+        return resultado
+
+
+def chave_ordenacao(nivel, linha):
+    """Chave de ordenacao de uma linha do CSV de um nivel (a mesma usada por RollupNiveis.linhas)"""
+    n = len(NIVEIS[nivel])
+    return (linha[0], linha[1], linha[3]) + tuple(linha[5:5 + n]) + (linha[-4],)
+
+
+def chave_ordenacao_agrupada(nivel, n_campos, linha):
+    """Chave de ordenacao de uma linha de linhas_agrupadas (n_campos: colunas do grupo)"""
+    n = len(NIVEIS[nivel])
+    return (linha[0], linha[1], linha[3]) + tuple(linha[5:5 + n]) + tuple(linha[-2 - n_campos:-2])
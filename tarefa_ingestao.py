@@ -0,0 +1,264 @@
+"""
+Ingestao em segundo plano, com o andamento gravado em disco
+
+O dashboard nao executa a ingestao no proprio processo: iniciar() dispara esta
+tarefa em um processo separado (python tarefa_ingestao.py) e volta na hora. A
+tarefa chama filtrar_municipios_stream.ingerir e grava o andamento (etapa,
+mensagem, linhas/s) em um arquivo de status JSON, substituido de forma atomica
+a cada gravacao. Quem le o status (ler_status) ve sempre um arquivo completo.
+
+O status guarda tambem o ultimo conjunto de arquivos gerado com sucesso
+(ultimo_sucesso). Ele so e trocado quando uma execucao termina, entao o
+dashboard continua servindo os dados anteriores enquanto a tarefa roda e passa
+para os novos de uma vez. Se a tarefa falhar, os dados anteriores continuam
+valendo. O mesmo vale para as particoes (matriz por secao): cada execucao grava
+em uma pasta propria (dir_execucao), e a pasta anterior so e apagada depois que
+ultimo_sucesso passa a apontar para a nova.
+
+Enquanto roda, a tarefa regrava o status a cada INTERVALO_SINAL segundos. Um
+status 'executando' sem sinal ha mais de PRAZO_SEM_SINAL segundos e de um
+processo que morreu (servidor reiniciado, maquina desligada) e passa a valer
+como 'interrompido'.
+
+Uso:
+    python tarefa_ingestao.py                                   # executa em primeiro plano
+    python tarefa_ingestao.py --parametros '{"comparecimento": true}'
+
+Em primeiro plano, a tarefa nao roda se outra estiver em execucao (ver reservar).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+ARQUIVO_STATUS = 'ingestao_status.json'
+ARQUIVO_LOG = 'ingestao.log'
+
+INTERVALO_GRAVACAO = 1.0  # segundos entre gravacoes do andamento do processamento
+INTERVALO_SINAL = 5.0  # segundos entre gravacoes do status sem nenhum evento
+PRAZO_SEM_SINAL = 60.0  # sem sinal por mais tempo: a tarefa morreu
+PRAZO_TRAVA = 30.0  # trava de inicio mais antiga que isso e de um processo que morreu ao iniciar
+
+
+def _agora():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _gravar(status, caminho):
+    """Grava o status em um arquivo temporario e o coloca no lugar do anterior (troca atomica)"""
+    status['atualizado'] = time.time()
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def ler_status(caminho=ARQUIVO_STATUS):
+    """
+    Le o status da ultima execucao
+
+    Returns:
+        dict: estado ('executando', 'concluido', 'erro' ou 'interrompido'), inicio, fim,
+              etapa, mensagem, linhas, linhas_filtradas, linhas_por_segundo, erro,
+              parametros e ultimo_sucesso ({'fim', 'arquivos'} da ultima execucao
+              concluida); vazio se a tarefa nunca rodou
+    """
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            status = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if status.get('estado') == 'executando' and time.time() - status.get('atualizado', 0) > PRAZO_SEM_SINAL:
+        status['estado'] = 'interrompido'
+    return status
+
+
+class TarefaIngestao:
+    """
+    Executa a ingestao no processo atual, gravando o andamento no arquivo de status
+
+    Args:
+        caminho (str): Arquivo de status
+    """
+
+    def __init__(self, caminho=ARQUIVO_STATUS):
+        self.caminho = caminho
+        self.status = {}
+        self._trava = threading.Lock()
+        self._ultima_gravacao = 0.0
+        self._fim = threading.Event()
+
+    def _salvar(self):
+        with self._trava:
+            _gravar(self.status, self.caminho)
+            self._ultima_gravacao = time.perf_counter()
+
+    def _atualizar(self, **campos):
+        """Altera o status sob a trava (a thread de sinal pode estar gravando o mesmo dict)"""
+        with self._trava:
+            self.status.update(campos)
+
+    def _sinal(self):
+        """Regrava o status periodicamente (etapas longas sem eventos, como o hash do ZIP)"""
+        while not self._fim.wait(INTERVALO_SINAL):
+            try:
+                self._salvar()
+            except Exception as e:
+                # Uma falha de gravacao nao pode parar o sinal: o status pareceria travado
+                print(f"[ERRO] Falha ao gravar o status: {e}", flush=True)
+
+    def _progresso(self, evento):
+        campos = {'etapa': evento['etapa']}
+        if evento.get('mensagem'):
+            campos['mensagem'] = evento['mensagem'].strip()
+        for campo in ('linhas', 'linhas_filtradas', 'linhas_por_segundo'):
+            if campo in evento:
+                campos[campo] = evento[campo]
+        self._atualizar(**campos)
+        # Eventos de processamento chegam a cada 100k linhas: grava no maximo uma vez por intervalo
+        if 'linhas' not in evento or time.perf_counter() - self._ultima_gravacao >= INTERVALO_GRAVACAO:
+            self._salvar()
+
+    def executar(self, **parametros):
+        """
+        Executa filtrar_municipios_stream.ingerir(**parametros)
+
+        Returns:
+            dict: Status final ('concluido' ou 'erro')
+        """
+        from filtrar_municipios_stream import ingerir
+
+        anterior = ler_status(self.caminho)
+        self.status = {
+            'estado': 'executando',
+            'pid': os.getpid(),
+            'inicio': _agora(),
+            'fim': None,
+            'etapa': None,
+            'mensagem': "Iniciando a ingestao...",
+            'parametros': parametros,
+            'ultimo_sucesso': anterior.get('ultimo_sucesso'),
+        }
+        self._salvar()
+        sinal = threading.Thread(target=self._sinal, daemon=True)
+        sinal.start()
+        try:
+            resultado = ingerir(progresso=self._progresso, **parametros)
+        except Exception as e:
+            traceback.print_exc()  # Vai para o log da tarefa (ingestao.log); o status guarda so a mensagem
+            self._atualizar(estado='erro', erro=str(e), mensagem=f"[ERRO] {e}")
+        else:
+            self._atualizar(
+                estado='concluido',
+                linhas_filtradas=resultado['linhas_filtradas'],
+                nada_mudou=resultado['nada_mudou'],
+                ultimo_sucesso={'fim': _agora(), 'arquivos': resultado['arquivos'],
+                                'dir_execucao': resultado['dir_execucao']},
+            )
+        finally:
+            self._fim.set()
+            sinal.join()
+            self._atualizar(fim=_agora())
+            self._salvar()
+        if self.status['estado'] == 'concluido':
+            # Quem le o status ja ve a pasta nova: as anteriores podem ser apagadas
+            from manifesto_tse import DIR_PARTICOES, limpar_execucoes
+            limpar_execucoes(parametros.get('dir_particoes', DIR_PARTICOES), resultado['dir_execucao'])
+        return self.status
+
+
+def reservar(parametros=None, caminho=ARQUIVO_STATUS):
+    """
+    Marca o status como 'executando', se nenhuma tarefa estiver em execucao
+
+    A verificacao e a gravacao acontecem sob uma trava (arquivo caminho + '.lock',
+    criado com O_EXCL): de duas sessoes ou processos ao mesmo tempo, so um reserva.
+
+    Returns:
+        bool: True se a execucao foi reservada, False se ja havia uma em execucao
+    """
+    trava = caminho + '.lock'
+    try:
+        if time.time() - os.path.getmtime(trava) > PRAZO_TRAVA:
+            os.remove(trava)
+    except OSError:
+        pass
+    try:
+        descritor = os.open(trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False  # Outra sessao esta iniciando a tarefa agora
+    try:
+        status = ler_status(caminho)
+        if status.get('estado') == 'executando':
+            return False
+
+        # Status 'executando' antes da tarefa comecar, para a proxima leitura ja ver a tarefa
+        status.update({'estado': 'executando', 'inicio': _agora(), 'fim': None, 'etapa': None, 'erro': None,
+                       'mensagem': "Iniciando a ingestao...", 'parametros': parametros or {}})
+        _gravar(status, caminho)
+        return True
+    finally:
+        os.close(descritor)
+        os.remove(trava)
+
+
+def iniciar(parametros=None, caminho=ARQUIVO_STATUS, log=ARQUIVO_LOG):
+    """
+    Dispara a tarefa em um processo separado, se nenhuma estiver em execucao
+
+    O processo sobrevive ao fim de quem o iniciou (sessao propria) e grava a saida
+    do terminal em log.
+
+    Args:
+        parametros (dict): Argumentos de filtrar_municipios_stream.ingerir (valores JSON)
+        caminho (str): Arquivo de status
+
+    Returns:
+        bool: True se a tarefa foi iniciada, False se ja havia uma em execucao
+    """
+    if not reservar(parametros, caminho):
+        return False
+
+    comando = [sys.executable, os.path.abspath(__file__), '--status', caminho,
+               '--parametros', json.dumps(parametros or {}), '--reservada']
+    if os.name == 'nt':
+        opcoes = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS}
+    else:
+        opcoes = {'start_new_session': True}
+    with open(log, 'a', encoding='utf-8') as saida:
+        subprocess.Popen(comando, stdin=subprocess.DEVNULL, stdout=saida, stderr=subprocess.STDOUT,
+                         cwd=os.getcwd(), **opcoes)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa a ingestao dos dados do TSE gravando o andamento em disco")
+    parser.add_argument('--parametros', default='{}',
+                        help="Argumentos de filtrar_municipios_stream.ingerir, em JSON")
+    parser.add_argument('--status', default=ARQUIVO_STATUS,
+                        help="Arquivo de status. Padrao: %(default)s")
+    parser.add_argument('--reservada', action='store_true', help=argparse.SUPPRESS)  # processo de iniciar()
+    args = parser.parse_args(argv)
+    parametros = json.loads(args.parametros)
+
+    # Em primeiro plano, a mesma reserva de iniciar(): nao roda ao lado de uma tarefa do dashboard
+    if not args.reservada and not reservar(parametros, args.status):
+        print(f"[ERRO] Ja existe uma ingestao em execucao (ver {args.status})")
+        sys.exit(1)
+
+    # Os modulos do pipeline ficam ao lado deste arquivo
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    status = TarefaIngestao(args.status).executar(**parametros)
+    if status['estado'] == 'erro':
+        print(f"[ERRO] {status['erro']}")
+        sys.exit(1)
+    print(f"[OK] Ingestao concluida: {len(status['ultimo_sucesso']['arquivos'])} arquivos")
+
+
+if __name__ == "__main__":
+    main()